@@ -1,20 +1,25 @@
 #app.py
-import threading
-import asyncio
 import os
+import signal
 import ssl
+from datetime import timedelta
 from flask import Flask
-from ws_server import iniciar_ws 
 from config import (
     oauth, 
     SSL_ENABLED, 
     SSL_CERT_PATH, 
     SSL_KEY_PATH,
     FLASK_PORT,
-    FLASK_DEBUG
+    FLASK_DEBUG,
+    SESION_DURACION_H,
+    OIDC_GOOGLE_METADATA_URL
 )
 from index import rutas
 from firma_digital.routes import firma_bp
+from metricas import metricas
+from supervisor_ws import supervisor_ws
+from oidc import AppOIDC
+from sesiones_servidor import InterfazSesionesServidor, almacen_sesiones
 from dotenv import load_dotenv
 
 
@@ -26,6 +31,10 @@ app.secret_key = os.environ.get('FLASK_SECRET')
 if not app.secret_key:
     raise ValueError("[ERROR] FLASK_SECRET no esta configurada en las variables de ambiente.")
 
+# Sesiones en el servidor: la cookie solo lleva un identificador opaco
+app.session_interface = InterfazSesionesServidor(almacen_sesiones)
+app.permanent_session_lifetime = timedelta(hours=SESION_DURACION_H)
+
 # Configuración de subida de archivos
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB máximo
 
@@ -34,13 +43,10 @@ oauth.register(
     name='google',
     client_id=os.environ.get('GOOGLE_CLIENT_ID'),
     client_secret=os.environ.get('GOOGLE_CLIENT_SECRET'),
-    access_token_url='https://oauth2.googleapis.com/token',
-    access_token_params=None,
-    authorize_url='https://accounts.google.com/o/oauth2/v2/auth',
-    authorize_params=None,
-    api_base_url='https://www.googleapis.com/oauth2/v1/',
     client_kwargs={'scope': 'openid email profile'},
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+    # Endpoints y JWKS salen del descubrimiento, cacheado en disco (oidc.py)
+    server_metadata_url=OIDC_GOOGLE_METADATA_URL,
+    client_cls=AppOIDC,
 )
 
 # Registrar blueprints
@@ -66,9 +72,28 @@ def ws_config():
     }
 
 
-def lanzar_ws():
-    """Inicia el servidor WebSocket dentro de un hilo."""
-    asyncio.run(iniciar_ws())
+@app.get("/metricas")
+def ver_metricas():
+    """Métricas internas del proceso (contadores, valores y tiempos)."""
+    return metricas.snapshot()
+
+
+@app.get("/ws/salud")
+def ws_salud():
+    """Salud del proceso WebSocket (503 si no está vivo o no envía latidos)."""
+    estado = supervisor_ws.estado()
+    return estado, 200 if estado["sano"] else 503
+
+
+@app.get("/ws/metricas")
+def ws_metricas():
+    """Métricas del proceso WebSocket (último latido recibido)."""
+    return supervisor_ws.metricas()
+
+
+def _sigterm(signum, frame):
+    # Mismo camino que CTRL+C: el finally detiene el proceso WebSocket
+    raise KeyboardInterrupt
 
 
 def _crear_contexto_ssl_flask():
@@ -91,13 +116,24 @@ def _crear_contexto_ssl_flask():
 
 
 if __name__ == "__main__":
+    # El servidor de desarrollo de Flask no es apto para producción
+    if not FLASK_DEBUG:
+        raise SystemExit(
+            "[ERROR] app.py usa el servidor de desarrollo de Flask y solo arranca con FLASK_DEBUG=true.\n"
+            "En producción usa: python servidor_produccion.py --con-ws"
+        )
+
     print("\n======================")
     print("[+] INICIANDO SERVIDOR")
     print("======================")
 
-    # Lanzar servidor WebSocket en segundo plano
-    hilo_ws = threading.Thread(target=lanzar_ws, daemon=True)
-    hilo_ws.start()
+    # Lanzar servidor WebSocket en un proceso supervisado (no comparte GIL con Flask)
+    signal.signal(signal.SIGTERM, _sigterm)
+    supervisor_ws.iniciar()
+
+    # Flask usa su propio MongoClient (el del proceso WebSocket no se comparte)
+    from db_manager import db_manager
+    db_manager.conectar()
 
     try:
         protocolo = "https" if SSL_ENABLED else "http"
@@ -127,7 +163,8 @@ if __name__ == "__main__":
 
     finally:
         # cierre seguro
-        from db_manager import db_manager
+        supervisor_ws.detener()
+
         if db_manager.conectado:
             db_manager.cerrar()
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Archivado de mensajes por retención
+===================================
+Mueve a segmentos comprimidos (archivo_mensajes.py) los mensajes más
+antiguos que la retención de su canal (`canales.retencion_dias`, o
+RETENCION_DIAS por defecto) y los borra de `mensajes` por lotes.
+
+El orden es anexar + fsync, indexar los hashes en `mensajes_archivados`
+(para la verificación de auditoría) y después borrar, así un fallo a mitad
+de lote solo puede dejar un duplicado en el archivo (que el lector descarta).
+
+Uso:
+    python archivado.py [--dias 90] [--lote 1000]
+    python archivado.py --reindexar     # rehace `mensajes_archivados` desde los segmentos
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from config import RETENCION_DIAS, ARCHIVADO_TAM_LOTE, ARCHIVADO_INTERVALO_HORAS
+from metricas import metricas
+
+
+def _indexar_hashes(db_manager, filas: list):
+    """Upsert por _id: reintentar un lote no duplica entradas."""
+    filas = [f for f in filas if f.get("hash_sha256")]
+    if filas:
+        db_manager.db.mensajes_archivados.bulk_write(
+            [UpdateOne({"_id": f["_id"]}, {"$set": f}, upsert=True) for f in filas],
+            ordered=False
+        )
+
+
+def archivar_canal(db_manager, canal_id, limite: datetime, tam_lote: int = ARCHIVADO_TAM_LOTE) -> int:
+    """Archiva los mensajes del canal anteriores a `limite`. Devuelve cuántos movió."""
+    movidos = 0
+    while True:
+        docs = list(
+            db_manager.db.mensajes
+            .find({"canal_id": canal_id, "timestamp": {"$lt": limite}})
+            .sort("timestamp", ASCENDING)
+            .limit(tam_lote)
+        )
+        if not docs:
+            return movidos
+
+        por_mes = {}
+        for d in docs:
+            por_mes.setdefault(d["timestamp"].strftime("%Y-%m"), []).append(d)
+        for mes, grupo in por_mes.items():
+            db_manager.archivo.anexar(str(canal_id), mes, grupo)
+        _indexar_hashes(db_manager, [
+            {"_id": d["_id"], "canal_id": canal_id, "usuario_id": d.get("usuario_id"),
+             "hash_sha256": d.get("hash_sha256"), "longitud": d.get("longitud")}
+            for d in docs
+        ])
+
+        db_manager.db.mensajes.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        movidos += len(docs)
+        metricas.incrementar("archivado.mensajes", len(docs))
+
+
+def archivar(db_manager, dias_defecto: int = RETENCION_DIAS, tam_lote: int = ARCHIVADO_TAM_LOTE) -> dict:
+    """Aplica la retención de todos los canales. Devuelve {canal_id: movidos}."""
+    if not db_manager.conectado:
+        print("[ARCHIVADO] MongoDB no conectado")
+        return {}
+
+    inicio = time.monotonic()
+    ahora = datetime.utcnow()
+    resumen = {}
+    for canal in db_manager.db.canales.find({}, {"retencion_dias": 1}):
+        dias = canal.get("retencion_dias") or dias_defecto
+        movidos = archivar_canal(db_manager, canal["_id"], ahora - timedelta(days=dias), tam_lote)
+        if movidos:
+            resumen[str(canal["_id"])] = movidos
+
+    metricas.observar("archivado.pasada", time.monotonic() - inicio)
+    metricas.fijar("archivado.ultima_pasada", ahora.isoformat())
+    metricas.fijar("archivado.bytes_en_disco", db_manager.archivo.tamano_bytes())
+    print(f"[ARCHIVADO] {sum(resumen.values())} mensajes archivados en {len(resumen)} canales")
+    return resumen
+
+
+def reindexar_hashes(db_manager, tam_lote: int = ARCHIVADO_TAM_LOTE) -> int:
+    """Rehace `mensajes_archivados` leyendo todos los segmentos. Devuelve cuántos indexó."""
+    total = 0
+    lote = []
+    for canal_id, m in db_manager.archivo.recorrer():
+        lote.append({"_id": ObjectId(m["_id"]), "canal_id": ObjectId(canal_id),
+                     "usuario_id": ObjectId(m["usuario_id"]),
+                     "hash_sha256": m.get("hash_sha256"), "longitud": m.get("longitud")})
+        if len(lote) >= tam_lote:
+            _indexar_hashes(db_manager, lote)
+            total += len(lote)
+            lote = []
+    _indexar_hashes(db_manager, lote)
+    total += len(lote)
+    print(f"[ARCHIVADO] {total} mensajes archivados indexados")
+    return total
+
+
+def iniciar_archivado_periodico(db_manager, intervalo_horas: float = ARCHIVADO_INTERVALO_HORAS) -> threading.Thread:
+    """Ejecuta archivar() cada `intervalo_horas` en un hilo daemon."""
+    def _bucle():
+        while True:
+            try:
+                archivar(db_manager)
+            except Exception as e:
+                print(f"[ARCHIVADO] Error: {e}")
+            time.sleep(intervalo_horas * 3600)
+
+    hilo = threading.Thread(target=_bucle, name="archivado", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    import argparse
+    from db_manager import db_manager
+
+    parser = argparse.ArgumentParser(description="Archiva mensajes fuera de la retención")
+    parser.add_argument("--dias", type=int, default=RETENCION_DIAS, help="Retención por defecto (días)")
+    parser.add_argument("--lote", type=int, default=ARCHIVADO_TAM_LOTE, help="Mensajes por lote")
+    parser.add_argument("--reindexar", action="store_true",
+                        help="Rehacer el índice de hashes de los segmentos ya archivados")
+    args = parser.parse_args()
+
+    if db_manager.conectar():
+        try:
+            if args.reindexar:
+                reindexar_hashes(db_manager, tam_lote=args.lote)
+            else:
+                archivar(db_manager, dias_defecto=args.dias, tam_lote=args.lote)
+        finally:
+            db_manager.cerrar()
@@ -0,0 +1,165 @@
+# archivo_mensajes.py
+"""
+Archivo frío de mensajes
+========================
+Segmentos comprimidos de solo-anexado en disco local:
+
+    <directorio>/<canal_id>/<AAAA-MM>.seg       bloques zlib de JSON por líneas
+    <directorio>/<canal_id>/<AAAA-MM>.idx.json  índice de bloques (offset, tamaño, rango de fechas)
+
+Cada bloque se anexa al .seg y se sincroniza antes de reescribir (de forma
+atómica) el índice, así un lector solo ve bloques completos.
+"""
+
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+
+class ArchivoMensajes:
+    """Almacén de segmentos por canal y mes."""
+
+    NIVEL_COMPRESION = 6
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+
+    # -------------------------------
+    # RUTAS E ÍNDICE
+    # -------------------------------
+    def _rutas(self, canal_id: str, mes: str) -> tuple:
+        base = os.path.join(self.directorio, str(canal_id), mes)
+        return base + ".seg", base + ".idx.json"
+
+    def _leer_indice(self, ruta_idx: str) -> dict:
+        try:
+            with open(ruta_idx, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 1, "total": 0, "bloques": []}
+
+    def _escribir_indice(self, ruta_idx: str, indice: dict):
+        tmp = ruta_idx + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(indice, f)
+        os.replace(tmp, ruta_idx)
+
+    def meses(self, canal_id: str) -> list:
+        """Meses archivados del canal, del más reciente al más antiguo."""
+        carpeta = os.path.join(self.directorio, str(canal_id))
+        if not os.path.isdir(carpeta):
+            return []
+        return sorted((n[:-len(".idx.json")] for n in os.listdir(carpeta) if n.endswith(".idx.json")),
+                      reverse=True)
+
+    # -------------------------------
+    # ESCRITURA
+    # -------------------------------
+    @staticmethod
+    def _serializar(m: dict) -> dict:
+        return {
+            "_id": str(m["_id"]),
+            "usuario_id": str(m["usuario_id"]),
+            "mensaje": m.get("mensaje"),
+            "hash_sha256": m.get("hash_sha256"),
+            "longitud": m.get("longitud"),
+            "timestamp": m["timestamp"].isoformat()
+        }
+
+    def _leer_bloque(self, ruta_seg: str, bloque: dict) -> list:
+        with open(ruta_seg, "rb") as f:
+            f.seek(bloque["offset"])
+            datos = zlib.decompress(f.read(bloque["tam"]))
+        return [json.loads(linea) for linea in datos.decode("utf-8").splitlines()]
+
+    def anexar(self, canal_id: str, mes: str, mensajes: list) -> int:
+        """
+        Anexa mensajes (documentos de Mongo) al segmento del canal/mes.
+        Ignora los que ya estén en el último bloque (reintento tras un fallo
+        entre el anexado y el borrado en Mongo). Devuelve cuántos escribió.
+        """
+        ruta_seg, ruta_idx = self._rutas(canal_id, mes)
+        with self._lock:
+            os.makedirs(os.path.dirname(ruta_seg), exist_ok=True)
+            indice = self._leer_indice(ruta_idx)
+
+            ya_archivados = set()
+            if indice["bloques"]:
+                ya_archivados = {m["_id"] for m in self._leer_bloque(ruta_seg, indice["bloques"][-1])}
+
+            filas = [self._serializar(m) for m in sorted(mensajes, key=lambda m: m["timestamp"])]
+            filas = [f for f in filas if f["_id"] not in ya_archivados]
+            if not filas:
+                return 0
+
+            bloque = zlib.compress(
+                "\n".join(json.dumps(f, ensure_ascii=False) for f in filas).encode("utf-8"),
+                self.NIVEL_COMPRESION
+            )
+            with open(ruta_seg, "ab") as f:
+                offset = f.tell()
+                f.write(bloque)
+                f.flush()
+                os.fsync(f.fileno())
+
+            indice["bloques"].append({
+                "offset": offset,
+                "tam": len(bloque),
+                "n": len(filas),
+                "desde": filas[0]["timestamp"],
+                "hasta": filas[-1]["timestamp"]
+            })
+            indice["total"] += len(filas)
+            self._escribir_indice(ruta_idx, indice)
+            return len(filas)
+
+    # -------------------------------
+    # LECTURA
+    # -------------------------------
+    def leer(self, canal_id: str, antes: datetime = None, limite: int = 50) -> list:
+        """
+        Devuelve hasta `limite` mensajes archivados anteriores a `antes`
+        (los más recientes primero dentro de ese rango), en orden cronológico.
+        Usa el índice para saltar meses y bloques fuera de rango.
+        """
+        antes_iso = antes.isoformat() if antes else None
+        resultado = []
+        vistos = set()
+
+        for mes in self.meses(canal_id):
+            if antes and mes > antes.strftime("%Y-%m"):
+                continue
+            ruta_seg, ruta_idx = self._rutas(canal_id, mes)
+            for bloque in reversed(self._leer_indice(ruta_idx)["bloques"]):
+                if antes_iso and bloque["desde"] >= antes_iso:
+                    continue
+                for m in reversed(self._leer_bloque(ruta_seg, bloque)):
+                    if (antes_iso and m["timestamp"] >= antes_iso) or m["_id"] in vistos:
+                        continue
+                    vistos.add(m["_id"])
+                    resultado.append({**m, "archivado": True})
+                    if len(resultado) >= limite:
+                        return list(reversed(resultado))
+        return list(reversed(resultado))
+
+    def recorrer(self):
+        """Genera (canal_id, mensaje) de todos los segmentos archivados."""
+        if not os.path.isdir(self.directorio):
+            return
+        for canal_id in sorted(os.listdir(self.directorio)):
+            for mes in self.meses(canal_id):
+                ruta_seg, ruta_idx = self._rutas(canal_id, mes)
+                for bloque in self._leer_indice(ruta_idx)["bloques"]:
+                    for m in self._leer_bloque(ruta_seg, bloque):
+                        yield canal_id, m
+
+    def tamano_bytes(self, canal_id: str = None) -> int:
+        """Bytes en disco de los segmentos (de un canal o de todos)."""
+        raiz = os.path.join(self.directorio, str(canal_id)) if canal_id else self.directorio
+        total = 0
+        for carpeta, _, archivos in os.walk(raiz):
+            total += sum(os.path.getsize(os.path.join(carpeta, a)) for a in archivos)
+        return total
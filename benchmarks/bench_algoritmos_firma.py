@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark de algoritmos de firma
+================================
+Para cada tipo de clave de FirmaDigitalService (RSA-4096, ECDSA P-256,
+Ed25519) mide generación de claves, firmas y verificaciones por segundo
+sobre un hash SHA-256 (lo que firma firmar_archivo), y el tamaño de la
+firma. Cada medida repite la operación durante al menos --segundos.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_algoritmos_firma [--segundos 1]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+
+def _por_segundo(funcion, segundos: float) -> float:
+    """Operaciones por segundo de `funcion` repitiéndola al menos `segundos`."""
+    funcion()   # calentamiento
+    veces = 0
+    inicio = time.perf_counter()
+    while True:
+        funcion()
+        veces += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= segundos:
+            return veces / transcurrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segundos", type=float, default=1.0, help="Duración mínima de cada medida")
+    args = parser.parse_args()
+
+    from firma_digital.firma_service import ALGORITMOS_FIRMA, FirmaDigitalService, generar_clave_privada
+
+    carpeta = tempfile.mkdtemp(prefix="bench_algoritmos_")
+    datos = hashlib.sha256(b"documento de prueba").digest()
+    try:
+        print(f"\n  {'algoritmo':18} {'claves/s':>9} {'firmas/s':>10} {'verif./s':>10} {'firma B':>8}")
+        filas = {}
+        for tipo, nombre in ALGORITMOS_FIRMA.items():
+            with contextlib.redirect_stdout(None):
+                servicio = FirmaDigitalService(
+                    cert_path=os.path.join(carpeta, f"{tipo}_cert.pem"),
+                    key_path=os.path.join(carpeta, f"{tipo}_key.pem"),
+                    upload_folder=os.path.join(carpeta, tipo)
+                )
+                servicio.generar_certificado_firma("Benchmark", "Benchmark", algoritmo=tipo)
+            firma = servicio._firmar_datos(datos)
+            if not servicio._verificar_firma(datos, firma, nombre):
+                raise RuntimeError(f"La firma {nombre} no verifica")
+
+            claves = _por_segundo(lambda: generar_clave_privada(tipo), args.segundos)
+            firmas = _por_segundo(lambda: servicio._firmar_datos(datos), args.segundos)
+            verificaciones = _por_segundo(lambda: servicio._verificar_firma(datos, firma, nombre), args.segundos)
+            filas[nombre] = firmas
+            print(f"  {nombre:18} {claves:9.1f} {firmas:10.1f} {verificaciones:10.1f} {len(firma):8}")
+
+        base = filas[ALGORITMOS_FIRMA["rsa"]]
+        print("\n  Firmas/s frente a RSA-4096: " +
+              ", ".join(f"{nombre} {firmas / base:.1f}x" for nombre, firmas in filas.items()))
+        print()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark del archivo frío de mensajes
+======================================
+Genera N mensajes de un canal, los archiva en segmentos comprimidos y
+compara:
+- Tamaño: BSON de los documentos en `mensajes` vs segmentos en disco
+- Latencia de lectura de historial profundo (páginas de 50 con cursor `antes`)
+
+No necesita MongoDB (usa ArchivoMensajes directamente en un directorio temporal).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_archivo [--n 200000] [--lote 1000]
+"""
+
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId, encode
+
+from archivo_mensajes import ArchivoMensajes
+from security import calcular_hash_sha256
+
+FRASES = ["hola a todos", "¿revisaron el documento?", "subo la firma en un rato",
+          "el servidor ya responde", "mañana a las 10 la reunión", "ok 👍", "listo, desplegado"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="Mensajes a generar")
+    parser.add_argument("--lote", type=int, default=1000, help="Mensajes por bloque comprimido")
+    parser.add_argument("--lecturas", type=int, default=300)
+    args = parser.parse_args()
+
+    canal = ObjectId()
+    usuarios = [ObjectId() for _ in range(30)]
+    inicio = datetime.utcnow() - timedelta(days=720)
+    paso = timedelta(days=630) / args.n
+
+    docs = []
+    for i in range(args.n):
+        texto = f"{random.choice(FRASES)} #{i}"
+        docs.append({
+            "_id": ObjectId(),
+            "usuario_id": random.choice(usuarios),
+            "canal_id": canal,
+            "mensaje": texto,
+            "hash_sha256": calcular_hash_sha256(texto),
+            "longitud": len(texto),
+            "timestamp": inicio + paso * i
+        })
+
+    bytes_bson = sum(len(encode(d)) for d in docs)
+
+    directorio = tempfile.mkdtemp(prefix="bench_archivo_")
+    try:
+        archivo = ArchivoMensajes(directorio)
+        t0 = time.perf_counter()
+        for i in range(0, len(docs), args.lote):
+            lote = docs[i:i + args.lote]
+            por_mes = {}
+            for d in lote:
+                por_mes.setdefault(d["timestamp"].strftime("%Y-%m"), []).append(d)
+            for mes, grupo in por_mes.items():
+                archivo.anexar(str(canal), mes, grupo)
+        t_escritura = time.perf_counter() - t0
+        bytes_archivo = archivo.tamano_bytes()
+
+        print(f"\n[*] {args.n:,} mensajes, bloques de {args.lote}")
+        print(f"  BSON en mensajes (sin índices)  {bytes_bson / 1e6:10.2f} MB")
+        print(f"  Segmentos + índices en disco     {bytes_archivo / 1e6:10.2f} MB "
+              f"({bytes_bson / bytes_archivo:.1f}x menos)")
+        print(f"  Archivado                        {t_escritura:10.2f} s ({args.n / t_escritura:,.0f} msg/s)")
+
+        print(f"\n{'profundidad':>14} {'p50 ms':>9} {'p99 ms':>9}")
+        for fraccion in (0.99, 0.75, 0.5, 0.25, 0.01):
+            tiempos = []
+            for _ in range(args.lecturas):
+                pos = int(args.n * fraccion * random.uniform(0.98, 1.0))
+                antes = docs[pos]["timestamp"]
+                t0 = time.perf_counter()
+                pagina = archivo.leer(str(canal), antes=antes, limite=50)
+                tiempos.append((time.perf_counter() - t0) * 1000)
+                assert pagina and pagina[-1]["timestamp"] < antes.isoformat()
+            tiempos.sort()
+            print(f"{f'{int((1 - fraccion) * 100)}% atrás':>14} {statistics.median(tiempos):9.2f} "
+                  f"{tiempos[int(len(tiempos) * .99) - 1]:9.2f}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
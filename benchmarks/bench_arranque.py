@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque (python -X importtime)
+============================================
+Importa en frío cada punto de entrada en un intérprete nuevo, --repeticiones
+veces, y compara la mediana del tiempo acumulado con su presupuesto.
+También comprueba que no se cargan módulos pesados que deben ser diferidos
+(authlib en el proceso WebSocket, x509/Google en el módulo de firma...).
+
+Sale con código 1 si algún punto de entrada se pasa del presupuesto o
+importa un módulo prohibido, para usarlo como control de regresiones.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_arranque [--repeticiones 5] [--factor 1.5] [--top 10]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Presupuesto (ms de import acumulado, mediana) y módulos que no deben cargarse
+PUNTOS_ENTRADA = {
+    "app": {"presupuesto_ms": 700, "prohibidos": ["googleapiclient", "google.oauth2"]},
+    "ws_server": {"presupuesto_ms": 400, "prohibidos": ["flask", "authlib", "googleapiclient"]},
+    "firma_digital.routes": {
+        "presupuesto_ms": 300,
+        "prohibidos": ["cryptography.x509", "authlib", "pymongo", "googleapiclient"]
+    },
+}
+
+_LINEA = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _importar(modulo: str) -> list:
+    """[(modulo, propio_us, acumulado_us, nivel)] de un import en frío."""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+    if salida.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{salida.stderr[-2000:]}")
+    filas = []
+    for linea in salida.stderr.splitlines():
+        m = _LINEA.match(linea)
+        if m:
+            filas.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--factor", type=float, default=1.0, help="Multiplica los presupuestos (máquinas lentas)")
+    parser.add_argument("--top", type=int, default=8, help="Módulos más lentos (tiempo propio) a mostrar")
+    args = parser.parse_args()
+
+    fallos = []
+    for modulo, limites in PUNTOS_ENTRADA.items():
+        tiempos = []
+        for _ in range(args.repeticiones):
+            filas = _importar(modulo)
+            tiempos.append(next(acumulado for nombre, _, acumulado, _ in filas if nombre == modulo) / 1000)
+
+        presupuesto = limites["presupuesto_ms"] * args.factor
+        mediana = statistics.median(tiempos)
+        estado = "OK" if mediana <= presupuesto else "EXCEDIDO"
+        print(f"\n[*] {modulo}: mediana {mediana:.0f} ms (mín {min(tiempos):.0f}), "
+              f"presupuesto {presupuesto:.0f} ms -> {estado}")
+        if estado != "OK":
+            fallos.append(f"{modulo}: {mediana:.0f} ms > {presupuesto:.0f} ms")
+
+        cargados = {nombre for nombre, _, _, _ in filas}
+        for prohibido in limites["prohibidos"]:
+            if prohibido in cargados:
+                fallos.append(f"{modulo} importa {prohibido}")
+                print(f"    [!] importa {prohibido} (debería ser diferido)")
+
+        for nombre, propio, _, _ in sorted(filas, key=lambda f: f[1], reverse=True)[:args.top]:
+            print(f"    {propio / 1000:8.1f} ms  {nombre}")
+
+    print()
+    if fallos:
+        print("[x] Regresiones de arranque:")
+        for fallo in fallos:
+            print(f"    - {fallo}")
+        sys.exit(1)
+    print("[+] Arranque dentro de presupuesto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark de almacenamiento de mensajes: documento vs bucket
+============================================================
+Para cada modo de DatabaseManager ("documento" y "bucket") mide:
+
+- Ritmo de escritura de guardar_mensaje (mensajes/s)
+- Latencia (p50/p99) de obtener_historial, reciente y con `antes`
+- Tamaño de datos e índices de la colección (collStats)
+
+Requiere un MongoDB real. Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_buckets --uri mongodb://localhost:27017 --n 200000
+
+La base de datos indicada en --db se borra al terminar salvo con --conservar.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from db_manager import DatabaseManager
+from migrar_buckets import migrar
+
+
+def _percentil(valores: list, p: float) -> float:
+    return sorted(valores)[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _historico(db, n: int, canales: list, usuario, lote: int = 10000):
+    """Mensajes de los últimos 30 días en `mensajes`, uno cada pocos segundos."""
+    inicio = datetime.utcnow() - timedelta(days=30)
+    paso = 30 * 86400 / n
+    for base in range(0, n, lote):
+        db.mensajes.insert_many([{
+            "usuario_id": usuario,
+            "canal_id": random.choice(canales),
+            "mensaje": f"mensaje de prueba número {i}",
+            "hash_sha256": None,
+            "longitud": 26,
+            "timestamp": inicio + timedelta(seconds=i * paso)
+        } for i in range(base, min(base + lote, n))], ordered=False)
+
+
+def _tamanos(db, coleccion: str) -> dict:
+    stats = db.command("collStats", coleccion)
+    return {"docs": stats["count"], "datos_mb": stats["size"] / 2**20,
+            "indices_mb": stats["totalIndexSize"] / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="chat-bench-buckets")
+    parser.add_argument("--n", type=int, default=200_000, help="Mensajes de histórico por modo")
+    parser.add_argument("--escrituras", type=int, default=5000, help="guardar_mensaje medidos por modo")
+    parser.add_argument("--consultas", type=int, default=300)
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de datos al terminar")
+    args = parser.parse_args()
+
+    usuario = ObjectId()
+    canales = [ObjectId() for _ in range(10)]
+    resultados = {}
+
+    for modo in ("documento", "bucket"):
+        manager = DatabaseManager(args.uri, f"{args.db}-{modo}", almacenamiento=modo)
+        if not manager.conectar():
+            return
+        db = manager.db
+        db.usuarios.insert_one({"_id": usuario, "nombre": "bench"})
+
+        print(f"[*] {modo}: generando {args.n:,} mensajes de histórico...")
+        _historico(db, args.n, canales, usuario)
+        if modo == "bucket":
+            migrar(manager, borrar=True)
+
+        t0 = time.perf_counter()
+        for i in range(args.escrituras):
+            manager.guardar_mensaje(str(usuario), str(random.choice(canales)), f"nuevo {i}", None)
+        ritmo = args.escrituras / (time.perf_counter() - t0)
+
+        latencias = {"reciente": [], "antes": []}
+        for _ in range(args.consultas):
+            canal = str(random.choice(canales))
+            t0 = time.perf_counter()
+            manager.obtener_historial(canal, limite=50)
+            latencias["reciente"].append((time.perf_counter() - t0) * 1000)
+
+            antes = datetime.utcnow() - timedelta(days=random.uniform(1, 29))
+            t0 = time.perf_counter()
+            manager.obtener_historial(canal, limite=50, antes=antes)
+            latencias["antes"].append((time.perf_counter() - t0) * 1000)
+
+        coleccion = "mensajes_buckets" if modo == "bucket" else "mensajes"
+        resultados[modo] = {"ritmo": ritmo, "latencias": latencias, **_tamanos(db, coleccion)}
+        if not args.conservar:
+            manager.client.drop_database(f"{args.db}-{modo}")
+        manager.cerrar()
+
+    print(f"\n{'modo':10} {'msg/s':>8} {'docs':>9} {'datos MB':>9} {'índ. MB':>8} "
+          f"{'hist p50':>9} {'hist p99':>9} {'antes p50':>10} {'antes p99':>10}")
+    for modo, r in resultados.items():
+        rec, ant = r["latencias"]["reciente"], r["latencias"]["antes"]
+        print(f"{modo:10} {r['ritmo']:8.0f} {r['docs']:9,} {r['datos_mb']:9.1f} {r['indices_mb']:8.1f} "
+              f"{_percentil(rec, .5):9.2f} {_percentil(rec, .99):9.2f} "
+              f"{_percentil(ant, .5):10.2f} {_percentil(ant, .99):10.2f}")
+    print(f"\n(media historial documento: {statistics.mean(resultados['documento']['latencias']['reciente']):.2f} ms, "
+          f"bucket: {statistics.mean(resultados['bucket']['latencias']['reciente']):.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
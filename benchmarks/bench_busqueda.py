@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark de búsqueda de mensajes
+=================================
+Carga N mensajes sintéticos en una base de datos de pruebas y mide la
+latencia (p50/p95/p99) de DatabaseManager.buscar_mensajes con el índice
+de texto de `mensajes`. Requiere un MongoDB real (mongomock no soporta $text).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_busqueda --uri mongodb://localhost:27017 --n 1000000
+
+La base de datos indicada en --db se borra al terminar salvo con --conservar.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from db_manager import DatabaseManager
+
+PALABRAS = (
+    "hola reunión proyecto entrega servidor cliente firma documento revisión código "
+    "mañana viernes error despliegue base datos mongo índice canal privado público "
+    "equipo seguridad cifrado clave certificado prueba rendimiento latencia"
+).split()
+# Vocabulario con distribución de Zipf, como el lenguaje natural
+VOCABULARIO = PALABRAS + [f"termino{i}" for i in range(20000)]
+PESOS = [1 / (rango + 1) for rango in range(len(VOCABULARIO))]
+
+
+def _palabras(k: int) -> list:
+    return random.choices(VOCABULARIO, weights=PESOS, k=k)
+
+
+def _poblar(db, n: int, canales: list, usuarios: list, lote: int = 10000):
+    inicio = datetime.utcnow() - timedelta(days=365)
+    insertados = 0
+    while insertados < n:
+        docs = []
+        for i in range(min(lote, n - insertados)):
+            texto = " ".join(_palabras(random.randint(3, 15)))
+            docs.append({
+                "usuario_id": random.choice(usuarios),
+                "canal_id": random.choice(canales),
+                "mensaje": texto,
+                "hash_sha256": None,
+                "longitud": len(texto),
+                "timestamp": inicio + timedelta(seconds=insertados + i)
+            })
+        db.mensajes.insert_many(docs, ordered=False)
+        insertados += len(docs)
+        print(f"\r  insertados {insertados:,}/{n:,}", end="", flush=True)
+    print()
+
+
+def _percentil(valores: list, p: float) -> float:
+    return sorted(valores)[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="chat-bench-busqueda")
+    parser.add_argument("--n", type=int, default=1_000_000, help="Mensajes a generar")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--conservar", action="store_true", help="No borrar la base de datos al terminar")
+    args = parser.parse_args()
+
+    manager = DatabaseManager(args.uri, args.db)
+    if not manager.conectar():
+        return
+
+    usuario = ObjectId()
+    usuarios = [usuario] + [ObjectId() for _ in range(50)]
+    canales = [ObjectId() for _ in range(20)]
+    if manager.db.mensajes.estimated_document_count() < args.n:
+        print(f"[*] Generando {args.n:,} mensajes...")
+        manager.db.usuarios.insert_many([{"_id": u, "nombre": f"usuario{i}"} for i, u in enumerate(usuarios)])
+        manager.db.canales.insert_many([
+            {"_id": c, "nombre": f"canal{i}", "miembros": [usuario], "admins": []} for i, c in enumerate(canales)
+        ])
+        _poblar(manager.db, args.n, canales, usuarios)
+    else:
+        usuario = manager.db.canales.find_one()["miembros"][0]
+        canales = [c["_id"] for c in manager.db.canales.find({}, {"_id": 1})]
+
+    escenarios = {
+        "1 palabra": lambda: {"texto": _palabras(1)[0]},
+        "2 palabras": lambda: {"texto": " ".join(_palabras(2))},
+        "frase exacta": lambda: {"texto": '"' + " ".join(_palabras(2)) + '"'},
+        "1 palabra + canal": lambda: {"texto": _palabras(1)[0], "canal_id": str(random.choice(canales))},
+        "1 palabra por fecha": lambda: {"texto": _palabras(1)[0], "orden": "fecha"},
+    }
+
+    print(f"\n{'escenario':22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'media ms':>9}")
+    for nombre, generar in escenarios.items():
+        tiempos = []
+        for _ in range(args.consultas):
+            params = generar()
+            t0 = time.perf_counter()
+            manager.buscar_mensajes(str(usuario), **params)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        print(f"{nombre:22} {_percentil(tiempos, .5):9.1f} {_percentil(tiempos, .95):9.1f} "
+              f"{_percentil(tiempos, .99):9.1f} {statistics.mean(tiempos):9.1f}")
+
+    if not args.conservar:
+        manager.client.drop_database(args.db)
+    manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()
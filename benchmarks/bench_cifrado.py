@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de cifrado
+==========================
+Compara la implementación original de AES-CBC (Cipher nuevo por llamada,
+padding/unpadding manual y filtrado carácter a carácter + HMAC aparte)
+con el MotorCifrado (objetos cacheados, AES-GCM y lotes con hilos).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_cifrado [--n 20000] [--tam 200]
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import time
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+
+from config import AES_KEY, CLAVE_SECRETA
+from security import motor_cifrado
+
+
+# -------------------------------
+# Implementación original (referencia)
+# -------------------------------
+def _cifrar_original(texto: str) -> bytes:
+    datos = texto.encode("utf-8")
+    padding_len = 16 - (len(datos) % 16)
+    datos += bytes([padding_len]) * padding_len
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(AES_KEY), modes.CBC(iv), backend=default_backend()).encryptor()
+    return iv + encryptor.update(datos) + encryptor.finalize()
+
+
+def _descifrar_original(cipher_bytes: bytes) -> str:
+    decryptor = Cipher(algorithms.AES(AES_KEY), modes.CBC(cipher_bytes[:16]), backend=default_backend()).decryptor()
+    plano = decryptor.update(cipher_bytes[16:]) + decryptor.finalize()
+    texto = plano[:-plano[-1]].decode("utf-8", errors="ignore")
+    return ''.join(c for c in texto if c.isprintable() or c.isspace())
+
+
+def _cronometrar(nombre: str, funcion, n: int):
+    inicio = time.perf_counter()
+    funcion()
+    total = time.perf_counter() - inicio
+    print(f"  {nombre:42} {total * 1000:9.1f} ms  {n / total:12,.0f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000, help="Número de mensajes")
+    parser.add_argument("--tam", type=int, default=200, help="Longitud de cada mensaje")
+    args = parser.parse_args()
+
+    textos = [("mensaje de prueba ñ " * 20)[:args.tam] + str(i) for i in range(args.n)]
+
+    print(f"\n[*] {args.n} mensajes de {args.tam} caracteres\n")
+
+    originales = []
+    _cronometrar("original: cifrar CBC + HMAC",
+                 lambda: [originales.append(_cifrar_original(t)) or
+                          hmac.new(CLAVE_SECRETA, t.encode(), hashlib.sha256).digest() for t in textos],
+                 args.n)
+    _cronometrar("original: descifrar CBC",
+                 lambda: [_descifrar_original(c) for c in originales], args.n)
+
+    cbc = []
+    _cronometrar("motor: cifrar CBC",
+                 lambda: cbc.extend(motor_cifrado.cifrar_cbc(t) for t in textos), args.n)
+    _cronometrar("motor: descifrar CBC",
+                 lambda: [motor_cifrado.descifrar(c) for c in cbc], args.n)
+
+    gcm = []
+    _cronometrar("motor: cifrar GCM (una pasada)",
+                 lambda: gcm.extend(motor_cifrado.cifrar_gcm(t) for t in textos), args.n)
+    _cronometrar("motor: descifrar GCM",
+                 lambda: [motor_cifrado.descifrar(c) for c in gcm], args.n)
+
+    _cronometrar("motor: cifrar_lote GCM (1 hilo)",
+                 lambda: motor_cifrado.cifrar_lote(textos, hilos=1), args.n)
+    _cronometrar(f"motor: cifrar_lote GCM ({os.cpu_count()} hilos)",
+                 lambda: motor_cifrado.cifrar_lote(textos), args.n)
+    _cronometrar("motor: descifrar_lote (1 hilo)",
+                 lambda: motor_cifrado.descifrar_lote(gcm, hilos=1), args.n)
+    _cronometrar(f"motor: descifrar_lote ({os.cpu_count()} hilos)",
+                 lambda: motor_cifrado.descifrar_lote(gcm), args.n)
+
+    assert motor_cifrado.descifrar_lote(gcm[:100]) == textos[:100]
+    assert [motor_cifrado.descifrar(c) for c in cbc[:100]] == textos[:100]
+    print("\n[+] Resultados verificados")
+
+
+if __name__ == "__main__":
+    main()
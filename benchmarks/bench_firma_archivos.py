@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark de firma y verificación de archivos grandes
+=====================================================
+Firma y verifica archivos de --tamanos MB con FirmaDigitalService y mide
+el tiempo y el pico de memoria (RSS) que añade cada operación. Cada
+medida corre en un proceso nuevo para que el pico no herede el de la
+anterior.
+
+- anterior: el archivo entero en memoria (f.read()), hash, y la copia a
+  firmados/ escrita desde Python (implementación previa)
+- copia:    hash por bloques + shutil.copyfile (copia en el kernel), lo
+            que se usa cuando no se puede crear un enlace duro
+- enlace:   hash por bloques + enlace duro a firmados/ (caso normal)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_firma_archivos [--tamanos 1,16,128,1024]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MODOS = ("anterior", "copia", "enlace")
+
+
+def _rss_pico_mb() -> float:
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _firmar_anterior(servicio, ruta: str) -> str:
+    """Camino de firmar_archivo antes de leer por bloques (sin el .sig)."""
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    hash_contenido = hashlib.sha256(contenido).digest()
+    servicio._firmar_datos(hash_contenido)
+    destino = os.path.join(servicio.upload_folder, "firmados", os.path.basename(ruta))
+    with open(destino, "wb") as f:
+        f.write(contenido)
+    return hash_contenido.hex()
+
+
+def _verificar_anterior(ruta: str, hash_esperado: str) -> bool:
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    return hashlib.sha256(contenido).hexdigest() == hash_esperado
+
+
+def _hijo(modo: str, ruta: str, carpeta: str):
+    """Una firma + verificación en este proceso; imprime el resultado en JSON."""
+    from firma_digital.firma_service import FirmaDigitalService
+
+    servicio = FirmaDigitalService(
+        cert_path=os.path.join(carpeta, "cert.pem"),
+        key_path=os.path.join(carpeta, "key.pem"),
+        upload_folder=os.path.join(carpeta, modo)
+    )
+    servicio._firmar_datos(b"calentamiento")
+    if modo == "copia":
+        def sin_enlaces(*args):
+            raise OSError("enlaces desactivados")
+        os.link = sin_enlaces
+
+    base = _rss_pico_mb()
+    inicio = time.perf_counter()
+    if modo == "anterior":
+        hash_hex = _firmar_anterior(servicio, ruta)
+    else:
+        resultado = servicio.firmar_archivo(ruta, "bench", "Benchmark", "bench@example.com")
+        hash_hex = resultado["hash"]
+    firma_s = time.perf_counter() - inicio
+    firma_rss = _rss_pico_mb() - base
+
+    inicio = time.perf_counter()
+    if modo == "anterior":
+        valido = _verificar_anterior(ruta, hash_hex)
+    else:
+        valido = servicio.verificar_archivo_firmado(resultado["archivo_firmado"], resultado["archivo_firma"])["valido"]
+    verificar_s = time.perf_counter() - inicio
+    verificar_rss = _rss_pico_mb() - base
+
+    print(json.dumps({"firma_s": firma_s, "firma_rss": firma_rss, "verificar_s": verificar_s,
+                      "verificar_rss": verificar_rss, "valido": valido}))
+
+
+def _crear_archivo(ruta: str, mb: int):
+    bloque = os.urandom(1024 * 1024)
+    with open(ruta, "wb") as f:
+        for _ in range(mb):
+            f.write(bloque)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="1,16,128,1024", help="Tamaños en MB separados por comas")
+    parser.add_argument("--hijo", nargs=3, metavar=("MODO", "RUTA", "CARPETA"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        _hijo(*args.hijo)
+        return
+
+    from firma_digital.firma_service import FirmaDigitalService
+
+    carpeta = tempfile.mkdtemp(prefix="bench_firma_")
+    try:
+        FirmaDigitalService(
+            cert_path=os.path.join(carpeta, "cert.pem"),
+            key_path=os.path.join(carpeta, "key.pem"),
+            upload_folder=os.path.join(carpeta, "anterior")
+        ).generar_certificado_firma("Benchmark", "Benchmark")
+
+        print(f"\n  {'tamaño':>8} {'modo':9} {'firma s':>8} {'+RSS MB':>8} {'verif. s':>9} {'+RSS MB':>8}")
+        for mb in (int(t) for t in args.tamanos.split(",")):
+            ruta = os.path.join(carpeta, f"archivo_{mb}mb.pdf")
+            _crear_archivo(ruta, mb)
+            for modo in MODOS:
+                salida = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_firma_archivos", "--hijo", modo, ruta, carpeta],
+                    capture_output=True, text=True
+                )
+                if salida.returncode != 0:
+                    raise RuntimeError(salida.stderr[-2000:])
+                r = json.loads(salida.stdout.strip().splitlines()[-1])
+                if not r["valido"]:
+                    raise RuntimeError(f"Verificación fallida ({modo}, {mb} MB)")
+                print(f"  {mb:>5} MB {modo:9} {r['firma_s']:8.3f} {r['firma_rss']:8.1f} "
+                      f"{r['verificar_s']:9.3f} {r['verificar_rss']:8.1f}")
+                shutil.rmtree(os.path.join(carpeta, modo, "firmados"), ignore_errors=True)
+            os.remove(ruta)
+        print()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark de firma por lotes
+============================
+Firma --documentos archivos de pendientes/ con firma_digital.lote usando
+1, 2, 4... procesos (hasta --procesos, por defecto un proceso por núcleo)
+y mide documentos por segundo. Con 1 proceso se firma sin pool, como una
+secuencia de llamadas a /firma/firmar.
+
+El tiempo incluye el arranque del pool (spawn + carga de la clave en cada
+proceso), que es lo que paga cada petición a /firma/firmar-lote. Aquí se
+ignora FIRMA_LOTE_MIN_POR_PROCESO para medir cada nivel tal cual.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_firma_lote [--documentos 500] [--kb 64] [--procesos 8]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+
+def _preparar(carpeta: str, documentos: int, kb: int):
+    pendientes = os.path.join(carpeta, "pendientes")
+    shutil.rmtree(pendientes, ignore_errors=True)
+    shutil.rmtree(os.path.join(carpeta, "firmados"), ignore_errors=True)
+    os.makedirs(pendientes)
+    os.makedirs(os.path.join(carpeta, "firmados"))
+    for i in range(documentos):
+        with open(os.path.join(pendientes, f"doc_{i:05d}.pdf"), "wb") as f:
+            f.write(os.urandom(kb * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=500, help="Documentos por lote")
+    parser.add_argument("--kb", type=int, default=64, help="Tamaño de cada documento en KB")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Máximo de procesos a probar")
+    args = parser.parse_args()
+
+    from firma_digital.firma_service import FirmaDigitalService
+    from firma_digital.lote import firmar_lote
+
+    carpeta = tempfile.mkdtemp(prefix="bench_lote_")
+    try:
+        with contextlib.redirect_stdout(None):
+            servicio = FirmaDigitalService(
+                cert_path=os.path.join(carpeta, "cert.pem"),
+                key_path=os.path.join(carpeta, "key.pem"),
+                upload_folder=carpeta
+            )
+            servicio.generar_certificado_firma("Benchmark", "Benchmark")
+        firmante = {"id": "bench", "nombre": "Benchmark", "email": "bench@example.com"}
+
+        niveles = []
+        n = 1
+        while n < args.procesos:
+            niveles.append(n)
+            n *= 2
+        niveles.append(args.procesos)
+
+        print(f"\n[*] {args.documentos} documentos de {args.kb} KB, {os.cpu_count()} núcleos\n")
+        print(f"  {'procesos':>8} {'segundos':>9} {'docs/s':>8} {'aceleración':>12} {'errores':>8}")
+        base = None
+        for procesos in niveles:
+            _preparar(carpeta, args.documentos, args.kb)
+            inicio = time.perf_counter()
+            resultados = list(firmar_lote(None, firmante, procesos=procesos, servicio=servicio, min_por_proceso=1))
+            segundos = time.perf_counter() - inicio
+            errores = sum(1 for r in resultados if not r.get("exito"))
+            if len(resultados) != args.documentos:
+                raise RuntimeError(f"{len(resultados)} resultados para {args.documentos} documentos")
+            por_s = args.documentos / segundos
+            base = base or por_s
+            print(f"  {procesos:8} {segundos:9.2f} {por_s:8.1f} {por_s / base:11.2f}x {errores:8}")
+        print()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark de firma por manifiesto (árbol de Merkle)
+===================================================
+Firma lotes de --documentos archivos pequeños con firma_digital.lote en
+un solo proceso, de dos formas:
+
+- individual: una firma RSA-4096 (por defecto) por archivo
+- manifiesto: una firma sobre la raíz de Merkle y una prueba por archivo
+
+Mide documentos por segundo y comprueba que cada documento del
+manifiesto verifica por separado. Sale con código 1 si alguno no
+verifica.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_firma_manifiesto [--documentos 10,100,1000] [--algoritmo rsa]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+def _preparar(carpeta: str, documentos: int):
+    pendientes = os.path.join(carpeta, "pendientes")
+    shutil.rmtree(pendientes, ignore_errors=True)
+    shutil.rmtree(os.path.join(carpeta, "firmados"), ignore_errors=True)
+    os.makedirs(pendientes)
+    os.makedirs(os.path.join(carpeta, "firmados"))
+    for i in range(documentos):
+        with open(os.path.join(pendientes, f"doc_{i:05d}.txt"), "wb") as f:
+            f.write(os.urandom(4096))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", default="10,100,1000", help="Tamaños de lote separados por comas")
+    parser.add_argument("--algoritmo", default="rsa", help="rsa, ecdsa-p256 o ed25519")
+    args = parser.parse_args()
+
+    from firma_digital.firma_service import FirmaDigitalService
+    from firma_digital.lote import firmar_lote
+
+    carpeta = tempfile.mkdtemp(prefix="bench_manifiesto_")
+    fallos = 0
+    try:
+        with contextlib.redirect_stdout(None):
+            servicio = FirmaDigitalService(
+                cert_path=os.path.join(carpeta, "cert.pem"),
+                key_path=os.path.join(carpeta, "key.pem"),
+                upload_folder=carpeta
+            )
+            servicio.generar_certificado_firma("Benchmark", "Benchmark", algoritmo=args.algoritmo)
+        firmante = {"id": "bench", "nombre": "Benchmark", "email": "bench@example.com"}
+
+        print(f"\n[*] {servicio.algoritmo}, 1 proceso\n")
+        print(f"  {'documentos':>10} {'modo':11} {'segundos':>9} {'docs/s':>9} {'firmas':>7} {'prueba máx.':>12}")
+        for documentos in (int(n) for n in args.documentos.split(",")):
+            for modo in ("individual", "manifiesto"):
+                _preparar(carpeta, documentos)
+                inicio = time.perf_counter()
+                resultados = list(firmar_lote(None, firmante, procesos=1, servicio=servicio,
+                                              manifiesto=(modo == "manifiesto")))
+                segundos = time.perf_counter() - inicio
+
+                firmas = {r["metadatos"]["firma"]["valor"] for r in resultados if r.get("exito")}
+                prueba = max((len(r["metadatos"].get("manifiesto", {}).get("prueba", []))
+                              for r in resultados if r.get("exito")), default=0)
+                validos = sum(
+                    1 for r in resultados if r.get("exito") and
+                    servicio.verificar_archivo_firmado(r["archivo_firmado"], r["archivo_firma"])["valido"]
+                )
+                if validos != documentos:
+                    fallos += documentos - validos
+                print(f"  {documentos:10} {modo:11} {segundos:9.3f} {documentos / segundos:9.1f} "
+                      f"{len(firmas):7} {prueba:12}")
+        print()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    if fallos:
+        print(f"[x] {fallos} documentos no verifican")
+        sys.exit(1)
+    print("[+] Todos los documentos verifican por separado")
+
+
+if __name__ == "__main__":
+    main()
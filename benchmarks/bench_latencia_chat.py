@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia del chat con el lado HTTP ocupado
+=======================================================
+Mide la latencia de ida y vuelta (p50/p99/máx) de mensajes WebSocket
+mientras unos hilos "HTTP" reproducen el trabajo de /firma/subir +
+/firma/firmar: parsear una subida multipart de --mb MB con werkzeug y
+firmarla con FirmaDigitalService.firmar_archivo.
+
+Dos montajes del servidor WebSocket:
+
+- hilo:    en un hilo del mismo proceso que la carga (app.py antes)
+- proceso: en un proceso hijo, con su propio GIL (supervisor_ws.py)
+
+El servidor usa un manejador que imita el camino de un mensaje del chat
+(JSON, hash SHA-256, HMAC y envío al canal) sin MongoDB. El cliente
+corre siempre en su propio proceso para no medir su propia espera del GIL.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_latencia_chat [--n 500] [--hilos 4] [--mb 50]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import websockets
+from werkzeug.test import EnvironBuilder
+
+from security import calcular_hash_sha256, crear_hmac
+from firma_digital.firma_service import FirmaDigitalService
+
+HOST = "127.0.0.1"
+
+
+def _percentil(valores: list, p: float) -> float:
+    return sorted(valores)[min(len(valores) - 1, int(len(valores) * p))]
+
+
+# -------------------------------
+# Servidor (camino de un mensaje del chat, sin MongoDB)
+# -------------------------------
+async def _manejar(websocket):
+    async for raw in websocket:
+        data = json.loads(raw)
+        contenido = data["contenido"]
+        await websocket.send(json.dumps({
+            "tipo": "mensaje",
+            "contenido": contenido,
+            "hash": calcular_hash_sha256(contenido),
+            "hmac": crear_hmac(contenido.encode()),
+            "n": data["n"]
+        }))
+
+
+async def _servir(puerto: int, listo):
+    async with websockets.serve(_manejar, HOST, puerto):
+        listo.set()
+        await asyncio.Future()
+
+
+def _servidor(puerto: int, listo):
+    asyncio.run(_servir(puerto, listo))
+
+
+# -------------------------------
+# Cliente (proceso aparte)
+# -------------------------------
+async def _medir(puerto: int, n: int, pausa: float) -> list:
+    latencias = []
+    async with websockets.connect(f"ws://{HOST}:{puerto}") as ws:
+        for i in range(n):
+            inicio = time.perf_counter()
+            await ws.send(json.dumps({"tipo": "mensaje", "contenido": f"hola {i}", "n": i}))
+            await ws.recv()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            await asyncio.sleep(pausa)
+    return latencias
+
+
+def _cliente(puerto: int, n: int, pausa: float, resultado):
+    resultado.put(asyncio.run(_medir(puerto, n, pausa)))
+
+
+# -------------------------------
+# Carga HTTP (subida multipart + firma)
+# -------------------------------
+def _cargar(firma_service: FirmaDigitalService, cuerpo: bytes, detener: threading.Event, firmas: list):
+    while not detener.is_set():
+        peticion = EnvironBuilder(
+            method="POST", data={"archivo": (io.BytesIO(cuerpo), "documento.pdf")}
+        ).get_request()
+        archivo = peticion.files["archivo"]
+        ruta = os.path.join(firma_service.upload_folder, "pendientes", f"{threading.get_ident()}.pdf")
+        archivo.save(ruta)
+        firma_service.firmar_archivo(ruta, "bench", "Benchmark", "bench@example.com")
+        os.remove(ruta)
+        firmas.append(1)
+
+
+def _ejecutar(modo: str, args, firma_service: FirmaDigitalService, puerto: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    if modo == "hilo":
+        listo = threading.Event()
+        threading.Thread(target=_servidor, args=(puerto, listo), daemon=True).start()
+        servidor = None
+    else:
+        listo = ctx.Event()
+        servidor = ctx.Process(target=_servidor, args=(puerto, listo), daemon=True)
+        servidor.start()
+    listo.wait(30)
+
+    detener = threading.Event()
+    firmas = []
+    cuerpo = os.urandom(args.mb * 1024 * 1024) if args.hilos else b""
+    carga = [threading.Thread(target=_cargar, args=(firma_service, cuerpo, detener, firmas), daemon=True)
+             for _ in range(args.hilos)]
+    for hilo in carga:
+        hilo.start()
+
+    resultado = ctx.Queue()
+    cliente = ctx.Process(target=_cliente, args=(puerto, args.n, args.pausa_ms / 1000, resultado))
+    inicio = time.perf_counter()
+    cliente.start()
+    latencias = resultado.get()
+    duracion = time.perf_counter() - inicio
+    cliente.join()
+
+    detener.set()
+    for hilo in carga:
+        hilo.join()
+    if servidor:
+        servidor.terminate()
+        servidor.join()
+
+    return {
+        "p50": _percentil(latencias, 0.50),
+        "p99": _percentil(latencias, 0.99),
+        "max": max(latencias),
+        "firmas_s": len(firmas) / duracion
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=500, help="Mensajes de chat medidos por escenario")
+    parser.add_argument("--pausa-ms", type=float, default=10, help="Pausa entre mensajes del cliente")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos de carga HTTP (0 = sin carga)")
+    parser.add_argument("--mb", type=int, default=50, help="Tamaño del archivo subido y firmado")
+    parser.add_argument("--puerto", type=int, default=5901)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_latencia_")
+    try:
+        firma_service = FirmaDigitalService(
+            cert_path=os.path.join(carpeta, "cert.pem"),
+            key_path=os.path.join(carpeta, "key.pem"),
+            upload_folder=carpeta
+        )
+        firma_service.generar_certificado_firma("Benchmark", "Benchmark")
+
+        print(f"\n[*] {args.n} mensajes; carga: {args.hilos} hilos firmando archivos de {args.mb} MB\n")
+        print(f"  {'WebSocket en':12} {'p50 ms':>9} {'p99 ms':>9} {'máx ms':>9} {'firmas/s':>9}")
+        for i, modo in enumerate(("hilo", "proceso")):
+            r = _ejecutar(modo, args, firma_service, args.puerto + i)
+            print(f"  {modo:12} {r['p50']:9.2f} {r['p99']:9.2f} {r['max']:9.2f} {r['firmas_s']:9.2f}")
+        print()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
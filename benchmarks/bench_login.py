@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de logins concurrentes (bcrypt)
+=========================================
+Simula una ráfaga de logins: --concurrencia hilos "HTTP" verifican
+contraseñas bcrypt mientras otro hilo atiende peticiones ligeras (un
+json.dumps cada 5 ms) y mide su latencia.
+
+- en línea: bcrypt.checkpw en el hilo de la petición (implementación anterior)
+- pool:     PoolContrasenas (procesos acotados, cola con espera y 503)
+
+Para cada modo: logins/s, p50/p99 del login, respuestas 503 y p99 de la
+petición ligera (lo que notan las demás rutas durante la ráfaga).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_login [--n 200] [--concurrencia 32] [--rondas 12] [--procesos 2]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from contrasenas import PoolContrasenas, ServicioSaturado
+
+
+def _percentil(valores: list, p: float) -> float:
+    return sorted(valores)[min(len(valores) - 1, int(len(valores) * p))] if valores else 0.0
+
+
+def _sonda(detener: threading.Event, latencias: list):
+    """Petición ligera cada 5 ms: serializar un documento pequeño (incluye la espera por CPU)."""
+    documento = {"usuarios": [{"_id": str(i), "nombre": f"usuario {i}", "activo": True} for i in range(50)]}
+    while not detener.is_set():
+        # desde que la petición "llega" (fin de la pausa) hasta que se responde
+        llegada = time.perf_counter() + 0.005
+        time.sleep(0.005)
+        json.dumps(documento)
+        latencias.append((time.perf_counter() - llegada) * 1000)
+
+
+def _rafaga(verificar, n: int, concurrencia: int) -> dict:
+    detener = threading.Event()
+    sonda = []
+    hilo_sonda = threading.Thread(target=_sonda, args=(detener, sonda), daemon=True)
+    hilo_sonda.start()
+
+    latencias, saturados = [], []
+
+    def login(_):
+        inicio = time.perf_counter()
+        try:
+            verificar()
+        except ServicioSaturado:
+            saturados.append(1)
+            return
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as hilos:
+        list(hilos.map(login, range(n)))
+    total = time.perf_counter() - inicio
+
+    detener.set()
+    hilo_sonda.join()
+    return {
+        "logins_s": len(latencias) / total,
+        "p50": statistics.median(latencias) if latencias else 0.0,
+        "p99": _percentil(latencias, 0.99),
+        "503": len(saturados),
+        "sonda_p99": _percentil(sonda, 0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200, help="Logins de la ráfaga")
+    parser.add_argument("--concurrencia", type=int, default=32, help="Hilos HTTP simultáneos")
+    parser.add_argument("--rondas", type=int, default=12, help="Coste bcrypt")
+    parser.add_argument("--procesos", type=int, default=2, help="Procesos del pool")
+    parser.add_argument("--cola", type=int, default=16, help="Huecos de espera del pool")
+    parser.add_argument("--espera", type=float, default=5, help="Espera máxima antes de 503 (s)")
+    args = parser.parse_args()
+
+    password = "contraseña de prueba"
+    hash_guardado = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=args.rondas)).decode("ascii")
+
+    pool = PoolContrasenas(procesos=args.procesos, cola=args.cola, espera_s=args.espera, rondas=args.rondas)
+    pool.verificar(password, hash_guardado)  # arrancar los procesos antes de medir
+
+    escenarios = {
+        "en línea": lambda: bcrypt.checkpw(password.encode("utf-8"), hash_guardado.encode("ascii")),
+        f"pool ({args.procesos} proc)": lambda: pool.verificar(password, hash_guardado),
+    }
+
+    print(f"\n[*] {args.n} logins, {args.concurrencia} hilos, bcrypt coste {args.rondas}\n")
+    print(f"  {'modo':16} {'logins/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'503':>5} {'ligera p99 ms':>14}")
+    for nombre, verificar in escenarios.items():
+        r = _rafaga(verificar, args.n, args.concurrencia)
+        print(f"  {nombre:16} {r['logins_s']:9.1f} {r['p50']:9.1f} {r['p99']:9.1f} {r['503']:5} {r['sonda_p99']:14.2f}")
+    print()
+    pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmark del login con Google contra un proveedor OIDC local
+=============================================================
+Levanta en 127.0.0.1 un sustituto de Google (descubrimiento, JWKS, token
+con id_token RS256 firmado y userinfo) que cuenta las peticiones, y hace
+--logins logins completos (/login_google -> /auth) con el test client de
+Flask, dos veces por modo para simular un reinicio del proceso:
+
+- anterior: cliente authlib sin caché + llamada a userinfo en cada login
+- actual:   AppOIDC (oidc.py): descubrimiento y JWKS en disco, claims
+            del id_token verificado, sin userinfo
+
+No usa la red ni MongoDB (el usuario no se guarda).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_login_google [--logins 20]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from joserfc import jwt
+from joserfc.jwk import RSAKey
+
+CLIENT_ID = "cliente-prueba.apps.googleusercontent.com"
+
+
+class ProveedorOIDC:
+    """Sustituto mínimo de accounts.google.com que cuenta las peticiones por ruta."""
+
+    def __init__(self):
+        self.clave = RSAKey.generate_key(2048, parameters={"kid": "clave-1", "use": "sig", "alg": "RS256"})
+        self.peticiones = {}
+        self.nonces = {}   # code -> nonce
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._manejador())
+        self.url = f"http://127.0.0.1:{self._servidor.server_port}"
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+
+    def detener(self):
+        self._servidor.shutdown()
+
+    def reiniciar_contadores(self):
+        self.peticiones = {}
+
+    def _claims(self, nonce: str = None) -> dict:
+        ahora = int(time.time())
+        claims = {
+            "iss": self.url, "aud": CLIENT_ID, "sub": "1234567890",
+            "email": "ana@example.com", "email_verified": True, "name": "Ana Pérez",
+            "given_name": "Ana", "family_name": "Pérez", "picture": f"{self.url}/foto.png",
+            "iat": ahora, "exp": ahora + 3600
+        }
+        if nonce:
+            claims["nonce"] = nonce
+        return claims
+
+    def _manejador(self):
+        proveedor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, datos: dict):
+                cuerpo = json.dumps(datos).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _contar(self, ruta: str):
+                proveedor.peticiones[ruta] = proveedor.peticiones.get(ruta, 0) + 1
+
+            def do_GET(self):
+                ruta = urlparse(self.path).path
+                self._contar(ruta)
+                if ruta == "/.well-known/openid-configuration":
+                    self._json({
+                        "issuer": proveedor.url,
+                        "authorization_endpoint": f"{proveedor.url}/authorize",
+                        "token_endpoint": f"{proveedor.url}/token",
+                        "userinfo_endpoint": f"{proveedor.url}/userinfo",
+                        "jwks_uri": f"{proveedor.url}/jwks",
+                        "id_token_signing_alg_values_supported": ["RS256"]
+                    })
+                elif ruta == "/jwks":
+                    self._json({"keys": [proveedor.clave.as_dict(private=False)]})
+                elif ruta == "/userinfo":
+                    claims = proveedor._claims()
+                    claims["id"] = claims["sub"]
+                    self._json(claims)
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                ruta = urlparse(self.path).path
+                self._contar(ruta)
+                form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+                if ruta != "/token":
+                    return self.send_error(404)
+                nonce = proveedor.nonces.pop(form["code"][0], None)
+                id_token = jwt.encode({"alg": "RS256", "kid": "clave-1"}, proveedor._claims(nonce), proveedor.clave)
+                self._json({"access_token": "acceso", "token_type": "Bearer",
+                            "expires_in": 3600, "id_token": id_token})
+
+        return Manejador
+
+
+def hacer_login(cliente, proveedor: ProveedorOIDC, ruta_login: str, ruta_auth: str):
+    resp = cliente.get(ruta_login)
+    query = parse_qs(urlparse(resp.headers["Location"]).query)
+    code = os.urandom(8).hex()
+    proveedor.nonces[code] = query.get("nonce", [None])[0]
+    resp = cliente.get(f"{ruta_auth}?code={code}&state={query['state'][0]}")
+    if resp.status_code != 302:
+        raise RuntimeError(f"{ruta_auth} respondió {resp.status_code}: {resp.get_data(as_text=True)[:300]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=20, help="Logins por arranque")
+    args = parser.parse_args()
+
+    proveedor = ProveedorOIDC()
+    proveedor.iniciar()
+    directorio = tempfile.mkdtemp(prefix="bench_oidc_")
+    os.environ.update({
+        "OIDC_GOOGLE_METADATA_URL": f"{proveedor.url}/.well-known/openid-configuration",
+        "OIDC_CACHE_ARCHIVO": os.path.join(directorio, "oidc_cache.json"),
+        "GOOGLE_CLIENT_ID": CLIENT_ID,
+        "GOOGLE_CLIENT_SECRET": "secreto",
+        "AUTHLIB_INSECURE_TRANSPORT": "1",
+    })
+    from flask import redirect, url_for
+    from app import app
+    from config import oauth
+    from db_manager import db_manager
+    from oidc import AppOIDC
+
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    # Sin MongoDB: solo interesa el tráfico con el proveedor
+    db_manager.crear_o_actualizar_usuario_google = lambda *args, **kwargs: None
+
+    # Flujo anterior: sin caché y con la llamada a userinfo
+    def registrar_anterior():
+        oauth.register("google_anterior", overwrite=True, client_id=CLIENT_ID, client_secret="secreto",
+                       client_kwargs={"scope": "openid email profile"},
+                       server_metadata_url=os.environ["OIDC_GOOGLE_METADATA_URL"])
+
+    @app.get("/bench/login_anterior")
+    def login_anterior():
+        return oauth.google_anterior.authorize_redirect(url_for("auth_anterior", _external=True))
+
+    @app.get("/bench/auth_anterior")
+    def auth_anterior():
+        cliente = oauth.google_anterior
+        token = cliente.authorize_access_token()
+        cliente.get(cliente.load_server_metadata()["userinfo_endpoint"], token=token).json()
+        return redirect("/chat")
+
+    def registrar_actual():
+        oauth.register("google", overwrite=True, client_id=CLIENT_ID, client_secret="secreto",
+                       client_kwargs={"scope": "openid email profile"},
+                       server_metadata_url=os.environ["OIDC_GOOGLE_METADATA_URL"], client_cls=AppOIDC)
+
+    modos = {
+        "anterior": (registrar_anterior, "/bench/login_anterior", "/bench/auth_anterior"),
+        "actual": (registrar_actual, "/login_google", "/auth"),
+    }
+
+    print(f"\n[*] {args.logins} logins por arranque contra {proveedor.url}\n")
+    print(f"  {'modo':9} {'arranque':9} {'descubr.':>9} {'jwks':>5} {'token':>6} {'userinfo':>9} {'por login':>10} {'ms/login':>9}")
+    for modo, (registrar, ruta_login, ruta_auth) in modos.items():
+        for arranque in ("en frío", "reinicio"):
+            # Cliente nuevo = lo que ve un proceso recién arrancado
+            oauth._clients.clear()
+            registrar()
+            proveedor.reiniciar_contadores()
+            cliente = app.test_client()
+            inicio = time.perf_counter()
+            for _ in range(args.logins):
+                hacer_login(cliente, proveedor, ruta_login, ruta_auth)
+            ms = (time.perf_counter() - inicio) * 1000 / args.logins
+            p = proveedor.peticiones
+            total = sum(p.values())
+            print(f"  {modo:9} {arranque:9} {p.get('/.well-known/openid-configuration', 0):9} "
+                  f"{p.get('/jwks', 0):5} {p.get('/token', 0):6} {p.get('/userinfo', 0):9} "
+                  f"{total / args.logins:10.2f} {ms:9.1f}")
+    print()
+    proveedor.detener()
+
+
+if __name__ == "__main__":
+    main()
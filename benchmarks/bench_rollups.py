@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Comprobación y tiempos de los rollups de actividad
+==================================================
+Siembra --mensajes mensajes repartidos en --dias días (varios canales y
+usuarios, empezando a media mañana para cruzar ventanas y días) en una
+base desechable `<DB_NAME>_rollups`, ejecuta rollups.ejecutar y compara
+cada documento de `rollups` (canal/usuario por hora y por día) con un
+recuento hecho en Python sobre los mismos mensajes. Lo hace con el
+esquema de un documento por mensaje y con el de buckets, y vuelve a
+ejecutar desde cero para comprobar que reprocesar es idempotente.
+
+Sale con código 1 si algún rollup no coincide. Necesita un MongoDB 5.0+
+real en --uri o MONGO_URI: los pipelines usan $dateTrunc y $merge, que
+mongomock no implementa.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_rollups [--uri <mongo>] [--mensajes 20000] [--dias 3]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+def _sembrar(db, mensajes: int, dias: int) -> list:
+    from bson import ObjectId
+
+    canales = [ObjectId() for _ in range(4)]
+    usuarios = [ObjectId() for _ in range(12)]
+    hoy = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio = hoy - timedelta(days=dias) + timedelta(hours=10, minutes=17)
+    segundos = int((hoy - inicio).total_seconds())
+    aleatorio = random.Random(7)
+    docs = []
+    for _ in range(mensajes):
+        longitud = aleatorio.randint(1, 300)
+        docs.append({
+            "_id": ObjectId(),
+            "usuario_id": aleatorio.choice(usuarios),
+            "canal_id": aleatorio.choice(canales),
+            "mensaje": "x" * longitud,
+            "hash_sha256": os.urandom(32).hex(),
+            "longitud": longitud,
+            "timestamp": inicio + timedelta(seconds=aleatorio.randrange(segundos),
+                                            milliseconds=aleatorio.randrange(1000))
+        })
+    db.mensajes.insert_many(docs)
+    return docs
+
+
+def _esperados(docs: list) -> dict:
+    """{(tipo, clave, periodo): (mensajes, bytes, autores)} calculado en Python."""
+    horas, autores = {}, {}
+    for d in docs:
+        hora = d["timestamp"].replace(minute=0, second=0, microsecond=0)
+        for dimension, clave in (("canal", d["canal_id"]), ("usuario", d["usuario_id"])):
+            n, b = horas.get((dimension, clave, hora), (0, 0))
+            horas[(dimension, clave, hora)] = (n + 1, b + d["longitud"])
+        autores.setdefault((d["canal_id"], hora), set()).add(d["usuario_id"])
+
+    esperados = {}
+    for (dimension, clave, hora), (n, b) in horas.items():
+        esperados[(f"{dimension}_hora", clave, hora)] = (
+            n, b, len(autores[(clave, hora)]) if dimension == "canal" else None
+        )
+        dia = (f"{dimension}_dia", clave, hora.replace(hour=0))
+        n_dia, b_dia, _ = esperados.get(dia, (0, 0, None))
+        esperados[dia] = (n_dia + n, b_dia + b, None)
+    return esperados
+
+
+def _diferencias(db, esperados: dict) -> list:
+    obtenidos = {
+        (r["tipo"], r["clave"], r["periodo"]): (r["mensajes"], r["bytes"], r.get("autores"))
+        for r in db.rollups.find()
+    }
+    diferencias = [f"{k[0]} {k[1]} {k[2]}: {obtenidos.get(k)} != {v}"
+                   for k, v in esperados.items() if obtenidos.get(k) != v]
+    diferencias += [f"{k[0]} {k[1]} {k[2]}: sobra {v}" for k, v in obtenidos.items() if k not in esperados]
+    return diferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="MongoDB a usar (por defecto MONGO_URI)")
+    parser.add_argument("--mensajes", type=int, default=20000, help="Mensajes sembrados")
+    parser.add_argument("--dias", type=int, default=3, help="Días que abarcan los mensajes")
+    args = parser.parse_args()
+
+    if args.uri:
+        os.environ["MONGO_URI"] = args.uri
+
+    from config import DB_NAME
+    from db_manager import db_manager
+    import migrar_buckets
+    import rollups
+
+    if not db_manager.conectar():
+        sys.exit("[x] No se pudo conectar a MONGO_URI (hace falta MongoDB 5.0+)")
+    nombre_db = f"{DB_NAME}_rollups"
+    db_manager.client.drop_database(nombre_db)
+    db_manager.db = db_manager.client[nombre_db]
+    db_manager._inicializar_colecciones()
+
+    fallos = []
+    try:
+        docs = _sembrar(db_manager.db, args.mensajes, args.dias)
+        esperados = _esperados(docs)
+        print(f"\n[*] {args.mensajes} mensajes en {args.dias} días, {len(esperados)} rollups esperados\n")
+        print(f"  {'esquema':10} {'pasada':12} {'segundos':>9} {'ventanas':>9} {'diferencias':>12}")
+
+        for esquema in ("mensajes", "bucket"):
+            db_manager.modo_bucket = esquema == "bucket"
+            if db_manager.modo_bucket:
+                with contextlib.redirect_stdout(None):
+                    migrar_buckets.migrar(db_manager, borrar=True)
+            for pasada in ("desde cero", "repetida"):
+                if pasada == "desde cero":
+                    db_manager.db.rollups.delete_many({})
+                inicio = time.perf_counter()
+                estado = rollups.ejecutar(db_manager, desde_cero=True)
+                segundos = time.perf_counter() - inicio
+                diferencias = _diferencias(db_manager.db, esperados)
+                print(f"  {esquema:10} {pasada:12} {segundos:9.2f} {estado.get('ventanas', 0):9} "
+                      f"{len(diferencias):12}")
+                fallos += [f"{esquema}, {pasada}: {d}" for d in diferencias[:5]]
+        print()
+    finally:
+        db_manager.client.drop_database(nombre_db)
+        db_manager.cerrar()
+
+    if fallos:
+        print("[x] Rollups que no coinciden con el recuento:")
+        for fallo in fallos:
+            print(f"    - {fallo}")
+        sys.exit(1)
+    print("[+] Rollups iguales al recuento en Python")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Viajes a MongoDB por método de DatabaseManager
+==============================================
+Envuelve `db_manager.db` en un proxy que cuenta las operaciones que hace
+cada método contra el servidor, separando las que esperan respuesta de
+las escrituras sin confirmación (w=0), y las compara con lo esperado.
+
+Sale con código 1 si algún método hace más viajes de los esperados, para
+usarlo como control de regresiones.
+
+Usa una base desechable `<DB_NAME>_viajes` en --uri o MONGO_URI (se
+borra al terminar); con --mongomock no necesita servidor.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_viajes_db [--uri <mongo> | --mongomock]
+    python benchmarks/bench_viajes_db.py [--uri <mongo> | --mongomock]
+"""
+
+import argparse
+import os
+import sys
+
+# Ejecutado como script (sin -m) la raíz del proyecto no está en sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Operaciones de Collection que hablan con el servidor
+OPERACIONES = {
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "find_one_and_update", "find_one_and_replace",
+    "find_one_and_delete", "bulk_write", "aggregate", "count_documents", "distinct"
+}
+
+# (viajes con respuesta, escrituras w=0). _invalidar (versiones de la caché HTTP) es un viaje más
+ESPERADOS = {
+    "crear_canal": (2, 0),
+    "crear_canal (duplicado)": (1, 0),
+    "crear_o_actualizar_usuario_google (nuevo)": (2, 0),
+    "crear_o_actualizar_usuario_google (existente)": (2, 0),
+    "login_usuario_classico": (3, 0),
+    "login_usuario_classico (contraseña incorrecta)": (1, 0),
+    "comando_admin_canal": (3, 0),
+    "comando_admin_canal (email desconocido)": (1, 0),
+    "agregar_usuario_a_canal_por_id": (2, 0),
+    # `ultimo` del canal y contadores del usuario van aparte (_volcar_mensajes)
+    "guardar_mensaje": (1, 0),
+}
+
+
+class Contador:
+    def __init__(self):
+        self.viajes = 0
+        self.sin_espera = 0
+        self.operaciones = []
+
+
+class _ColeccionContada:
+    def __init__(self, coleccion, contador: Contador):
+        self._coleccion = coleccion
+        self._contador = contador
+
+    def with_options(self, *args, **kwargs):
+        return _ColeccionContada(self._coleccion.with_options(*args, **kwargs), self._contador)
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._coleccion, nombre)
+        if nombre not in OPERACIONES:
+            return atributo
+
+        def contada(*args, **kwargs):
+            if self._coleccion.write_concern.acknowledged:
+                self._contador.viajes += 1
+            else:
+                self._contador.sin_espera += 1
+            self._contador.operaciones.append(f"{self._coleccion.name}.{nombre}")
+            return atributo(*args, **kwargs)
+        return contada
+
+
+class BaseContada:
+    def __init__(self, db, contador: Contador):
+        self._db = db
+        self._contador = contador
+
+    def __getattr__(self, nombre):
+        return _ColeccionContada(getattr(self._db, nombre), self._contador)
+
+    def __getitem__(self, nombre):
+        return _ColeccionContada(self._db[nombre], self._contador)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="MongoDB a usar (por defecto MONGO_URI)")
+    parser.add_argument("--mongomock", action="store_true", help="Usar mongomock en lugar de un servidor")
+    args = parser.parse_args()
+
+    if args.uri:
+        os.environ["MONGO_URI"] = args.uri
+
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    from db_manager import db_manager
+    from config import DB_NAME
+
+    if args.mongomock:
+        import mongomock
+        db_manager.client = mongomock.MongoClient()
+    elif not db_manager.conectar():
+        sys.exit("[x] No se pudo conectar a MONGO_URI (usa --mongomock para probar sin servidor)")
+    nombre_db = f"{DB_NAME}_viajes"
+    db_manager.client.drop_database(nombre_db)
+    db_manager.db = db_manager.client[nombre_db]
+    db_manager.conectado = True
+    db_manager._inicializar_colecciones()
+    base = db_manager.db
+
+    # Datos de partida
+    from contrasenas import pool_contrasenas
+    admin_id = db_manager.crear_usuario_classico("Admin", "Uno", "admin@ejemplo.com", "secreta")
+    otro_id = db_manager.crear_usuario_classico("Otro", "Dos", "otro@ejemplo.com", "secreta")
+    canal_id = db_manager.crear_canal("general-viajes", admin_id)
+
+    escenarios = {
+        "crear_canal": lambda: db_manager.crear_canal("canal-viajes", admin_id),
+        "crear_canal (duplicado)": lambda: db_manager.crear_canal("canal-viajes", admin_id),
+        "crear_o_actualizar_usuario_google (nuevo)": lambda: db_manager.crear_o_actualizar_usuario_google(
+            "Gina", "Tres", "g-123", "gina@ejemplo.com", None),
+        "crear_o_actualizar_usuario_google (existente)": lambda: db_manager.crear_o_actualizar_usuario_google(
+            "Gina", "Tres", "g-123", "gina@ejemplo.com", None),
+        "login_usuario_classico": lambda: db_manager.login_usuario_classico("admin@ejemplo.com", "secreta"),
+        "login_usuario_classico (contraseña incorrecta)": lambda: db_manager.login_usuario_classico(
+            "admin@ejemplo.com", "otra"),
+        "comando_admin_canal": lambda: db_manager.comando_admin_canal(
+            "/agregar", "general-viajes", admin_id, "otro@ejemplo.com"),
+        "comando_admin_canal (email desconocido)": lambda: db_manager.comando_admin_canal(
+            "/agregar", "general-viajes", admin_id, "nadie@ejemplo.com"),
+        "agregar_usuario_a_canal_por_id": lambda: db_manager.agregar_usuario_a_canal_por_id(canal_id, otro_id),
+        "guardar_mensaje": lambda: db_manager.guardar_mensaje(admin_id, canal_id, "hola", None, "Admin"),
+    }
+
+    fallos = []
+    print(f"\n  {'método':48} {'viajes':>7} {'w=0':>4} {'esperado':>9}  operaciones")
+    for nombre, llamada in escenarios.items():
+        contador = Contador()
+        db_manager.db = BaseContada(base, contador)
+        resultado = llamada()
+        db_manager.db = base
+        esperado = ESPERADOS[nombre]
+        medido = (contador.viajes, contador.sin_espera)
+        marca = "" if medido == esperado else "  <-- !"
+        print(f"  {nombre:48} {medido[0]:7} {medido[1]:4} {'%d + %d' % esperado:>9}  "
+              f"{', '.join(contador.operaciones)} -> {resultado!r}{marca}")
+        if medido != esperado:
+            fallos.append(f"{nombre}: {medido} != {esperado}")
+
+    db_manager.client.drop_database(nombre_db)
+    pool_contrasenas.cerrar()
+    print()
+    if fallos:
+        print("[x] Más viajes de los esperados:")
+        for fallo in fallos:
+            print(f"    - {fallo}")
+        sys.exit(1)
+    print("[+] Viajes dentro de lo esperado")
+
+
+if __name__ == "__main__":
+    main()
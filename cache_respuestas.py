@@ -0,0 +1,153 @@
+# cache_respuestas.py
+"""
+Caché de respuestas HTTP (ETag / Last-Modified)
+===============================================
+Decorador para rutas JSON de `rutas` y `firma_bp`:
+
+    @respuesta_cacheable(lambda usuario_id: [(db_manager, f"usuario:{usuario_id}")])
+
+Cada dependencia es (proveedor, clave) y el proveedor expone
+version_info(clave) -> (version, fecha_modificacion). Las escrituras de
+DatabaseManager y FirmaDigitalService incrementan esas versiones.
+
+- Si If-None-Match / If-Modified-Since coinciden: 304 sin ejecutar la vista
+- Si la respuesta está en memoria para (ruta, usuario, versiones): se sirve
+  sin ejecutar la vista
+- Si no: se ejecuta, y las respuestas 200 se guardan en un LRU acotado por
+  número de entradas y bytes
+
+Sin dependencias (dependencias=None) el ETag es el hash del cuerpo: se
+ejecuta la vista pero se ahorra la transferencia si no cambió.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import request, session, Response, make_response
+
+from config import CACHE_RESPUESTAS_MAX_ENTRADAS, CACHE_RESPUESTAS_MAX_BYTES
+from metricas import metricas
+
+
+class CacheRespuestas:
+    """LRU en memoria de cuerpos de respuesta (thread-safe)."""
+
+    def __init__(self, max_entradas: int = CACHE_RESPUESTAS_MAX_ENTRADAS,
+                 max_bytes: int = CACHE_RESPUESTAS_MAX_BYTES):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave: str, cuerpo: bytes, mimetype: str):
+        if len(cuerpo) > self.max_bytes // 4:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior:
+                self._bytes -= len(anterior[0])
+            self._entradas[clave] = (cuerpo, mimetype)
+            self._bytes += len(cuerpo)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (viejo, _) = self._entradas.popitem(last=False)
+                self._bytes -= len(viejo)
+                metricas.incrementar("cache_http.desalojos")
+            metricas.fijar("cache_http.entradas", len(self._entradas))
+            metricas.fijar("cache_http.bytes", self._bytes)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+
+# instancia global
+cache_respuestas = CacheRespuestas()
+
+
+def _versiones(dependencias: list) -> tuple:
+    """Versiones de las dependencias y la fecha de modificación más reciente."""
+    versiones = []
+    ultima = None
+    for proveedor, clave in dependencias:
+        version, fecha = proveedor.version_info(clave)
+        versiones.append(f"{clave}:{version}")
+        if fecha and (ultima is None or fecha > ultima):
+            ultima = fecha
+    return tuple(versiones), ultima
+
+
+def _no_modificado(etag: str, ultima: datetime | None) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if ultima and request.if_modified_since:
+        return ultima.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def _preparar(respuesta: Response, etag: str, ultima: datetime | None) -> Response:
+    respuesta.set_etag(etag)
+    if ultima:
+        respuesta.last_modified = ultima
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+
+def respuesta_cacheable(dependencias=None, cache: CacheRespuestas = cache_respuestas):
+    """
+    Decorador de vistas JSON. `dependencias(**kwargs_de_la_ruta)` devuelve la
+    lista de (proveedor, clave) de la que depende la respuesta.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            usuario = (session.get("user") or {}).get("_id")
+            if dependencias is None:
+                return _por_contenido(vista(*args, **kwargs))
+            if not usuario:
+                # Sin sesión la vista decide (normalmente 401); nada de 304 ni memoria
+                return vista(*args, **kwargs)
+
+            versiones, ultima = _versiones(dependencias(**kwargs))
+            clave = f"{request.full_path}|{usuario}|{'|'.join(versiones)}"
+            etag = hashlib.sha256(clave.encode("utf-8")).hexdigest()[:32]
+
+            if _no_modificado(etag, ultima):
+                metricas.incrementar("cache_http.304")
+                return _preparar(Response(status=304), etag, ultima)
+
+            guardada = cache.obtener(clave)
+            if guardada:
+                metricas.incrementar("cache_http.memoria")
+                cuerpo, mimetype = guardada
+                return _preparar(Response(cuerpo, mimetype=mimetype), etag, ultima)
+
+            metricas.incrementar("cache_http.fallos")
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+            cache.guardar(clave, respuesta.get_data(), respuesta.mimetype)
+            return _preparar(respuesta, etag, ultima)
+        return envoltura
+    return decorador
+
+
+def _por_contenido(resultado) -> Response:
+    respuesta = make_response(resultado)
+    if respuesta.status_code != 200:
+        return respuesta
+    etag = hashlib.sha256(respuesta.get_data()).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        metricas.incrementar("cache_http.304")
+        return _preparar(Response(status=304), etag, None)
+    return _preparar(respuesta, etag, None)
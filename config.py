@@ -1,20 +1,25 @@
 # config.py
 import os
 import base64
-from authlib.integrations.flask_client import OAuth
+import threading
 from dotenv import load_dotenv
 
 # Cargar variables de ambiente
 load_dotenv()
 
-oauth = OAuth()
-
 # ----------------------------------
 # Configuración del servidor WebSocket
 # ----------------------------------
 IP_SERVIDOR = os.environ.get("WS_HOST", "0.0.0.0")
 PUERTO = int(os.environ.get("WS_PORT", 5001))
 
+# Supervisión del proceso WebSocket (supervisor_ws.py)
+WS_LATIDO_S = float(os.environ.get("WS_LATIDO_S", 2))
+WS_BACKOFF_INICIAL_S = float(os.environ.get("WS_BACKOFF_INICIAL_S", 1))
+WS_BACKOFF_MAX_S = float(os.environ.get("WS_BACKOFF_MAX_S", 30))
+# Estado del proceso WS compartido con los workers HTTP (/ws/salud, /ws/metricas)
+WS_ESTADO_ARCHIVO = os.environ.get("WS_ESTADO_ARCHIVO", ".ws_estado.json")
+
 # ----------------------------------
 # Claves de encriptación
 # ----------------------------------
@@ -47,9 +52,83 @@ def _get_hmac_key():
         )
     return key.encode('utf-8')
 
-# Cargar claves (se validarán al importar el módulo)
-AES_KEY = _get_aes_key()
-CLAVE_SECRETA = _get_hmac_key()
+def _get_aes_keyring(clave_principal: bytes, id_principal: int) -> dict:
+    """
+    Construye el llavero AES {id: clave}.
+    AES_KEY_BASE64 ocupa el id AES_KEY_ID; AES_KEYRING añade claves extra
+    con el formato "id:base64,id:base64" (ids 1-255).
+    """
+    llavero = {id_principal: clave_principal}
+    for entrada in filter(None, os.environ.get("AES_KEYRING", "").split(",")):
+        try:
+            id_txt, key_base64 = entrada.strip().split(":", 1)
+            id_clave = int(id_txt)
+        except ValueError:
+            raise ValueError(f"[ERROR] Entrada de AES_KEYRING mal formada: {entrada!r}")
+        key_bytes = base64.b64decode(key_base64)
+        if not 1 <= id_clave <= 255:
+            raise ValueError(f"[ERROR] Id de clave AES fuera de rango (1-255): {id_clave}")
+        if len(key_bytes) != 32:
+            raise ValueError(f"[ERROR] La clave AES {id_clave} debe ser de 32 bytes, se recibieron {len(key_bytes)} bytes")
+        llavero[id_clave] = key_bytes
+    return llavero
+
+def _get_aes_key_id_activa() -> int:
+    """Id de la clave con la que se cifra; debe existir en el llavero."""
+    id_activa = int(os.environ.get("AES_KEY_ID_ACTIVA", AES_KEY_ID))
+    if id_activa not in _diferido("AES_KEYRING"):
+        raise ValueError(f"[ERROR] AES_KEY_ID_ACTIVA={id_activa} no existe en el llavero AES")
+    return id_activa
+
+def _get_ticket_ws_llavero() -> dict:
+    """
+    Llavero de los tickets de conexión WebSocket {kid: clave}.
+    TICKET_WS_CLAVES="kid:base64,kid:base64"; sin él se deriva la clave
+    "0" de HMAC_SECRET_KEY (la comparten el proceso HTTP y el WS).
+    """
+    import hashlib
+    import hmac
+    llavero = {}
+    for entrada in filter(None, os.environ.get("TICKET_WS_CLAVES", "").split(",")):
+        try:
+            kid, key_base64 = entrada.strip().split(":", 1)
+        except ValueError:
+            raise ValueError(f"[ERROR] Entrada de TICKET_WS_CLAVES mal formada: {entrada!r}")
+        key_bytes = base64.b64decode(key_base64)
+        if len(key_bytes) < 32:
+            raise ValueError(f"[ERROR] La clave de tickets {kid} debe tener al menos 32 bytes")
+        llavero[kid] = key_bytes
+    if not llavero:
+        llavero["0"] = hmac.new(_diferido("CLAVE_SECRETA"), b"tickets-ws", hashlib.sha256).digest()
+    return llavero
+
+def _get_ticket_ws_kid_activo() -> str:
+    """Kid con el que se firman los tickets nuevos; debe existir en el llavero."""
+    llavero = _diferido("TICKET_WS_LLAVERO")
+    kid = os.environ.get("TICKET_WS_KID_ACTIVO") or max(llavero)
+    if kid not in llavero:
+        raise ValueError(f"[ERROR] TICKET_WS_KID_ACTIVO={kid} no existe en TICKET_WS_CLAVES")
+    return kid
+
+# Login con Google (oidc.py): descubrimiento OIDC y claves JWKS cacheadas en disco
+OIDC_GOOGLE_METADATA_URL = os.environ.get(
+    "OIDC_GOOGLE_METADATA_URL", "https://accounts.google.com/.well-known/openid-configuration"
+)
+OIDC_CACHE_ARCHIVO = os.environ.get("OIDC_CACHE_ARCHIVO", ".oidc_cache.json")
+OIDC_METADATA_TTL_S = float(os.environ.get("OIDC_METADATA_TTL_S", 86400))
+OIDC_JWKS_TTL_S = float(os.environ.get("OIDC_JWKS_TTL_S", 3600))
+# Mínimo entre recargas forzadas de JWKS por un `kid` desconocido
+OIDC_JWKS_REFRESCO_MIN_S = float(os.environ.get("OIDC_JWKS_REFRESCO_MIN_S", 30))
+
+# Tickets de conexión WebSocket (tickets_ws.py): validez y nonces recordados contra reenvíos
+TICKET_WS_TTL_S = int(os.environ.get("TICKET_WS_TTL_S", 60))
+TICKET_WS_MAX_NONCES = int(os.environ.get("TICKET_WS_MAX_NONCES", 100000))
+
+# Llavero AES para rotación: la clave activa cifra, todas descifran
+AES_KEY_ID = int(os.environ.get("AES_KEY_ID", 1))
+
+# Hilos para cifrado/descifrado por lotes (0 = número de CPUs)
+CRYPTO_HILOS = int(os.environ.get("CRYPTO_HILOS", 0)) or None
 
 # ----------------------------------
 # Configuración de MongoDB
@@ -61,6 +140,71 @@ if not MONGO_URI:
 DB_NAME = os.environ.get("DB_NAME", "chat-cybersecurity")
 ENABLE_DB = os.environ.get("ENABLE_DB", "true").lower() == "true"
 
+# MongoClient (uno por proceso): pool de conexiones y detección de caídas
+MONGO_MAX_POOL = int(os.environ.get("MONGO_MAX_POOL", 100))
+MONGO_MIN_POOL = int(os.environ.get("MONGO_MIN_POOL", 0))
+MONGO_MAX_IDLE_MS = int(os.environ.get("MONGO_MAX_IDLE_MS", 300000))
+# Espera máxima por una conexión libre del pool antes de fallar (pool agotado)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+# Compresión del protocolo, separada por comas (zstd y snappy requieren paquetes extra; vacío = sin compresión)
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "zlib")
+MONGO_RETRY_WRITES = os.environ.get("MONGO_RETRY_WRITES", "true").lower() == "true"
+MONGO_SELECCION_TIMEOUT_MS = int(os.environ.get("MONGO_SELECCION_TIMEOUT_MS", 5000))
+# Cada cuánto comprueba pymongo los servidores (también lo que tarda en cerrarse el circuito)
+MONGO_HEARTBEAT_MS = int(os.environ.get("MONGO_HEARTBEAT_MS", 5000))
+
+# Almacenamiento de mensajes: "documento" (uno por mensaje) o "bucket"
+# (un documento por canal y hora con hasta BUCKET_MAX_MENSAJES mensajes)
+MENSAJES_ALMACENAMIENTO = os.environ.get("MENSAJES_ALMACENAMIENTO", "documento").lower()
+BUCKET_MAX_MENSAJES = int(os.environ.get("BUCKET_MAX_MENSAJES", 200))
+# Cada cuánto se vuelcan en bloque el último mensaje de cada canal y los
+# contadores de mensajes por usuario (fuera del camino de cada mensaje)
+MENSAJES_VOLCADO_S = float(os.environ.get("MENSAJES_VOLCADO_S", 2))
+
+# ----------------------------------
+# Estadísticas materializadas
+# ----------------------------------
+# Cada cuánto se recalcula el documento de estadísticas y antigüedad máxima al leerlo
+ESTADISTICAS_INTERVALO_S = float(os.environ.get("ESTADISTICAS_INTERVALO_S", 60))
+ESTADISTICAS_MAX_ANTIGUEDAD_S = float(os.environ.get("ESTADISTICAS_MAX_ANTIGUEDAD_S", 300))
+# Cada cuánto se agregan las horas completas en `rollups` (rollups.py)
+ROLLUPS_INTERVALO_MIN = float(os.environ.get("ROLLUPS_INTERVALO_MIN", 15))
+
+# ----------------------------------
+# Caché HTTP (ETag)
+# ----------------------------------
+# Cada cuánto se releen de Mongo las versiones de datos que escriben otros procesos
+CACHE_VERSIONES_TTL_S = float(os.environ.get("CACHE_VERSIONES_TTL_S", 2))
+# Respuestas guardadas en memoria por proceso (límite de entradas y de bytes)
+CACHE_RESPUESTAS_MAX_ENTRADAS = int(os.environ.get("CACHE_RESPUESTAS_MAX_ENTRADAS", 512))
+CACHE_RESPUESTAS_MAX_BYTES = int(os.environ.get("CACHE_RESPUESTAS_MAX_BYTES", 32 * 1024 * 1024))
+
+# ----------------------------------
+# Contraseñas (bcrypt, contrasenas.py)
+# ----------------------------------
+# Coste de bcrypt; los hashes con otro coste se actualizan en el siguiente login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# Procesos del pool por proceso servidor, peticiones en espera y espera máxima (luego 503)
+BCRYPT_PROCESOS = int(os.environ.get("BCRYPT_PROCESOS", 2))
+BCRYPT_COLA = int(os.environ.get("BCRYPT_COLA", 16))
+BCRYPT_ESPERA_S = float(os.environ.get("BCRYPT_ESPERA_S", 5))
+
+# ----------------------------------
+# Re-cifrado en segundo plano (rotación de claves)
+# ----------------------------------
+RECIFRADO_AUTOMATICO = os.environ.get("RECIFRADO_AUTOMATICO", "false").lower() == "true"
+RECIFRADO_TAM_LOTE = int(os.environ.get("RECIFRADO_TAM_LOTE", 500))
+RECIFRADO_DOCS_POR_SEGUNDO = int(os.environ.get("RECIFRADO_DOCS_POR_SEGUNDO", 2000))
+
+# ----------------------------------
+# Retención y archivo frío de mensajes
+# ----------------------------------
+RETENCION_DIAS = int(os.environ.get("RETENCION_DIAS", 90))
+ARCHIVO_MENSAJES_DIR = os.environ.get("ARCHIVO_MENSAJES_DIR", "archivo_mensajes")
+ARCHIVADO_TAM_LOTE = int(os.environ.get("ARCHIVADO_TAM_LOTE", 1000))
+ARCHIVADO_AUTOMATICO = os.environ.get("ARCHIVADO_AUTOMATICO", "false").lower() == "true"
+ARCHIVADO_INTERVALO_HORAS = float(os.environ.get("ARCHIVADO_INTERVALO_HORAS", 24))
+
 # ----------------------------------
 # Configuración de Auditoría
 # ----------------------------------
@@ -79,3 +223,52 @@ SSL_KEY_PATH = os.environ.get("SSL_KEY_PATH", "certs/key.pem")
 # ----------------------------------
 FLASK_PORT = int(os.environ.get("FLASK_PORT", 5000))
 FLASK_DEBUG = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
+
+# Sesiones en el servidor (sesiones_servidor.py): duración, LRU por proceso y
+# cuánto se reutiliza una entrada del LRU antes de releerla de MongoDB
+SESION_DURACION_H = float(os.environ.get("SESION_DURACION_H", 168))
+SESIONES_CACHE_MAX = int(os.environ.get("SESIONES_CACHE_MAX", 10000))
+SESIONES_CACHE_TTL_S = float(os.environ.get("SESIONES_CACHE_TTL_S", 2))
+
+# ----------------------------------
+# Servidor HTTP de producción (servidor_produccion.py, gunicorn)
+# ----------------------------------
+HTTP_HOST = os.environ.get("HTTP_HOST", "0.0.0.0")
+HTTP_WORKERS = int(os.environ.get("HTTP_WORKERS", 0)) or (os.cpu_count() or 1) * 2 + 1
+HTTP_THREADS = int(os.environ.get("HTTP_THREADS", 4))
+HTTP_TIMEOUT = int(os.environ.get("HTTP_TIMEOUT", 60))
+HTTP_KEEPALIVE = int(os.environ.get("HTTP_KEEPALIVE", 5))
+HTTP_MAX_REQUESTS = int(os.environ.get("HTTP_MAX_REQUESTS", 2000))
+
+
+# ----------------------------------
+# Valores diferidos
+# ----------------------------------
+# Las claves se leen y validan, y authlib se importa, en el primer acceso
+# (`from config import AES_KEY`), no al importar config: los procesos y
+# scripts que no cifran ni hacen login no pagan ese coste ni fallan por ello.
+def _crear_oauth():
+    from authlib.integrations.flask_client import OAuth
+    return OAuth()
+
+_DIFERIDOS = {
+    "AES_KEY": _get_aes_key,
+    "CLAVE_SECRETA": _get_hmac_key,
+    "AES_KEYRING": lambda: _get_aes_keyring(_diferido("AES_KEY"), AES_KEY_ID),
+    "AES_KEY_ID_ACTIVA": _get_aes_key_id_activa,
+    "TICKET_WS_LLAVERO": _get_ticket_ws_llavero,
+    "TICKET_WS_KID_ACTIVO": _get_ticket_ws_kid_activo,
+    "oauth": _crear_oauth,
+}
+_diferidos_lock = threading.RLock()
+
+def _diferido(nombre: str):
+    with _diferidos_lock:
+        if nombre not in globals():
+            globals()[nombre] = _DIFERIDOS[nombre]()
+        return globals()[nombre]
+
+def __getattr__(nombre: str):
+    if nombre in _DIFERIDOS:
+        return _diferido(nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
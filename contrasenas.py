@@ -0,0 +1,114 @@
+# contrasenas.py
+"""
+Hash de contraseñas (bcrypt) en un pool de procesos acotado
+===========================================================
+bcrypt cuesta cientos de ms de CPU por llamada. En lugar de ejecutarlo en
+el hilo de la petición, DatabaseManager lo envía a un ProcessPoolExecutor
+de BCRYPT_PROCESOS procesos:
+
+- Como mucho BCRYPT_PROCESOS + BCRYPT_COLA llamadas en curso por proceso;
+  si no hay hueco en BCRYPT_ESPERA_S se lanza ServicioSaturado (503)
+- El coste (BCRYPT_ROUNDS) es configurable; necesita_rehash() indica si
+  un hash guardado usa otro coste para actualizarlo tras un login correcto
+- El pool se crea en el primer uso y de nuevo tras un fork (cada worker
+  de gunicorn tiene el suyo)
+
+Hashes estándar $2a$/$2b$ (compatibles con los creados con passlib).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from config import BCRYPT_ROUNDS, BCRYPT_PROCESOS, BCRYPT_COLA, BCRYPT_ESPERA_S
+from metricas import metricas
+
+
+class ServicioSaturado(Exception):
+    """No hubo hueco en el pool de bcrypt dentro del tiempo de espera."""
+
+
+def _bytes(password: str) -> bytes:
+    # bcrypt solo usa los primeros 72 bytes
+    return password.encode("utf-8")[:72]
+
+
+# Se ejecutan en los procesos del pool
+def _hashear(password: bytes, rondas: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rondas)).decode("ascii")
+
+
+def _verificar(password: bytes, hash_guardado: str) -> bool:
+    return bcrypt.checkpw(password, hash_guardado.encode("ascii"))
+
+
+def rondas_de(hash_guardado: str) -> int:
+    """Coste de un hash bcrypt ($2b$12$... -> 12)."""
+    return int(hash_guardado.split("$")[2])
+
+
+class PoolContrasenas:
+    """Hash y verificación bcrypt fuera del hilo de la petición."""
+
+    def __init__(self, procesos: int = BCRYPT_PROCESOS, cola: int = BCRYPT_COLA,
+                 espera_s: float = BCRYPT_ESPERA_S, rondas: int = BCRYPT_ROUNDS):
+        self.procesos = procesos
+        self.espera_s = espera_s
+        self.rondas = rondas
+        self._huecos = threading.BoundedSemaphore(procesos + cola)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn: no se hace fork de un proceso con hilos (Flask, gunicorn gthread)
+                self._executor = ProcessPoolExecutor(
+                    self.procesos, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _ejecutar(self, funcion, *args):
+        inicio = time.perf_counter()
+        if not self._huecos.acquire(timeout=self.espera_s):
+            metricas.incrementar("bcrypt.saturado")
+            raise ServicioSaturado("El servicio de contraseñas está saturado")
+        try:
+            return self._pool().submit(funcion, *args).result()
+        except BrokenProcessPool:
+            # Un proceso del pool murió: se recrea en la siguiente llamada
+            with self._lock:
+                self._executor = None
+            metricas.incrementar("bcrypt.pool_roto")
+            raise ServicioSaturado("El pool de contraseñas se está reiniciando")
+        finally:
+            self._huecos.release()
+            metricas.observar("bcrypt.llamada", time.perf_counter() - inicio)
+
+    def hashear(self, password: str) -> str:
+        return self._ejecutar(_hashear, _bytes(password), self.rondas)
+
+    def verificar(self, password: str, hash_guardado: str) -> bool:
+        if not hash_guardado:
+            return False
+        return self._ejecutar(_verificar, _bytes(password), hash_guardado)
+
+    def necesita_rehash(self, hash_guardado: str) -> bool:
+        return rondas_de(hash_guardado) != self.rondas
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# instancia global
+pool_contrasenas = PoolContrasenas()
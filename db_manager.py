@@ -1,38 +1,111 @@
 # db_manager.py
-from datetime import datetime
-from pymongo import MongoClient, DESCENDING
-from pymongo.errors import ConnectionFailure, DuplicateKeyError
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pymongo import MongoClient, DESCENDING, TEXT, UpdateOne, ReturnDocument
+from pymongo.errors import ConnectionFailure, ConfigurationError, DuplicateKeyError
 from bson import ObjectId
-from config import MONGO_URI, DB_NAME
-from passlib.hash import bcrypt
+from config import (MONGO_URI, DB_NAME, ARCHIVO_MENSAJES_DIR, MENSAJES_ALMACENAMIENTO, BUCKET_MAX_MENSAJES,
+                    MENSAJES_VOLCADO_S,
+                    ESTADISTICAS_MAX_ANTIGUEDAD_S, CACHE_VERSIONES_TTL_S,
+                    MONGO_MAX_POOL, MONGO_MIN_POOL, MONGO_MAX_IDLE_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    MONGO_COMPRESSORS, MONGO_RETRY_WRITES, MONGO_SELECCION_TIMEOUT_MS, MONGO_HEARTBEAT_MS)
+from monitor_mongo import MetricasPool, EstadoTopologia
+from metricas import metricas
+from archivo_mensajes import ArchivoMensajes
+from contrasenas import pool_contrasenas, ServicioSaturado
 from security import cifrar_aes_cbc
 
 
+class BusquedaNoDisponible(Exception):
+    """La búsqueda de texto no está disponible con el almacenamiento actual."""
+
+
+def parse_fecha(valor: str):
+    """Convierte una fecha ISO 8601 a datetime UTC naive (como se guarda en Mongo)."""
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    if fecha.tzinfo:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
 class DatabaseManager:
     """Gestor de base de datos MongoDB (IDs como ObjectId para todo)."""
 
-    def __init__(self, uri: str, db_name: str):
+    def __init__(self, uri: str, db_name: str, almacenamiento: str = MENSAJES_ALMACENAMIENTO):
         self.uri = uri
         self.db_name = db_name
         self.client = None
         self.db = None
-        self.conectado = False
+        self._conectado = False
+        self._topologia = None
+        self._pid = None
+        self.modo_bucket = almacenamiento == "bucket"
+        self.archivo = ArchivoMensajes(ARCHIVO_MENSAJES_DIR)
+        self._versiones = {}
+        # Último mensaje por canal y contadores por usuario aún sin volcar (_volcar_mensajes)
+        self._ultimos_pendientes = {}
+        self._usuarios_pendientes = {}
+        self._lock_volcado = threading.Lock()
+        self._hilo_volcado = None
 
     # -------------------------------
     # CONEXIÓN
     # -------------------------------
+    @property
+    def conectado(self) -> bool:
+        """
+        True si hay conexión y algún servidor alcanzable. Con el circuito
+        abierto (EstadoTopologia) las operaciones se descartan al momento.
+        """
+        if not self._conectado:
+            return False
+        if self._topologia and not self._topologia.disponible:
+            metricas.incrementar("mongo.circuito.rechazos")
+            return False
+        return True
+
+    @conectado.setter
+    def conectado(self, valor: bool):
+        self._conectado = valor
+
     def conectar(self) -> bool:
+        # Un único MongoClient (y pool) por proceso, compartido por todos los hilos.
+        # Un cliente heredado por fork no sirve en el hijo: se crea otro.
+        if self.client is not None and self._conectado and self._pid == os.getpid():
+            return True
+        self._pid = os.getpid()
         try:
-            self.client = MongoClient(self.uri, serverSelectionTimeoutMS=5000)
+            self._topologia = EstadoTopologia()
+            opciones = {"compressors": MONGO_COMPRESSORS} if MONGO_COMPRESSORS else {}
+            self.client = MongoClient(
+                self.uri,
+                maxPoolSize=MONGO_MAX_POOL,
+                minPoolSize=MONGO_MIN_POOL,
+                maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                retryWrites=MONGO_RETRY_WRITES,
+                serverSelectionTimeoutMS=MONGO_SELECCION_TIMEOUT_MS,
+                heartbeatFrequencyMS=MONGO_HEARTBEAT_MS,
+                event_listeners=[MetricasPool(), self._topologia],
+                **opciones
+            )
             # Ping para verificar conexión
             self.client.admin.command("ping")
             self.db = self.client[self.db_name]
             self.conectado = True
             self._inicializar_colecciones()
-            print(f"[+] Conectado a MongoDB: {self.db_name}")
+            print(f"[+] Conectado a MongoDB: {self.db_name} (pool {MONGO_MIN_POOL}-{MONGO_MAX_POOL})")
             return True
-        except ConnectionFailure as e:
+        except (ConnectionFailure, ConfigurationError) as e:
             print(f"[x] Error al conectar a MongoDB: {e}")
+            if self.client:
+                self.client.close()
+                self.client = None
             self.conectado = False
             return False
 
@@ -68,6 +141,8 @@ class DatabaseManager:
         try:
             self.db.usuarios.create_index("nombre")
             self.db.usuarios.create_index("activo")
+            # directorio: búsqueda por prefijo de email
+            self.db.usuarios.create_index("email")
         except Exception:
             pass
 
@@ -76,6 +151,40 @@ class DatabaseManager:
             self.db.mensajes.create_index("usuario_id")
             self.db.mensajes.create_index("canal_id")
             self.db.mensajes.create_index("timestamp")
+            self.db.mensajes.create_index("hash_sha256")
+            # historial paginado y archivado por canal
+            self.db.mensajes.create_index([("canal_id", 1), ("timestamp", DESCENDING)])
+        except Exception:
+            pass
+
+        # buckets de mensajes (un documento por canal y hora)
+        try:
+            self.db.mensajes_buckets.create_index([("canal_id", 1), ("hora", DESCENDING), ("desde", DESCENDING)])
+            self.db.mensajes_buckets.create_index("mensajes.hash_sha256")
+            self.db.mensajes_buckets.create_index("hora")
+        except Exception:
+            pass
+
+        # hashes de los mensajes archivados (archivado.py), para la auditoría
+        try:
+            self.db.mensajes_archivados.create_index("hash_sha256")
+        except Exception:
+            pass
+
+        # rollups de actividad (rollups.py)
+        try:
+            self.db.rollups.create_index([("tipo", 1), ("clave", 1), ("periodo", 1)])
+            self.db.rollups.create_index([("tipo", 1), ("periodo", 1)])
+        except Exception:
+            pass
+
+        # búsqueda de texto completo sobre mensajes
+        try:
+            self.db.mensajes.create_index(
+                [("mensaje", TEXT)],
+                name="mensaje_texto",
+                default_language="spanish"
+            )
         except Exception:
             pass
 
@@ -84,6 +193,9 @@ class DatabaseManager:
             self.db.sesiones.create_index("usuario_id")
             self.db.sesiones.create_index("inicio")
             self.db.sesiones.create_index("fin")
+            self.db.sesiones.create_index("tipo")
+            # Sesiones HTTP (sesiones_servidor.py): Mongo las borra al pasar `expira`
+            self.db.sesiones.create_index("expira", expireAfterSeconds=0)
         except Exception:
             pass
 
@@ -95,6 +207,47 @@ class DatabaseManager:
 
         print("[+] Colecciones e indices inicializados")
 
+    # -------------------------------
+    # VERSIONES (invalidación de cachés HTTP)
+    # -------------------------------
+    def version_info(self, nombre: str) -> tuple:
+        """
+        (versión, fecha de la última modificación) de un conjunto de datos
+        ('usuarios', 'canales', 'usuario:<id>'...). Se relee de `contadores`
+        como mucho cada CACHE_VERSIONES_TTL_S segundos para ver las escrituras
+        de otros procesos; las propias se ven en la siguiente lectura.
+        """
+        entrada = self._versiones.get(nombre)
+        if entrada and time.monotonic() - entrada[2] < CACHE_VERSIONES_TTL_S:
+            return entrada[0], entrada[1]
+        version, fecha = (entrada[0], entrada[1]) if entrada else (0, None)
+        if self.conectado:
+            try:
+                doc = self.db.contadores.find_one({"_id": f"version:{nombre}"})
+                if doc:
+                    version, fecha = doc["valor"], doc.get("actualizado")
+            except Exception as e:
+                print(f"[DB ERROR] version_info: {e}")
+        self._versiones[nombre] = (version, fecha, time.monotonic())
+        return version, fecha
+
+    def version(self, nombre: str) -> int:
+        return self.version_info(nombre)[0]
+
+    def _invalidar(self, *nombres: str):
+        """Incrementa en un solo viaje la versión de los conjuntos de datos modificados (no crítico)."""
+        try:
+            ahora = datetime.utcnow()
+            self.db.contadores.bulk_write([
+                UpdateOne({"_id": f"version:{n}"}, {"$inc": {"valor": 1}, "$set": {"actualizado": ahora}}, upsert=True)
+                for n in nombres
+            ], ordered=False)
+            for n in nombres:
+                # forzar la relectura en la próxima consulta de este proceso
+                self._versiones.pop(n, None)
+        except Exception as e:
+            print(f"[DB ERROR] _invalidar: {e}")
+
     # -------------------------------
     # USUARIOS
     # -------------------------------
@@ -108,6 +261,7 @@ class DatabaseManager:
                 {"_id": ObjectId(usuario_id)},
                 {"$set": {"activo": activo, "ultima_conexion": datetime.utcnow()}}
             )
+            self._invalidar("usuarios", f"usuario:{usuario_id}")
             return res.modified_count > 0
         except Exception as e:
             print(f"[DB ERROR] cambiar_estado_usuario: {e}")
@@ -130,6 +284,28 @@ class DatabaseManager:
         except Exception as e:
             print(f"[DB ERROR] obtener_estadisticas_usuario: {e}")
             return None
+
+    # Campos del perfil: datos públicos + acumulados que se mantienen al escribir
+    # (total_mensajes/ultimo_mensaje en _volcar_mensajes, total_conexiones al hacer login)
+    CAMPOS_PERFIL = {
+        "nombre": 1, "apellido": 1, "email": 1, "picture": 1, "activo": 1, "ip_ultima": 1,
+        "primera_conexion": 1, "ultima_conexion": 1, "ultimo_mensaje": 1,
+        "total_mensajes": 1, "total_conexiones": 1
+    }
+
+    def obtener_perfil(self, usuario_id: str) -> dict | None:
+        """Perfil con los contadores precalculados del usuario (una lectura por _id, sin password)."""
+        if not self.conectado or not ObjectId.is_valid(usuario_id):
+            return None
+        try:
+            user = self.db.usuarios.find_one({"_id": ObjectId(usuario_id)}, self.CAMPOS_PERFIL)
+            if not user:
+                return None
+            user["_id"] = str(user["_id"])
+            return user
+        except Exception as e:
+            print(f"[DB ERROR] obtener_perfil: {e}")
+            return None
         
   # ----------------------------
     # Registro clásico
@@ -138,9 +314,8 @@ class DatabaseManager:
         if not nombre or not email or not password:
             return None
 
-        # Truncar password a 72 bytes
-        password_bytes = password.encode("utf-8")[:72]
-        hashed_pw = bcrypt.hash(password_bytes)
+        # bcrypt en el pool de procesos (puede lanzar ServicioSaturado)
+        hashed_pw = pool_contrasenas.hashear(password)
 
         now = datetime.utcnow()
         doc = {
@@ -160,6 +335,7 @@ class DatabaseManager:
         
         try:
             res = self.db.usuarios.insert_one(doc)
+            self._invalidar("usuarios")
             return str(res.inserted_id)
         except DuplicateKeyError as e :
             # Email ya existe
@@ -172,21 +348,32 @@ class DatabaseManager:
         if not email or not password:
             return None
 
-        user = self.db.usuarios.find_one({"email": email})
+        # La contraseña hay que verificarla aquí (bcrypt) antes de tocar nada
+        user = self.db.usuarios.find_one({"email": email}, {"password": 1})
         if not user:
             return None
 
-        password_bytes = password.encode("utf-8")[:72]
-
-        if not bcrypt.verify(password_bytes, user["password"]):
+        # bcrypt en el pool de procesos (puede lanzar ServicioSaturado)
+        if not pool_contrasenas.verificar(password, user.get("password")):
             return None
 
         # actualizar última conexión
+        cambios = {"ultima_conexion": datetime.utcnow(), "ip_ultima": ip}
+
+        # hash con otro coste (BCRYPT_ROUNDS cambió): se rehace con la contraseña ya verificada
+        if pool_contrasenas.necesita_rehash(user["password"]):
+            try:
+                cambios["password"] = pool_contrasenas.hashear(password)
+            except ServicioSaturado:
+                pass  # se intentará en el siguiente login
+
+        # Escritura confirmada antes de invalidar: así la caché no puede guardar
+        # el perfil viejo con la versión nueva
         self.db.usuarios.update_one(
             {"_id": user["_id"]},
-            {"$set": {"ultima_conexion": datetime.utcnow(), "ip_ultima": ip},
-             "$inc": {"total_conexiones": 1}}
+            {"$set": cambios, "$inc": {"total_conexiones": 1}}
         )
+        self._invalidar("usuarios", f"usuario:{user['_id']}")
 
         return str(user["_id"])
 
@@ -218,27 +405,55 @@ class DatabaseManager:
             "$inc": {"total_conexiones": 1}
         }
 
-        res = self.db.usuarios.update_one(query, update, upsert=True)
-        if res.upserted_id:
-            return str(res.upserted_id)
-        # devolver id del usuario existente
-        existing = self.db.usuarios.find_one({"google_id": google_id})
-        if existing:
-            return str(existing["_id"])
-        return None
+        # Upsert y _id resultante en un solo viaje
+        user = self.db.usuarios.find_one_and_update(
+            query, update, projection={"_id": 1}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self._invalidar("usuarios", f"usuario:{user['_id']}")
+        return str(user["_id"])
     
+    # Campos que se exponen en el directorio de usuarios (nunca password ni IP)
+    CAMPOS_DIRECTORIO = {"nombre": 1, "apellido": 1, "email": 1, "picture": 1, "activo": 1, "ultima_conexion": 1}
+
+    @staticmethod
+    def _filtro_prefijo(q: str, campos: tuple) -> dict:
+        """$or de regex anclados (^) por campo: usan el índice de cada campo."""
+        variantes = {q, q.lower(), q[:1].upper() + q[1:]}
+        return {"$or": [
+            {campo: {"$regex": "^" + re.escape(v)}} for campo in campos for v in sorted(variantes)
+        ]}
+
     def obtener_usuarios(self):
         if not self.conectado:
             return []
         try:
             return [
                 {**u, "_id": str(u["_id"])}
-                for u in self.db.usuarios.find()
+                for u in self.db.usuarios.find({}, self.CAMPOS_DIRECTORIO)
             ]
         except Exception as e:
             print("[DB ERROR] obtener_usuarios:", e)
             return []
-        
+
+    def listar_usuarios(self, q: str = None, pagina: int = 1, por_pagina: int = 20) -> dict:
+        """Directorio paginado por nombre, con búsqueda por prefijo de nombre o email."""
+        if not self.conectado:
+            return {"resultados": [], "pagina": pagina, "por_pagina": por_pagina, "hay_mas": False}
+        try:
+            filtro = self._filtro_prefijo(q, ("nombre", "email")) if q else {}
+            cursor = (
+                self.db.usuarios.find(filtro, self.CAMPOS_DIRECTORIO)
+                .sort([("nombre", 1), ("_id", 1)])
+                .skip((pagina - 1) * por_pagina)
+                .limit(por_pagina + 1)
+            )
+            docs = [{**u, "_id": str(u["_id"])} for u in cursor]
+            return {"resultados": docs[:por_pagina], "pagina": pagina,
+                    "por_pagina": por_pagina, "hay_mas": len(docs) > por_pagina}
+        except Exception as e:
+            print(f"[DB ERROR] listar_usuarios: {e}")
+            return {"resultados": [], "pagina": pagina, "por_pagina": por_pagina, "hay_mas": False}
+
     def validar_usuario_ws(self, usuario_id: str, google_id: str | None):
         """
         Valida que el usuario exista.
@@ -277,18 +492,22 @@ class DatabaseManager:
         try:
             if tipo == "inicio":
                 doc = {
+                    "tipo": "ws",
                     "usuario_id": ObjectId(usuario_id),
                     "inicio": datetime.utcnow(),
                     "fin": None,
                     "activa": True
                 }
                 res = self.db.sesiones.insert_one(doc)
+                self._incrementar_contadores({"sesiones_activas": 1, "sesiones_ws": 1})
                 return str(res.inserted_id)
             else:
                 res = self.db.sesiones.update_one(
                     {"usuario_id": ObjectId(usuario_id), "activa": True},
                     {"$set": {"fin": datetime.utcnow(), "activa": False}}
                 )
+                if res.modified_count:
+                    self._incrementar_contador("sesiones_activas", -1)
                 return res.modified_count
         except Exception as e:
             print(f"[DB ERROR] registrar_sesion: {e}")
@@ -299,58 +518,36 @@ class DatabaseManager:
     # -------------------------------
     def crear_canal(self, nombre: str, creador_id: str) -> str | None:
         """
-        Crea un canal en Mongo, validando duplicados.
+        Crea un canal público en Mongo.
         Guarda creador_id (ObjectId) y agrega al creador en miembros/admins.
         Devuelve id (str) si creado, None si ya existe o error.
         """
-        if not self.conectado:
-            return None
-        try:
-            # validar duplicado
-            existente = self.db.canales.find_one({"nombre": nombre})
-            if existente:
-                return None
+        return self._crear_canal(nombre, creador_id, publico=True)
 
-            canal_doc = {
-                "nombre": nombre,
-                "creador_id": ObjectId(creador_id),
-                "admins": [ObjectId(creador_id)],  # el creador es admin por defecto
-                "miembros": [ObjectId(creador_id)],
-                "publico": True,
-                "fecha_creacion": datetime.now()
-            }
-            
-            res = self.db.canales.insert_one(canal_doc)
-            return str(res.inserted_id)
-        except Exception as e:
-            print(f"[DB ERROR] crear_canal: {e}")
-            return None
-        
     def crear_canal_privado(self, nombre: str, creador_id: str) -> str | None:
-        """
-        Crea un canal en Mongo, validando duplicados.
-        Guarda creador_id (ObjectId) y agrega al creador en miembros/admins.
-        Devuelve id (str) si creado, None si ya existe o error.
-        """
+        """Como crear_canal, pero el canal es privado."""
+        return self._crear_canal(nombre, creador_id, publico=False)
+
+    def _crear_canal(self, nombre: str, creador_id: str, publico: bool) -> str | None:
+        # Un solo viaje: el índice único de `nombre` rechaza los duplicados
         if not self.conectado:
             return None
         try:
-            # validar duplicado
-            existente = self.db.canales.find_one({"nombre": nombre})
-            if existente:
-                return None
-
             canal_doc = {
                 "nombre": nombre,
                 "creador_id": ObjectId(creador_id),
                 "admins": [ObjectId(creador_id)],  # el creador es admin por defecto
                 "miembros": [ObjectId(creador_id)],
-                "publico": False,
-                "fecha_creacion": datetime.now()
+                "publico": publico,
+                "fecha_creacion": datetime.now(),
+                "ultimo": None
             }
             
             res = self.db.canales.insert_one(canal_doc)
+            self._invalidar("canales")
             return str(res.inserted_id)
+        except DuplicateKeyError:
+            return None
         except Exception as e:
             print(f"[DB ERROR] crear_canal: {e}")
             return None
@@ -365,10 +562,18 @@ class DatabaseManager:
             return None
         try:
             # Buscar el mensaje más reciente por fecha
-            doc = self.db.mensajes.find_one(
-                {"canal_id": ObjectId(canal_id)},  # Filtra por canal
-                sort=[("timestamp", -1)]                # Orden descendente por fecha
-            )
+            if self.modo_bucket:
+                bucket = self.db.mensajes_buckets.find_one(
+                    {"canal_id": ObjectId(canal_id)},
+                    {"mensajes": {"$slice": -1}},
+                    sort=[("hora", -1), ("desde", -1)]
+                )
+                doc = bucket["mensajes"][-1] if bucket and bucket.get("mensajes") else None
+            else:
+                doc = self.db.mensajes.find_one(
+                    {"canal_id": ObjectId(canal_id)},  # Filtra por canal
+                    sort=[("timestamp", -1)]                # Orden descendente por fecha
+                )
             if not doc:
                 return None
             
@@ -384,62 +589,81 @@ class DatabaseManager:
             print(f"[DB ERROR] obtener_ultimo_mensaje: {e}")
             return None
 
+    # Proyección de listados de canales: sin los arrays de miembros/admins
+    CAMPOS_LISTADO_CANAL = {"nombre": 1, "creador_id": 1, "fecha_creacion": 1, "publico": 1, "ultimo": 1}
+
+    def _formatear_canal(self, c: dict) -> dict:
+        ultimo = self._ultimos_pendientes.get(str(c["_id"]), c.get("ultimo"))
+        if "ultimo" not in c and ultimo is None:
+            # Canal anterior a desnormalizar `ultimo`: calcularlo una vez y guardarlo
+            ultimo = self.obtener_ultimo_mensaje(c["_id"])
+            guardado = {**ultimo, "fecha": datetime.fromisoformat(ultimo["fecha"])} if ultimo else None
+            self.db.canales.update_one({"_id": c["_id"], "ultimo": {"$exists": False}}, {"$set": {"ultimo": guardado}})
+        elif ultimo and isinstance(ultimo.get("fecha"), datetime):
+            ultimo = {**ultimo, "fecha": ultimo["fecha"].isoformat()}
+        return {
+            "_id": str(c["_id"]),
+            "nombre": c.get("nombre"),
+            "creador_id": str(c.get("creador_id")) if c.get("creador_id") else None,
+            "publico": c.get("publico"),
+            "fecha_creacion": c.get("fecha_creacion").isoformat(),
+            "ultimo": ultimo
+        }
+
+    @staticmethod
+    def _filtro_miembro(usuario_id: str) -> dict:
+        usuario_objid = ObjectId(usuario_id)
+        return {"$or": [{"miembros": usuario_objid}, {"admins": usuario_objid}]}
+
     def obtener_canales_db(self) -> list:
         """
-        Devuelve lista de canales con forma: [{"_id": str, "nombre": str, "creador_id": str, "admins":[str, ...]}]
+        Devuelve lista de canales con forma: [{"_id": str, "nombre": str, "creador_id": str, "ultimo": {...}}]
         """
         if not self.conectado:
             return []
         try:
-            docs = self.db.canales.find({}, {"nombre": 1, "creador_id": 1, "admins": 1, "miembros": 1, "fecha_creacion": 1, "publico": 1})
-            salida = []
-            for c in docs:
-                salida.append({
-                    "_id": str(c["_id"]),
-                    "nombre": c.get("nombre"),
-                    "creador_id": str(c.get("creador_id")) if c.get("creador_id") else None,
-                    "admins": [str(a) for a in c.get("admins", [])],
-                    "miembros": [str(a) for a in c.get("miembros", [])],
-                    "publico": c.get("publico"),
-                    "fecha_creacion":c.get("fecha_creacion").isoformat(),
-                     "ultimo": self.obtener_ultimo_mensaje(c.get("_id"))
-                })
-            return salida
+            return [self._formatear_canal(c) for c in self.db.canales.find({}, self.CAMPOS_LISTADO_CANAL)]
         except Exception as e:
             print(f"[DB ERROR] obtener_canales_db: {e}")
             return []
 
     def obtener_canales_donde_estoy(self, usuario_id) -> list:
         """
-        Devuelve lista de canales con forma: [{"_id": str, "nombre": str, "creador_id": str, "admins":[str, ...]}]
+        Devuelve lista de canales con forma: [{"_id": str, "nombre": str, "creador_id": str, "ultimo": {...}}]
         """
         if not self.conectado:
             return []
         try:
-            usuario_objid = ObjectId(usuario_id)
-            docs = self.db.canales.find({
-                "$or": [
-                    {"miembros": {"$in": [usuario_objid]}},
-                    {"admins":  {"$in": [usuario_objid]}}
-                ]
-            },{"nombre": 1, "creador_id": 1, "admins": 1, "miembros": 1, "fecha_creacion": 1, "publico": 1})
-            salida = []
-            for c in docs:
-                salida.append({
-                    "_id": str(c["_id"]),
-                    "nombre": c.get("nombre"),
-                    "creador_id": str(c.get("creador_id")) if c.get("creador_id") else None,
-                    "admins": [str(a) for a in c.get("admins", [])],
-                    "miembros": [str(a) for a in c.get("miembros", [])],
-                    "publico": c.get("publico"),
-                    "fecha_creacion":c.get("fecha_creacion").isoformat(),
-                     "ultimo": self.obtener_ultimo_mensaje(c.get("_id"))
-                })
-            return salida
+            docs = self.db.canales.find(self._filtro_miembro(usuario_id), self.CAMPOS_LISTADO_CANAL)
+            return [self._formatear_canal(c) for c in docs]
         except Exception as e:
             print(f"[DB ERROR] obtener_canales_db: {e}")
             return []
 
+    def listar_canales(self, usuario_id: str = None, q: str = None, pagina: int = 1, por_pagina: int = 20) -> dict:
+        """Canales paginados por nombre (de un usuario si se indica), con búsqueda por prefijo."""
+        if not self.conectado:
+            return {"resultados": [], "pagina": pagina, "por_pagina": por_pagina, "hay_mas": False}
+        try:
+            condiciones = []
+            if usuario_id:
+                condiciones.append(self._filtro_miembro(usuario_id))
+            if q:
+                condiciones.append(self._filtro_prefijo(q, ("nombre",)))
+            filtro = {"$and": condiciones} if condiciones else {}
+            cursor = (
+                self.db.canales.find(filtro, self.CAMPOS_LISTADO_CANAL)
+                .sort([("nombre", 1), ("_id", 1)])
+                .skip((pagina - 1) * por_pagina)
+                .limit(por_pagina + 1)
+            )
+            docs = [self._formatear_canal(c) for c in cursor]
+            return {"resultados": docs[:por_pagina], "pagina": pagina,
+                    "por_pagina": por_pagina, "hay_mas": len(docs) > por_pagina}
+        except Exception as e:
+            print(f"[DB ERROR] listar_canales: {e}")
+            return {"resultados": [], "pagina": pagina, "por_pagina": por_pagina, "hay_mas": False}
+
     def obtener_canal_doc_por_nombre(self, nombre: str) -> dict | None:
         """Devuelve documento del canal (con ids string) o None."""
         if not self.conectado:
@@ -462,84 +686,88 @@ class DatabaseManager:
             print(f"[DB ERROR] obtener_canal_doc_por_nombre: {e}")
             return None
 
-    def agregar_usuario_a_canal(self, canal_id: str, email: str) -> bool:
-        """Agrega usuario (ObjectId) a miembros[]. Devuelve True si modificado."""
-        if not self.conectado:
-            return False
-        try:
-            user = self.db.usuarios.find_one({"email": email})
-            res = self.db.canales.update_one(
-                {"_id": ObjectId(canal_id)},
-                {"$addToSet": {"miembros": ObjectId(user["_id"])}}
-            )
-            return res.modified_count > 0 or res.matched_count > 0
-        except Exception as e:
-            print(f"[DB ERROR] agregar_usuario_a_canal: {e}")
-            return False
-
     def agregar_usuario_a_canal_por_id(self, canal_id: str,  usuario_id: str) -> bool:
         """Agrega usuario (ObjectId) a miembros[]. Devuelve True si modificado."""
         if not self.conectado:
             return False
         try:
-            user = self.db.usuarios.find_one({"_id": ObjectId(usuario_id)})
+            # El id ya es el del usuario: no hace falta leerlo antes
             res = self.db.canales.update_one(
                 {"_id": ObjectId(canal_id)},
-                {"$addToSet": {"miembros": ObjectId(user["_id"])}}
+                {"$addToSet": {"miembros": ObjectId(usuario_id)}}
             )
+            self._invalidar("canales")
             return res.modified_count > 0 or res.matched_count > 0
         except Exception as e:
             print(f"[DB ERROR] agregar_usuario_a_canal: {e}")
             return False
 
-    def remover_usuario_de_canal(self, canal_id: str, email: str) -> bool:
-        """Remueve usuario de miembros[]."""
+    # Comandos de administración: operador y campo de `canales` por comando
+    OPERACIONES_ADMIN = {
+        "/agregar": ("$addToSet", "miembros"),
+        "/remover": ("$pull", "miembros"),
+        "/dar_admin": ("$addToSet", "admins"),
+        "/quitar_admin": ("$pull", "admins"),
+    }
+
+    def comando_admin_canal(self, comando: str, nombre_canal: str, admin_id: str, email: str) -> str:
+        """
+        Aplica un comando de OPERACIONES_ADMIN sobre el usuario con ese email.
+        Dos viajes: el _id del usuario y un update cuyo filtro ya exige que
+        admin_id administre el canal; solo si no coincide se relee el canal
+        para distinguir el error.
+        Devuelve "ok", "sin_cambios", "sin_usuario", "sin_canal", "no_admin" o "error".
+        """
         if not self.conectado:
-            return False
+            return "error"
+        operador, campo = self.OPERACIONES_ADMIN[comando]
         try:
-            user = self.db.usuarios.find_one({"email": email})
+            user = self.db.usuarios.find_one({"email": email}, {"_id": 1})
+            if not user:
+                return "sin_usuario"
             res = self.db.canales.update_one(
-                {"_id": ObjectId(canal_id)},
-                {"$pull": {"miembros": ObjectId(user["_id"])}}
+                {"nombre": nombre_canal, "admins": ObjectId(admin_id)},
+                {operador: {campo: user["_id"]}}
             )
-            return res.modified_count > 0
+            if not res.matched_count:
+                existe = self.db.canales.find_one({"nombre": nombre_canal}, {"_id": 1})
+                return "no_admin" if existe else "sin_canal"
+            if operador == "$pull" and not res.modified_count:
+                return "sin_cambios"
+            self._invalidar("canales")
+            return "ok"
         except Exception as e:
-            print(f"[DB ERROR] remover_usuario_de_canal: {e}")
-            return False
+            print(f"[DB ERROR] comando_admin_canal: {e}")
+            return "error"
 
-    def agregar_admin(self, canal_id: str, email: str) -> bool:
-        """Añade usuario a admins[]."""
+    def es_admin(self, canal_id: str, usuario_id: str) -> bool:
+        canal = self.obtener_canal_por_id(canal_id)
+        return canal and usuario_id in canal["admins"]
+
+    def puede_ver_canal(self, canal_id: str, usuario_id: str) -> bool:
+        """True si el canal es público o el usuario es miembro/admin (una sola consulta)."""
         if not self.conectado:
             return False
         try:
-            user = self.db.usuarios.find_one({"email": email})
-            res = self.db.canales.update_one(
-                {"_id": ObjectId(canal_id)},
-                {"$addToSet": {"admins": ObjectId(user["_id"])}}
-            )
-            return res.modified_count > 0 or res.matched_count > 0
+            filtro = {"$or": [{"publico": {"$ne": False}}, *self._filtro_miembro(usuario_id)["$or"]]}
+            return self.db.canales.find_one({"_id": ObjectId(canal_id), **filtro}, {"_id": 1}) is not None
         except Exception as e:
-            print(f"[DB ERROR] agregar_admin: {e}")
+            print(f"[DB ERROR] puede_ver_canal: {e}")
             return False
 
-    def remover_admin(self, canal_id: str, email: str) -> bool:
-        """Quita usuario de admins[]."""
+    def fijar_retencion_canal(self, canal_id: str, dias: int | None) -> bool:
+        """Días de mensajes calientes del canal (None = valor por defecto)."""
         if not self.conectado:
             return False
         try:
-            user = self.db.usuarios.find_one({"email": email})
             res = self.db.canales.update_one(
                 {"_id": ObjectId(canal_id)},
-                {"$pull": {"admins": ObjectId(user["_id"])}}
+                {"$set": {"retencion_dias": dias}}
             )
-            return res.modified_count > 0
+            return res.matched_count > 0
         except Exception as e:
-            print(f"[DB ERROR] remover_admin: {e}")
+            print(f"[DB ERROR] fijar_retencion_canal: {e}")
             return False
-        
-    def es_admin(self, canal_id: str, usuario_id: str) -> bool:
-        canal = self.obtener_canal_por_id(canal_id)
-        return canal and usuario_id in canal["admins"]
 
     def borrar_canal(self, canal_id: str) -> bool:
         """Elimina el canal por id (ObjectId)."""
@@ -547,6 +775,7 @@ class DatabaseManager:
             return False
         try:
             res = self.db.canales.delete_one({"_id": ObjectId(canal_id)})
+            self._invalidar("canales")
             return res.deleted_count > 0
         except Exception as e:
             print(f"[DB ERROR] borrar_canal: {e}")
@@ -588,6 +817,7 @@ class DatabaseManager:
                 }
             )
 
+            self._invalidar("canales")
             return res.modified_count > 0 or res.matched_count > 0
 
         except Exception as e:
@@ -597,10 +827,13 @@ class DatabaseManager:
     # -------------------------------
     # MENSAJES
     # -------------------------------
-    def guardar_mensaje(self, usuario_id: str, canal_id: str, mensaje: str, hash_sha256: str) -> str | None:
+    def guardar_mensaje(self, usuario_id: str, canal_id: str, mensaje: str, hash_sha256: str,
+                        usuario_nombre: str = None) -> str | None:
         """
         Guarda un mensaje referenciando usuario_id y canal_id (ObjectId).
         Devuelve id de mensaje (str) o None en error.
+        Un solo viaje: el último mensaje del canal y los contadores del
+        usuario se vuelcan en bloque cada MENSAJES_VOLCADO_S (_volcar_mensajes).
         """
         if not self.conectado:
             return None
@@ -613,31 +846,155 @@ class DatabaseManager:
                 "longitud": len(mensaje),
                 "timestamp": datetime.utcnow()
             }
-            res = self.db.mensajes.insert_one(doc)
-            # incrementar contador de mensajes del usuario (no crítico)
-            try:
-                self.db.usuarios.update_one(
-                    {"_id": ObjectId(usuario_id)},
-                    {"$inc": {"total_mensajes": 1}}
-                )
-            except Exception:
-                pass
-            return str(res.inserted_id)
+            if self.modo_bucket:
+                mensaje_id = self._guardar_en_bucket(doc)
+            else:
+                mensaje_id = self.db.mensajes.insert_one(doc).inserted_id
+            self._anotar_mensaje(usuario_id, str(canal_id), usuario_nombre, mensaje, doc["timestamp"])
+            return str(mensaje_id)
         except Exception as e:
             print(f"[DB ERROR] guardar_mensaje: {e}")
             return None
 
+    def _anotar_mensaje(self, usuario_id: str, canal_id: str, usuario_nombre: str | None,
+                        mensaje: str, fecha: datetime):
+        """Deja el mensaje pendiente de volcar y arranca el hilo de volcado si no corre."""
+        with self._lock_volcado:
+            actual = self._ultimos_pendientes.get(canal_id)
+            if actual is None or actual["fecha"] <= fecha:
+                self._ultimos_pendientes[canal_id] = {
+                    "usuario_id": usuario_id,
+                    "usuario_nombre": usuario_nombre,
+                    "contenido": mensaje,
+                    "fecha": fecha
+                }
+            total, ultima = self._usuarios_pendientes.get(usuario_id, (0, fecha))
+            self._usuarios_pendientes[usuario_id] = (total + 1, max(ultima, fecha))
+
+            # Tras un fork el hilo del padre no existe en el hijo
+            if self._hilo_volcado is None or not self._hilo_volcado.is_alive():
+                self._hilo_volcado = threading.Thread(target=self._bucle_volcado, name="volcado-mensajes",
+                                                      daemon=True)
+                self._hilo_volcado.start()
+
+    def _bucle_volcado(self):
+        while True:
+            time.sleep(MENSAJES_VOLCADO_S)
+            if self.conectado:
+                self._volcar_mensajes()
+
+    def _volcar_mensajes(self):
+        """
+        Escribe lo anotado por guardar_mensaje: `ultimo` de cada canal y
+        total_mensajes/ultimo_mensaje de cada usuario, con un bulk_write por
+        colección y una sola invalidación. Así la versión de 'canales' (ETag
+        de /canales) cambia como mucho una vez por MENSAJES_VOLCADO_S y no
+        con cada mensaje. Si el proceso cae se pierde lo de ese intervalo
+        (contadores no críticos; `ultimo` se corrige con el siguiente mensaje).
+        """
+        with self._lock_volcado:
+            ultimos = dict(self._ultimos_pendientes)
+            usuarios = dict(self._usuarios_pendientes)
+            self._usuarios_pendientes.clear()
+        if not ultimos and not usuarios:
+            return
+        try:
+            if usuarios:
+                self.db.usuarios.bulk_write([
+                    UpdateOne({"_id": ObjectId(u)}, {"$inc": {"total_mensajes": n}, "$max": {"ultimo_mensaje": fecha}})
+                    for u, (n, fecha) in usuarios.items()
+                ], ordered=False)
+            if ultimos:
+                sin_nombre = {ObjectId(u["usuario_id"]) for u in ultimos.values() if not u["usuario_nombre"]}
+                nombres = {str(u["_id"]): u.get("nombre") for u in self.db.usuarios.find(
+                    {"_id": {"$in": list(sin_nombre)}}, {"nombre": 1}
+                )} if sin_nombre else {}
+                # el filtro evita que un mensaje anterior pise a uno más nuevo
+                self.db.canales.bulk_write([
+                    UpdateOne(
+                        {"_id": ObjectId(canal_id),
+                         "$or": [{"ultimo": None}, {"ultimo.fecha": {"$lte": u["fecha"]}}]},
+                        {"$set": {"ultimo": {**u, "usuario_nombre": u["usuario_nombre"]
+                                             or nombres.get(u["usuario_id"])}}}
+                    )
+                    for canal_id, u in ultimos.items()
+                ], ordered=False)
+            self._invalidar(*(["canales"] if ultimos else []), *(f"usuario:{u}" for u in usuarios))
+            if self.modo_bucket and usuarios:
+                # Total de mensajes en buckets para las estadísticas (ver refrescar_estadisticas_generales)
+                self._incrementar_contador("mensajes_buckets", sum(n for n, _ in usuarios.values()))
+        except Exception as e:
+            print(f"[DB ERROR] _volcar_mensajes: {e}")
+        finally:
+            # Los `ultimo` se sirven de memoria hasta quedar escritos (salvo si llegó otro más nuevo)
+            with self._lock_volcado:
+                for canal_id, u in ultimos.items():
+                    if self._ultimos_pendientes.get(canal_id) is u:
+                        del self._ultimos_pendientes[canal_id]
+
+    def _guardar_en_bucket(self, doc: dict) -> ObjectId:
+        """
+        Anexa el mensaje al bucket (canal, hora) que aún tenga hueco; si
+        está lleno o no existe, el upsert crea uno nuevo.
+        """
+        doc["_id"] = ObjectId()
+        canal_id = doc.pop("canal_id")
+        hora = doc["timestamp"].replace(minute=0, second=0, microsecond=0)
+        self.db.mensajes_buckets.update_one(
+            {"canal_id": canal_id, "hora": hora, "n": {"$lt": BUCKET_MAX_MENSAJES}},
+            {
+                "$push": {"mensajes": doc},
+                "$inc": {"n": 1},
+                "$min": {"desde": doc["timestamp"]},
+                "$max": {"hasta": doc["timestamp"]}
+            },
+            upsert=True
+        )
+        return doc["_id"]
+
+    def _historial_buckets(self, canal_id: str, limite: int, antes: datetime = None) -> list:
+        """Últimos `limite` mensajes (más recientes primero) leyendo buckets."""
+        filtro = {"canal_id": ObjectId(canal_id)}
+        if antes:
+            filtro["desde"] = {"$lt": antes}
+        cursor = self.db.mensajes_buckets.find(filtro).sort([("hora", DESCENDING), ("desde", DESCENDING)])
+
+        mensajes = []
+        vistos = set()
+        hora_limite = None
+        for bucket in cursor:
+            # Terminar la hora en curso: puede haber varios buckets por hora
+            if len(mensajes) >= limite and bucket["hora"] != hora_limite:
+                break
+            for m in bucket.get("mensajes", []):
+                if (antes and m["timestamp"] >= antes) or m["_id"] in vistos:
+                    continue
+                vistos.add(m["_id"])
+                mensajes.append(m)
+            hora_limite = bucket["hora"]
+
+        mensajes.sort(key=lambda m: (m["timestamp"], m["_id"]), reverse=True)
+        return mensajes[:limite]
+
     # -------------------------------
     # HISTORIAL
     # -------------------------------
-    def obtener_historial(self, canal_id: str, limite: int = 50) -> list:
+    def obtener_historial(self, canal_id: str, limite: int = 50, antes: datetime = None) -> list:
         """
         Obtiene historial de mensajes por canal_id (devuelve lista de documentos con campos legibles).
+        antes: cursor de paginación (timestamp); devuelve los `limite` mensajes anteriores.
+        Si los datos calientes no llegan a `limite`, continúa en el archivo frío.
         """
         if not self.conectado:
             return []
         try:
-            cursor = self.db.mensajes.find({"canal_id": ObjectId(canal_id)}).sort("timestamp", DESCENDING).limit(limite)
+            filtro = {"canal_id": ObjectId(canal_id)}
+            if antes:
+                filtro["timestamp"] = {"$lt": antes}
+            if self.modo_bucket:
+                cursor = self._historial_buckets(canal_id, limite, antes)
+            else:
+                cursor = self.db.mensajes.find(filtro).sort("timestamp", DESCENDING).limit(limite)
             mensajes = []
             for m in cursor:
                 mensajes.append({
@@ -648,7 +1005,13 @@ class DatabaseManager:
                     "longitud": m.get("longitud"),
                     "timestamp": m.get("timestamp").isoformat() if m.get("timestamp") else None
                 })
-            return list(reversed(mensajes))
+            mensajes.reverse()
+
+            # El cursor pasó de los datos calientes: leer del archivo
+            if len(mensajes) < limite:
+                limite_frio = datetime.fromisoformat(mensajes[0]["timestamp"]) if mensajes else antes
+                mensajes = self.archivo.leer(canal_id, antes=limite_frio, limite=limite - len(mensajes)) + mensajes
+            return mensajes
         except Exception as e:
             print(f"[DB ERROR] obtener_historial: {e}")
             return []
@@ -660,7 +1023,14 @@ class DatabaseManager:
         if not self.conectado:
             return None
         try:
-            m = self.db.mensajes.find_one({"hash_sha256": hash_sha256})
+            if self.modo_bucket:
+                bucket = self.db.mensajes_buckets.find_one(
+                    {"mensajes.hash_sha256": hash_sha256},
+                    {"canal_id": 1, "mensajes.$": 1}
+                )
+                m = {**bucket["mensajes"][0], "canal_id": bucket["canal_id"]} if bucket else None
+            else:
+                m = self.db.mensajes.find_one({"hash_sha256": hash_sha256})
             if not m:
                 return None
             m["_id"] = str(m["_id"])
@@ -671,6 +1041,129 @@ class DatabaseManager:
             print(f"[DB ERROR] buscar_por_hash: {e}")
             return None
 
+    def buscar_por_hashes(self, hashes: list) -> dict:
+        """
+        Busca muchos hashes a la vez ($in sobre el índice de hash_sha256) en
+        los mensajes calientes (`mensajes` o, en modo bucket, `mensajes_buckets`)
+        y en el índice de los archivados (`mensajes_archivados`).
+        Devuelve {hash: [{"_id", "usuario_id", "usuario_nombre", "longitud"}, ...]}
+        solo para los hashes encontrados, o None si la consulta falla.
+        """
+        if not self.conectado:
+            return None
+        if not hashes:
+            return {}
+        try:
+            hashes = list(hashes)
+            campos = {"_id": 1, "hash_sha256": 1, "usuario_id": 1, "longitud": 1}
+            if self.modo_bucket:
+                docs = list(self.db.mensajes_buckets.aggregate([
+                    {"$match": {"mensajes.hash_sha256": {"$in": hashes}}},
+                    {"$unwind": "$mensajes"},
+                    {"$replaceRoot": {"newRoot": "$mensajes"}},
+                    {"$match": {"hash_sha256": {"$in": hashes}}},
+                    {"$project": campos}
+                ]))
+            else:
+                docs = list(self.db.mensajes.find({"hash_sha256": {"$in": hashes}}, campos))
+            # Un mensaje a medio archivar puede estar en los dos sitios
+            ids = {d["_id"] for d in docs}
+            docs += [d for d in self.db.mensajes_archivados.find({"hash_sha256": {"$in": hashes}}, campos)
+                     if d["_id"] not in ids]
+
+            ids_usuarios = list({d["usuario_id"] for d in docs if d.get("usuario_id")})
+            nombres = {u["_id"]: u.get("nombre") for u in self.db.usuarios.find(
+                {"_id": {"$in": ids_usuarios}}, {"nombre": 1}
+            )} if ids_usuarios else {}
+
+            encontrados = {}
+            for d in docs:
+                encontrados.setdefault(d["hash_sha256"], []).append({
+                    "_id": str(d["_id"]),
+                    "usuario_id": str(d.get("usuario_id")),
+                    "usuario_nombre": nombres.get(d.get("usuario_id")),
+                    "longitud": d.get("longitud")
+                })
+            return encontrados
+        except Exception as e:
+            print(f"[DB ERROR] buscar_por_hashes: {e}")
+            return None
+
+    def buscar_mensajes(self, usuario_id: str, texto: str, canal_id: str = None, autor_id: str = None,
+                        desde: datetime = None, hasta: datetime = None, orden: str = "relevancia",
+                        pagina: int = 1, por_pagina: int = 20) -> dict:
+        """
+        Búsqueda de texto completo (índice de texto en `mensajes`) limitada a
+        los canales del usuario. Filtros opcionales por canal, autor y fechas.
+        orden: 'relevancia' (score de texto) o 'fecha' (más recientes primero).
+        Devuelve {"resultados": [...], "pagina": int, "por_pagina": int, "hay_mas": bool}.
+        Solo cubre los mensajes calientes: no busca en el archivo frío.
+
+        Lanza BusquedaNoDisponible en modo bucket: el índice de texto puntúa
+        documentos enteros y no sabe qué mensajes de un bucket coinciden.
+        """
+        if self.modo_bucket:
+            raise BusquedaNoDisponible("La búsqueda de texto no está disponible con MENSAJES_ALMACENAMIENTO=bucket")
+        vacio = {"resultados": [], "pagina": pagina, "por_pagina": por_pagina, "hay_mas": False}
+        if not self.conectado or not texto or not texto.strip():
+            return vacio
+        try:
+            usuario_objid = ObjectId(usuario_id)
+            canales = [c["_id"] for c in self.db.canales.find(
+                {"$or": [{"miembros": usuario_objid}, {"admins": usuario_objid}]},
+                {"_id": 1}
+            )]
+            if canal_id:
+                canales = [c for c in canales if c == ObjectId(canal_id)]
+            if not canales:
+                return vacio
+
+            filtro = {"$text": {"$search": texto}, "canal_id": {"$in": canales}}
+            if autor_id:
+                filtro["usuario_id"] = ObjectId(autor_id)
+            if desde or hasta:
+                filtro["timestamp"] = {}
+                if desde:
+                    filtro["timestamp"]["$gte"] = desde
+                if hasta:
+                    filtro["timestamp"]["$lte"] = hasta
+
+            proyeccion = {"usuario_id": 1, "canal_id": 1, "mensaje": 1, "hash_sha256": 1, "timestamp": 1,
+                          "score": {"$meta": "textScore"}}
+            if orden == "fecha":
+                sort = [("timestamp", DESCENDING)]
+            else:
+                sort = [("score", {"$meta": "textScore"}), ("timestamp", DESCENDING)]
+
+            # Pedimos uno de más para saber si hay otra página sin contar todo
+            docs = list(
+                self.db.mensajes.find(filtro, proyeccion)
+                .sort(sort)
+                .skip((pagina - 1) * por_pagina)
+                .limit(por_pagina + 1)
+            )
+            hay_mas = len(docs) > por_pagina
+            docs = docs[:por_pagina]
+
+            autores = {u["_id"]: u.get("nombre") for u in self.db.usuarios.find(
+                {"_id": {"$in": list({d["usuario_id"] for d in docs})}}, {"nombre": 1}
+            )} if docs else {}
+
+            resultados = [{
+                "_id": str(d["_id"]),
+                "canal_id": str(d["canal_id"]),
+                "usuario_id": str(d["usuario_id"]),
+                "usuario_nombre": autores.get(d["usuario_id"]),
+                "mensaje": d.get("mensaje"),
+                "hash_sha256": d.get("hash_sha256"),
+                "timestamp": d.get("timestamp").isoformat() if d.get("timestamp") else None,
+                "score": round(d.get("score", 0), 3)
+            } for d in docs]
+            return {"resultados": resultados, "pagina": pagina, "por_pagina": por_pagina, "hay_mas": hay_mas}
+        except Exception as e:
+            print(f"[DB ERROR] buscar_mensajes: {e}")
+            return vacio
+
     def obtener_canal_por_id(self, canal_id: str) -> dict | None:
         """Devuelve documento de canal con ids string o None."""
         if not self.conectado:
@@ -695,21 +1188,172 @@ class DatabaseManager:
     # -------------------------------
     # ESTADÍSTICAS GENERALES
     # -------------------------------
-    def obtener_estadisticas_generales(self) -> dict:
+    def _incrementar_contador(self, nombre: str, cantidad: int):
+        """Contador incremental en `contadores` (no crítico)."""
+        self._incrementar_contadores({nombre: cantidad})
+
+    def _incrementar_contadores(self, cantidades: dict):
+        """Varios contadores de `contadores` en un solo viaje (no crítico)."""
+        try:
+            self.db.contadores.bulk_write([
+                UpdateOne({"_id": nombre}, {"$inc": {"valor": cantidad}}, upsert=True)
+                for nombre, cantidad in cantidades.items()
+            ], ordered=False)
+        except Exception as e:
+            print(f"[DB ERROR] _incrementar_contadores: {e}")
+
+    def recontar_sesiones_activas(self) -> int | None:
+        """
+        Recalcula los contadores de sesiones WebSocket (activas y totales)
+        recorriendo `sesiones`. Solo para corregir derivas (un proceso WS
+        caído no cierra sus sesiones); el refresco periódico no lo usa.
+        """
+        if not self.conectado:
+            return None
+        try:
+            activas = self.db.sesiones.count_documents({"activa": True})
+            total = self.db.sesiones.count_documents({"tipo": {"$ne": "http"}})
+            self.db.contadores.bulk_write([
+                UpdateOne({"_id": "sesiones_activas"}, {"$set": {"valor": activas}}, upsert=True),
+                UpdateOne({"_id": "sesiones_ws"}, {"$set": {"valor": total}}, upsert=True)
+            ], ordered=False)
+            return activas
+        except Exception as e:
+            print(f"[DB ERROR] recontar_sesiones_activas: {e}")
+            return None
+
+    def recontar_mensajes_buckets(self) -> int | None:
+        """
+        Recalcula el contador `mensajes_buckets` sumando `n` de todos los
+        buckets (recorre la colección). Solo para corregir derivas; el
+        refresco periódico no lo usa.
+        """
+        if not self.conectado:
+            return None
+        try:
+            agregado = list(self.db.mensajes_buckets.aggregate([{"$group": {"_id": None, "n": {"$sum": "$n"}}}]))
+            total = agregado[0]["n"] if agregado else 0
+            self.db.contadores.update_one({"_id": "mensajes_buckets"}, {"$set": {"valor": total}}, upsert=True)
+            return total
+        except Exception as e:
+            print(f"[DB ERROR] recontar_mensajes_buckets: {e}")
+            return None
+
+    def refrescar_estadisticas_generales(self) -> dict:
+        """
+        Recalcula el documento `estadisticas.generales` con estimaciones de
+        metadatos (sin recorrer colecciones) y los contadores incrementales.
+        total_mensajes cuenta solo el almacén del modo activo: `mensajes` o,
+        en modo bucket, el contador `mensajes_buckets` (tras migrar sin
+        --borrar los originales siguen en `mensajes` y se contarían dos veces).
+        """
         if not self.conectado:
             return {}
         try:
+            contadores = {c["_id"]: c.get("valor", 0) for c in self.db.contadores.find(
+                {"_id": {"$in": ["sesiones_activas", "sesiones_ws", "mensajes_buckets"]}}
+            )}
+            if self.modo_bucket:
+                total_mensajes = max(0, contadores.get("mensajes_buckets", 0))
+            else:
+                total_mensajes = self.db.mensajes.estimated_document_count()
             stats = {
-                "total_usuarios": self.db.usuarios.count_documents({}),
-                "total_mensajes": self.db.mensajes.count_documents({}),
-                "sesiones_activas": self.db.sesiones.count_documents({"activa": True}),
-                "total_sesiones": self.db.sesiones.count_documents({})
+                "total_usuarios": self.db.usuarios.estimated_document_count(),
+                "total_mensajes": total_mensajes,
+                "sesiones_activas": max(0, contadores.get("sesiones_activas", 0)),
+                # Solo conexiones WebSocket (las sesiones HTTP comparten colección)
+                "total_sesiones": max(0, contadores.get("sesiones_ws", 0)),
+                "actualizado": datetime.utcnow()
             }
+            self.db.estadisticas.replace_one({"_id": "generales"}, stats, upsert=True)
+            return stats
+        except Exception as e:
+            print(f"[DB ERROR] refrescar_estadisticas_generales: {e}")
+            return {}
+
+    def obtener_estadisticas_generales(self, max_antiguedad_s: float = ESTADISTICAS_MAX_ANTIGUEDAD_S) -> dict:
+        """
+        Devuelve el documento de estadísticas precalculado. Si tiene más de
+        `max_antiguedad_s` segundos (o no existe) se recalcula antes de responder.
+        """
+        if not self.conectado:
+            return {}
+        try:
+            stats = self.db.estadisticas.find_one({"_id": "generales"}, {"_id": 0})
+            if not stats or (datetime.utcnow() - stats["actualizado"]).total_seconds() > max_antiguedad_s:
+                stats = self.refrescar_estadisticas_generales()
+            if not stats:
+                return {}
+            stats["antiguedad_s"] = round((datetime.utcnow() - stats["actualizado"]).total_seconds(), 1)
+            stats["actualizado"] = stats["actualizado"].isoformat()
             return stats
         except Exception as e:
             print(f"[DB ERROR] obtener_estadisticas_generales: {e}")
             return {}
 
+    # -------------------------------
+    # ACTIVIDAD (rollups precalculados)
+    # -------------------------------
+    def obtener_actividad_canal(self, canal_id: str, granularidad: str = "hora",
+                                desde: datetime = None, hasta: datetime = None) -> list:
+        """Serie de actividad del canal desde `rollups` (granularidad 'hora' o 'dia')."""
+        if not self.conectado:
+            return []
+        try:
+            filtro = {"tipo": f"canal_{granularidad}", "clave": ObjectId(canal_id)}
+            periodo = {}
+            if desde:
+                periodo["$gte"] = desde
+            if hasta:
+                periodo["$lt"] = hasta
+            if periodo:
+                filtro["periodo"] = periodo
+            return [
+                {
+                    "periodo": r["periodo"].isoformat(),
+                    "mensajes": r["mensajes"],
+                    "bytes": r.get("bytes", 0),
+                    "autores": r.get("autores")
+                }
+                for r in self.db.rollups.find(filtro).sort("periodo", 1)
+            ]
+        except Exception as e:
+            print(f"[DB ERROR] obtener_actividad_canal: {e}")
+            return []
+
+    def obtener_top_usuarios(self, desde: datetime, hasta: datetime = None, limite: int = 10) -> list:
+        """Usuarios con más mensajes en el rango, sumando los rollups diarios."""
+        if not self.conectado:
+            return []
+        try:
+            periodo = {"$gte": desde.replace(hour=0, minute=0, second=0, microsecond=0)}
+            if hasta:
+                periodo["$lt"] = hasta
+            pipeline = [
+                {"$match": {"tipo": "usuario_dia", "periodo": periodo}},
+                {"$group": {"_id": "$clave", "mensajes": {"$sum": "$mensajes"}, "bytes": {"$sum": "$bytes"}}},
+                {"$sort": {"mensajes": -1}},
+                {"$limit": limite},
+                {"$lookup": {"from": "usuarios", "localField": "_id", "foreignField": "_id", "as": "usuario"}},
+                {"$project": {"mensajes": 1, "bytes": 1,
+                              "usuario.nombre": 1, "usuario.apellido": 1, "usuario.picture": 1}}
+            ]
+            top = []
+            for r in self.db.rollups.aggregate(pipeline):
+                usuario = r["usuario"][0] if r["usuario"] else {}
+                top.append({
+                    "usuario_id": str(r["_id"]),
+                    "nombre": usuario.get("nombre"),
+                    "apellido": usuario.get("apellido"),
+                    "picture": usuario.get("picture"),
+                    "mensajes": r["mensajes"],
+                    "bytes": r["bytes"]
+                })
+            return top
+        except Exception as e:
+            print(f"[DB ERROR] obtener_top_usuarios: {e}")
+            return []
+
     # -------------------------------
     # TOKENS DE AUTORIZACIÓN (Firma Digital)
     # -------------------------------
@@ -812,8 +1456,12 @@ class DatabaseManager:
     # CERRAR
     # -------------------------------
     def cerrar(self):
+        if self.client and self.conectado:
+            self._volcar_mensajes()
         if self.client:
             self.client.close()
+            self.client = None
+            self.conectado = False
             print("[+] Conexion MongoDB cerrada")
 
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Estadísticas materializadas
+===========================
+Refresca periódicamente el documento `estadisticas.generales` que sirven
+/estadisticas y los paneles (DatabaseManager.obtener_estadisticas_generales),
+así las lecturas cuestan una búsqueda por _id sin importar el tamaño de
+las colecciones.
+
+Los contadores de sesiones (activas y totales) se mantienen en
+registrar_sesion; el refresco no recorre `sesiones`. Solo se recuentan con
+count_documents una vez al arrancar el hilo (un proceso WS caído deja
+sesiones abiertas y el supervisor lo relanza) y desde la línea de comandos.
+En modo bucket pasa lo mismo con el contador de mensajes `mensajes_buckets`
+(lo mantienen el volcado de mensajes y migrar_buckets.py).
+
+Uso:
+    python estadisticas.py            # un refresco y muestra el resultado
+"""
+
+import threading
+import time
+
+from config import ESTADISTICAS_INTERVALO_S
+from metricas import metricas
+
+
+def refrescar(db_manager, recontar: bool = False) -> dict:
+    """Recalcula las estadísticas (y opcionalmente los contadores de sesiones y buckets)."""
+    inicio = time.monotonic()
+    if recontar:
+        db_manager.recontar_sesiones_activas()
+        if db_manager.modo_bucket:
+            db_manager.recontar_mensajes_buckets()
+    stats = db_manager.refrescar_estadisticas_generales()
+    metricas.observar("estadisticas.refresco", time.monotonic() - inicio)
+    return stats
+
+
+def iniciar_refresco_periodico(db_manager, intervalo_s: float = ESTADISTICAS_INTERVALO_S) -> threading.Thread:
+    """Ejecuta refrescar() cada `intervalo_s` segundos en un hilo daemon."""
+    def _bucle():
+        recontar = True
+        while True:
+            try:
+                refrescar(db_manager, recontar=recontar)
+                recontar = False
+            except Exception as e:
+                print(f"[ESTADISTICAS] Error: {e}")
+            time.sleep(intervalo_s)
+
+    hilo = threading.Thread(target=_bucle, name="estadisticas", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    from db_manager import db_manager
+
+    if db_manager.conectar():
+        try:
+            print(refrescar(db_manager, recontar=True))
+        finally:
+            db_manager.cerrar()
@@ -11,13 +11,24 @@ Características:
 - Verificación de firmas
 """
 
-from .firma_service import FirmaDigitalService
-from .drive_service import GoogleDriveService
-from .email_service import EmailService
+from importlib import import_module
 
 __all__ = ['FirmaDigitalService', 'GoogleDriveService', 'EmailService']
 __version__ = '1.0.0'
 
+# Importación diferida: `import firma_digital.routes` no carga los tres servicios
+_MODULOS = {
+    'FirmaDigitalService': '.firma_service',
+    'GoogleDriveService': '.drive_service',
+    'EmailService': '.email_service',
+}
+
+
+def __getattr__(nombre):
+    if nombre in _MODULOS:
+        return getattr(import_module(_MODULOS[nombre], __name__), nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 
 
 
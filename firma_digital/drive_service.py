@@ -8,6 +8,7 @@ Integración con Google Drive para subir documentos firmados.
 import os
 import io
 import json
+import threading
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
@@ -348,12 +349,15 @@ class GoogleDriveService:
 
 # Singleton para uso global
 _drive_service = None
+_drive_service_lock = threading.Lock()
 
 def get_drive_service() -> GoogleDriveService:
-    """Obtiene la instancia singleton del servicio de Drive."""
+    """Obtiene la instancia singleton del servicio de Drive (thread-safe)."""
     global _drive_service
     if _drive_service is None:
-        _drive_service = GoogleDriveService()
+        with _drive_service_lock:
+            if _drive_service is None:
+                _drive_service = GoogleDriveService()
     return _drive_service
 
 
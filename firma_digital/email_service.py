@@ -15,11 +15,13 @@ from email import encoders
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import secrets
+import threading
 
-# Importar db_manager para persistencia de tokens
-import sys
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db_manager import db_manager
+
+def _db():
+    """db_manager para persistir tokens; se importa en el primer uso (no al cargar el módulo)."""
+    from db_manager import db_manager
+    return db_manager
 
 
 class EmailService:
@@ -173,7 +175,7 @@ class EmailService:
         Returns:
             Diccionario con información del usuario o error
         """
-        usuario = db_manager.obtener_usuario_por_email(email)
+        usuario = _db().obtener_usuario_por_email(email)
         if not usuario:
             return {'existe': False, 'error': 'El usuario no está registrado en el sistema'}
         
@@ -207,7 +209,7 @@ class EmailService:
         expiracion = datetime.utcnow() + timedelta(hours=expiracion_horas)
         
         # Guardar en MongoDB
-        exito = db_manager.guardar_token_autorizacion(
+        exito = _db().guardar_token_autorizacion(
             token=token,
             usuario_email=usuario_email,
             archivo_id=archivo_id,
@@ -231,7 +233,7 @@ class EmailService:
         Returns:
             Información del token si es válido
         """
-        info = db_manager.obtener_token_autorizacion(token)
+        info = _db().obtener_token_autorizacion(token)
         
         if not info:
             return {'valido': False, 'error': 'Token no encontrado'}
@@ -243,7 +245,7 @@ class EmailService:
             return {'valido': False, 'error': 'Token expirado'}
         
         # Obtener información del usuario autorizado
-        usuario = db_manager.obtener_usuario_por_email(info['usuario_email'])
+        usuario = _db().obtener_usuario_por_email(info['usuario_email'])
         
         return {
             'valido': True,
@@ -256,7 +258,7 @@ class EmailService:
     
     def marcar_token_usado(self, token: str) -> bool:
         """Marca un token como utilizado en MongoDB."""
-        return db_manager.marcar_token_usado(token)
+        return _db().marcar_token_usado(token)
     
     def enviar_autorizacion_firma(
         self,
@@ -544,12 +546,15 @@ class EmailService:
 
 # Singleton
 _email_service = None
+_email_service_lock = threading.Lock()
 
 def get_email_service() -> EmailService:
-    """Obtiene la instancia singleton del servicio de email."""
+    """Obtiene la instancia singleton del servicio de email (thread-safe)."""
     global _email_service
     if _email_service is None:
-        _email_service = EmailService()
+        with _email_service_lock:
+            if _email_service is None:
+                _email_service = EmailService()
     return _email_service
 
 
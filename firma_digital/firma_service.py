@@ -2,23 +2,171 @@
 """
 Servicio de Firma Digital
 =========================
-Implementa firma digital para archivos PDF, TXT y ZIP.
+Implementa firma digital para archivos PDF, TXT y ZIP con claves RSA-4096,
+ECDSA P-256 o Ed25519 (FIRMA_ALGORITMO al generar el certificado).
 """
 
 import os
 import hashlib
 import json
+import shutil
+import threading
+import time
 import zipfile
 import tempfile
 from datetime import datetime
-from typing import Optional, Tuple, Dict, Any
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.backends import default_backend
-from cryptography import x509
-from cryptography.x509.oid import NameOID
+from typing import Optional, Tuple, Dict, Any, List
 import base64
 
+# cryptography (x509, claves asimétricas) se importa dentro de los métodos que
+# lo usan: importar este módulo no carga nada hasta la primera firma
+
+# Los archivos se hashean por bloques de este tamaño: memoria constante
+# sea cual sea el tamaño del archivo
+BLOQUE_LECTURA = 1024 * 1024
+
+# Tipos de clave de firma (FIRMA_ALGORITMO) y el nombre con el que cada uno
+# queda en el campo "algoritmo" del .sig. RSA-4096 es lo más lento de
+# generar y de usar para firmar; ECDSA P-256 y Ed25519 son mucho más rápidos
+ALGORITMOS_FIRMA = {
+    "rsa": "RSA-SHA256",
+    "ecdsa-p256": "ECDSA-P256-SHA256",
+    "ed25519": "Ed25519",
+}
+# Los .sig anteriores no guardaban otro valor que este
+ALGORITMO_POR_DEFECTO = "RSA-SHA256"
+
+
+def generar_clave_privada(tipo: str):
+    """Clave privada nueva del tipo indicado (una clave de ALGORITMOS_FIRMA)."""
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if tipo == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=4096)
+    if tipo == "ecdsa-p256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if tipo == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Algoritmo de firma no soportado: {tipo}. Usa: {', '.join(ALGORITMOS_FIRMA)}")
+
+
+def algoritmo_de_clave(clave) -> str:
+    """Nombre del algoritmo ("RSA-SHA256"...) de una clave privada o pública."""
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if isinstance(clave, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return ALGORITMOS_FIRMA["rsa"]
+    if isinstance(clave, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) \
+            and isinstance(clave.curve, ec.SECP256R1):
+        return ALGORITMOS_FIRMA["ecdsa-p256"]
+    if isinstance(clave, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return ALGORITMOS_FIRMA["ed25519"]
+    raise ValueError(f"Tipo de clave no soportado: {type(clave).__name__}")
+
+
+def hash_para_certificado(clave):
+    """Hash con el que se autofirma el certificado (Ed25519 no admite ninguno)."""
+    from cryptography.hazmat.primitives import hashes
+
+    return None if algoritmo_de_clave(clave) == ALGORITMOS_FIRMA["ed25519"] else hashes.SHA256()
+
+
+# Certificados reemplazados, junto al actual: <carpeta del cert>/anteriores/<serial>.pem.
+# Cada .sig guarda el serial del certificado con el que se firmó
+CARPETA_CERTIFICADOS_ANTERIORES = "anteriores"
+
+# Tamaño máximo de un archivo .sig (se lee entero en memoria)
+MAX_FIRMA_BYTES = 1024 * 1024
+
+# Metadatos de subida (hash, tamaño) junto a cada archivo de pendientes/
+SUFIJO_METADATOS = ".meta.json"
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """La subida superó el límite de tamaño (se corta en cuanto lo supera)."""
+
+
+class SubidaConHash:
+    """
+    Archivo temporal en pendientes/ que calcula SHA-256 y tamaño a medida
+    que se escribe. Sirve de `stream_factory` para el parser multipart de
+    werkzeug: el cuerpo de la petición va a disco una sola vez, sin pasar
+    por un temporal intermedio ni releerse para hashearlo.
+    """
+
+    def __init__(self, carpeta: str, limite_bytes: Optional[int] = None):
+        fd, self.ruta = tempfile.mkstemp(prefix=".subida-", suffix=".part", dir=carpeta)
+        self._archivo = os.fdopen(fd, "w+b")
+        self._sha = hashlib.sha256()
+        self.tamaño = 0
+        self.limite_bytes = limite_bytes
+
+    def write(self, datos) -> int:
+        self.tamaño += len(datos)
+        if self.limite_bytes is not None and self.tamaño > self.limite_bytes:
+            raise ArchivoDemasiadoGrande(f"La subida supera {self.limite_bytes} bytes")
+        self._sha.update(datos)
+        return self._archivo.write(datos)
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+    def descartar(self):
+        """Cierra y borra el temporal (subida rechazada o incompleta)."""
+        self._archivo.close()
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, nombre):
+        # seek/read/close/tell... del archivo real
+        return getattr(self._archivo, nombre)
+
+
+class ResumenEnFlujo:
+    """
+    Destino de escritura que no toca el disco: calcula SHA-256 y tamaño de
+    lo recibido y solo retiene en memoria los primeros `retener` bytes
+    (lo justo para un .sig). Como `stream_factory` de werkzeug, cada parte
+    de un multipart se resume mientras llega; leído, devuelve lo retenido.
+    """
+
+    def __init__(self, retener: int = MAX_FIRMA_BYTES):
+        self._sha = hashlib.sha256()
+        self.tamaño = 0
+        self.retener = retener
+        self._inicio = bytearray()
+        self._pos = 0
+
+    def write(self, datos) -> int:
+        self._sha.update(datos)
+        self.tamaño += len(datos)
+        if self._inicio is not None:
+            if len(self._inicio) + len(datos) <= self.retener:
+                self._inicio += datos
+            else:
+                self._inicio = None   # demasiado grande para retenerlo
+        return len(datos)
+
+    def digest(self) -> bytes:
+        return self._sha.digest()
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        self._pos = pos
+        return pos
+
+    def read(self, n: int = -1) -> bytes:
+        if self._inicio is None:
+            raise ValueError(f"Contenido de más de {self.retener} bytes: no se retuvo")
+        fin = len(self._inicio) if n is None or n < 0 else self._pos + n
+        datos = bytes(self._inicio[self._pos:fin])
+        self._pos += len(datos)
+        return datos
+
+    def close(self):
+        self._inicio = None
+
 
 class FirmaDigitalService:
     """
@@ -52,10 +200,15 @@ class FirmaDigitalService:
         
         self._private_key = None
         self._certificate = None
+        self._certificados_anteriores = {}   # serial -> certificado (caché)
         self._cargar_credenciales()
     
     def _cargar_credenciales(self):
         """Carga el certificado y la clave privada."""
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        from cryptography import x509
+
         try:
             if os.path.exists(self.key_path):
                 with open(self.key_path, "rb") as f:
@@ -82,20 +235,29 @@ class FirmaDigitalService:
         self,
         common_name: str = "Firmador Digital",
         organization: str = "Chat Seguro",
-        dias_validez: int = 365
+        dias_validez: int = 365,
+        algoritmo: str = None
     ) -> Tuple[str, str]:
         """
         Genera un nuevo par de certificado/clave para firma digital.
         
+        Args:
+            algoritmo: "rsa" (4096 bits), "ecdsa-p256" o "ed25519"; por
+                defecto FIRMA_ALGORITMO (rsa)
+        
         Returns:
             Tuple con rutas (cert_path, key_path)
         """
-        # Generar clave privada RSA
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=4096,
-            backend=default_backend()
-        )
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+
+        # Generar clave privada
+        private_key = generar_clave_privada(algoritmo or os.environ.get("FIRMA_ALGORITMO", "rsa"))
+
+        # El certificado actual se conserva: sus firmas tienen que seguir verificándose
+        self._archivar_certificado()
         
         # Crear certificado autofirmado
         subject = issuer = x509.Name([
@@ -126,7 +288,7 @@ class FirmaDigitalService:
                 ),
                 critical=True,
             )
-            .sign(private_key, hashes.SHA256(), backend=default_backend())
+            .sign(private_key, hash_para_certificado(private_key), backend=default_backend())
         )
         
         # Crear directorio si no existe
@@ -136,7 +298,7 @@ class FirmaDigitalService:
         with open(self.key_path, "wb") as f:
             f.write(private_key.private_bytes(
                 encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.TraditionalOpenSSL,
+                format=serialization.PrivateFormat.PKCS8,
                 encryption_algorithm=serialization.NoEncryption()
             ))
         
@@ -152,13 +314,98 @@ class FirmaDigitalService:
         
         return (self.cert_path, self.key_path)
     
+    @property
+    def carpeta_certificados_anteriores(self) -> str:
+        return os.path.join(os.path.dirname(self.cert_path) or ".", CARPETA_CERTIFICADOS_ANTERIORES)
+
+    def _archivar_certificado(self):
+        """Copia el certificado cargado a certs/anteriores/<serial>.pem."""
+        from cryptography.hazmat.primitives import serialization
+
+        if not self._certificate:
+            return
+        os.makedirs(self.carpeta_certificados_anteriores, exist_ok=True)
+        ruta = os.path.join(self.carpeta_certificados_anteriores, f"{self._certificate.serial_number}.pem")
+        with open(ruta, "wb") as f:
+            f.write(self._certificate.public_bytes(serialization.Encoding.PEM))
+        print(f"[+] Certificado anterior conservado: {ruta}")
+
+    def _certificado_para(self, serial: Optional[str]):
+        """
+        Certificado con el que verificar un .sig: el anterior con ese serial
+        si existe y si no (serial del actual, desconocido o .sig antiguo
+        sin serial) el actual.
+        """
+        from cryptography import x509
+
+        serial = str(serial or "")
+        if not serial.isdigit() or (self._certificate and serial == str(self._certificate.serial_number)):
+            return self._certificate
+        if serial not in self._certificados_anteriores:
+            ruta = os.path.join(self.carpeta_certificados_anteriores, f"{serial}.pem")
+            try:
+                with open(ruta, "rb") as f:
+                    self._certificados_anteriores[serial] = x509.load_pem_x509_certificate(f.read())
+            except FileNotFoundError:
+                return self._certificate
+        return self._certificados_anteriores[serial]
+
     def _calcular_hash(self, data: bytes) -> bytes:
         """Calcula SHA-256 de los datos."""
         return hashlib.sha256(data).digest()
+
+    def _hash_archivo(self, archivo_path: str) -> Tuple[bytes, int]:
+        """SHA-256 y tamaño de un archivo, leído por bloques en un búfer reutilizado."""
+        with open(archivo_path, "rb", buffering=0) as f:
+            return self._hash_flujo(f)
+
+    @staticmethod
+    def _hash_flujo(flujo) -> Tuple[bytes, int]:
+        """SHA-256 y tamaño de un flujo binario; un ResumenEnFlujo ya viene hasheado."""
+        if isinstance(flujo, ResumenEnFlujo):
+            return flujo.digest(), flujo.tamaño
+        sha = hashlib.sha256()
+        tamaño = 0
+        if hasattr(flujo, "readinto"):
+            bufer = bytearray(BLOQUE_LECTURA)
+            vista = memoryview(bufer)
+            while True:
+                leidos = flujo.readinto(bufer)
+                if not leidos:
+                    break
+                sha.update(vista[:leidos])
+                tamaño += leidos
+        else:
+            for bloque in iter(lambda: flujo.read(BLOQUE_LECTURA), b""):
+                sha.update(bloque)
+                tamaño += len(bloque)
+        return sha.digest(), tamaño
+
+    @staticmethod
+    def _copiar_sin_leer(origen: str, destino: str):
+        """
+        Enlace duro si es posible (sin copiar datos); si no (otro sistema de
+        archivos, FS sin enlaces), shutil.copyfile, que en Linux copia en el
+        kernel (copy_file_range/sendfile) sin pasar los bytes por Python.
+        """
+        if os.path.exists(destino):
+            # Se sustituye (como antes), sin escribir dentro de un posible enlace
+            os.remove(destino)
+        try:
+            os.link(origen, destino)
+        except OSError:
+            shutil.copyfile(origen, destino)
     
+    @property
+    def algoritmo(self) -> str:
+        """Algoritmo con el que firma la clave cargada (queda en el .sig)."""
+        clave = self._private_key or (self._certificate.public_key() if self._certificate else None)
+        return algoritmo_de_clave(clave) if clave else ALGORITMO_POR_DEFECTO
+
     def _firmar_datos(self, data: bytes) -> bytes:
         """
-        Firma datos con la clave privada RSA.
+        Firma datos con la clave privada (RSA PKCS#1 v1.5, ECDSA P-256 o
+        Ed25519 según el tipo de clave).
         
         Args:
             data: Datos a firmar
@@ -166,38 +413,50 @@ class FirmaDigitalService:
         Returns:
             Firma digital en bytes
         """
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, padding
+
         if not self._private_key:
             raise ValueError("No hay clave privada configurada para firmar")
         
-        signature = self._private_key.sign(
-            data,
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        return signature
+        algoritmo = algoritmo_de_clave(self._private_key)
+        if algoritmo == ALGORITMOS_FIRMA["rsa"]:
+            return self._private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        if algoritmo == ALGORITMOS_FIRMA["ecdsa-p256"]:
+            return self._private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+        return self._private_key.sign(data)
     
-    def _verificar_firma(self, data: bytes, signature: bytes) -> bool:
+    def _verificar_firma(self, data: bytes, signature: bytes, algoritmo: str = ALGORITMO_POR_DEFECTO,
+                         serial: Optional[str] = None) -> bool:
         """
         Verifica una firma digital.
         
         Args:
             data: Datos originales
             signature: Firma a verificar
+            algoritmo: Algoritmo indicado en el .sig; debe ser el del certificado
+            serial: certificado_serial del .sig (ver _certificado_para)
             
         Returns:
             True si la firma es válida
         """
-        if not self._certificate:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, padding
+
+        certificado = self._certificado_para(serial)
+        if not certificado:
             raise ValueError("No hay certificado configurado para verificar")
         
         try:
-            public_key = self._certificate.public_key()
-            public_key.verify(
-                signature,
-                data,
-                padding.PKCS1v15(),
-                hashes.SHA256()
-            )
+            public_key = certificado.public_key()
+            if algoritmo_de_clave(public_key) != algoritmo:
+                return False
+            if algoritmo == ALGORITMOS_FIRMA["rsa"]:
+                public_key.verify(signature, data, padding.PKCS1v15(), hashes.SHA256())
+            elif algoritmo == ALGORITMOS_FIRMA["ecdsa-p256"]:
+                public_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+            else:
+                public_key.verify(signature, data)
             return True
         except Exception:
             return False
@@ -223,6 +482,116 @@ class FirmaDigitalService:
         Returns:
             Diccionario con información de la firma
         """
+        preparado = self._preparar_firmado(archivo_path)
+        timestamp = datetime.utcnow().isoformat() + "Z"
+        metadatos = self._metadatos_firma(
+            archivo_path, preparado["hash_hex"], preparado["tamaño"],
+            firmante_id, firmante_nombre, firmante_email, razon, timestamp
+        )
+        
+        # Firmar el hash
+        try:
+            firma_bytes = self._firmar_datos(preparado["hash_contenido"])
+        except Exception:
+            os.remove(preparado["archivo_firmado"])
+            raise
+        firma_base64 = base64.b64encode(firma_bytes).decode('utf-8')
+        metadatos["firma"]["valor"] = firma_base64
+        
+        # Crear archivo de firma (.sig)
+        with open(preparado["archivo_firma"], "w", encoding="utf-8") as f:
+            json.dump(metadatos, f, indent=2, ensure_ascii=False)
+        self._invalidar("firmados")
+        
+        return {
+            "exito": True,
+            "archivo_original": archivo_path,
+            "archivo_firmado": preparado["archivo_firmado"],
+            "archivo_firma": preparado["archivo_firma"],
+            "hash": preparado["hash_hex"],
+            "timestamp": timestamp,
+            "metadatos": metadatos
+        }
+
+    def firmar_manifiesto(
+        self,
+        archivo_paths: List[str],
+        firmante_id: str,
+        firmante_nombre: str,
+        firmante_email: str,
+        razon: str = "Firma digital de documento"
+    ) -> List[Dict[str, Any]]:
+        """
+        Firma varios archivos con una sola firma: la de la raíz de un árbol
+        de Merkle sobre sus SHA-256 (firma_digital/merkle.py). Cada archivo
+        recibe su .sig con la raíz y su prueba de inclusión, y se verifica
+        por separado con verificar_archivo_firmado.
+        
+        Args:
+            archivo_paths: Rutas a los archivos a firmar
+            firmante_id: ID del usuario firmante
+            firmante_nombre: Nombre del firmante
+            firmante_email: Email del firmante
+            razon: Razón de la firma
+            
+        Returns:
+            Un resultado por archivo, en el mismo orden: como el de
+            firmar_archivo o {"exito": False, "archivo_original", "error"}
+            si ese archivo no se pudo preparar (no entra en el manifiesto)
+        """
+        from . import merkle
+
+        resultados = [None] * len(archivo_paths)
+        preparados = []
+        for i, archivo_path in enumerate(archivo_paths):
+            try:
+                preparados.append((i, self._preparar_firmado(archivo_path)))
+            except Exception as e:
+                resultados[i] = {"exito": False, "archivo_original": archivo_path, "error": str(e)}
+        if not preparados:
+            return resultados
+
+        raiz, pruebas = merkle.construir([p["hash_contenido"] for _, p in preparados])
+        try:
+            firma_base64 = base64.b64encode(self._firmar_datos(raiz)).decode('utf-8')
+        except Exception:
+            for _, preparado in preparados:
+                os.remove(preparado["archivo_firmado"])
+            raise
+
+        timestamp = datetime.utcnow().isoformat() + "Z"
+        for (i, preparado), prueba in zip(preparados, pruebas):
+            archivo_path = archivo_paths[i]
+            metadatos = self._metadatos_firma(
+                archivo_path, preparado["hash_hex"], preparado["tamaño"],
+                firmante_id, firmante_nombre, firmante_email, razon, timestamp
+            )
+            metadatos["version"] = "2.0"
+            metadatos["firma"]["valor"] = firma_base64
+            metadatos["manifiesto"] = {
+                "raiz": raiz.hex(),
+                "documentos": len(preparados),
+                "prueba": prueba
+            }
+            with open(preparado["archivo_firma"], "w", encoding="utf-8") as f:
+                json.dump(metadatos, f, indent=2, ensure_ascii=False)
+            resultados[i] = {
+                "exito": True,
+                "archivo_original": archivo_path,
+                "archivo_firmado": preparado["archivo_firmado"],
+                "archivo_firma": preparado["archivo_firma"],
+                "hash": preparado["hash_hex"],
+                "timestamp": timestamp,
+                "metadatos": metadatos
+            }
+        self._invalidar("firmados")
+        return resultados
+
+    def _preparar_firmado(self, archivo_path: str) -> Dict[str, Any]:
+        """
+        Copia un archivo a firmados/ y obtiene su hash: rutas del archivo
+        firmado y de su .sig, hash_contenido, hash_hex y tamaño.
+        """
         if not os.path.exists(archivo_path):
             raise FileNotFoundError(f"Archivo no encontrado: {archivo_path}")
         
@@ -230,21 +599,56 @@ class FirmaDigitalService:
         if extension not in self.TIPOS_PERMITIDOS:
             raise ValueError(f"Tipo de archivo no permitido: {extension}")
         
-        # Leer archivo
-        with open(archivo_path, "rb") as f:
-            contenido = f.read()
-        
-        # Calcular hash del contenido
-        hash_contenido = self._calcular_hash(contenido)
-        hash_hex = hash_contenido.hex()
+        # Generar nombre de archivo firmado
+        nombre_base = os.path.splitext(os.path.basename(archivo_path))[0]
+        timestamp_archivo = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        archivo_firmado_path = os.path.join(
+            self.upload_folder,
+            "firmados",
+            f"{nombre_base}_{timestamp_archivo}{extension}"
+        )
+
+        # Copiar archivo original a carpeta de firmados (enlace o copia en el
+        # kernel). Si se subió por /firma/subir, el hash ya se calculó al
+        # escribirlo; si no, se hashea la copia: lo firmado es lo guardado
+        subida = self._metadatos_vigentes(archivo_path)
+        self._copiar_sin_leer(archivo_path, archivo_firmado_path)
+        if subida:
+            hash_hex, tamaño = subida["hash_sha256"], subida["tamaño_bytes"]
+            hash_contenido = bytes.fromhex(hash_hex)
+        else:
+            hash_contenido, tamaño = self._hash_archivo(archivo_firmado_path)
+            hash_hex = hash_contenido.hex()
         
-        # Crear metadatos de firma
-        timestamp = datetime.utcnow().isoformat() + "Z"
-        metadatos = {
+        return {
+            "archivo_firmado": archivo_firmado_path,
+            "archivo_firma": os.path.join(
+                self.upload_folder,
+                "firmados",
+                f"{nombre_base}_{timestamp_archivo}.sig"
+            ),
+            "hash_contenido": hash_contenido,
+            "hash_hex": hash_hex,
+            "tamaño": tamaño
+        }
+
+    def _metadatos_firma(
+        self,
+        archivo_path: str,
+        hash_hex: str,
+        tamaño: int,
+        firmante_id: str,
+        firmante_nombre: str,
+        firmante_email: str,
+        razon: str,
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """Contenido del .sig, sin el valor de la firma."""
+        return {
             "version": "1.0",
             "archivo_original": os.path.basename(archivo_path),
             "hash_sha256": hash_hex,
-            "tamaño_bytes": len(contenido),
+            "tamaño_bytes": tamaño,
             "firmante": {
                 "id": firmante_id,
                 "nombre": firmante_nombre,
@@ -253,50 +657,11 @@ class FirmaDigitalService:
             "firma": {
                 "timestamp": timestamp,
                 "razon": razon,
-                "algoritmo": "RSA-SHA256",
+                "algoritmo": self.algoritmo,
                 "certificado_emisor": self._certificate.issuer.rfc4514_string() if self._certificate else "N/A",
                 "certificado_serial": str(self._certificate.serial_number) if self._certificate else "N/A"
             }
         }
-        
-        # Firmar el hash
-        firma_bytes = self._firmar_datos(hash_contenido)
-        firma_base64 = base64.b64encode(firma_bytes).decode('utf-8')
-        metadatos["firma"]["valor"] = firma_base64
-        
-        # Generar nombre de archivo firmado
-        nombre_base = os.path.splitext(os.path.basename(archivo_path))[0]
-        timestamp_archivo = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        
-        # Crear archivo de firma (.sig)
-        firma_path = os.path.join(
-            self.upload_folder,
-            "firmados",
-            f"{nombre_base}_{timestamp_archivo}.sig"
-        )
-        
-        with open(firma_path, "w", encoding="utf-8") as f:
-            json.dump(metadatos, f, indent=2, ensure_ascii=False)
-        
-        # Copiar archivo original a carpeta de firmados
-        archivo_firmado_path = os.path.join(
-            self.upload_folder,
-            "firmados",
-            f"{nombre_base}_{timestamp_archivo}{extension}"
-        )
-        
-        with open(archivo_firmado_path, "wb") as f:
-            f.write(contenido)
-        
-        return {
-            "exito": True,
-            "archivo_original": archivo_path,
-            "archivo_firmado": archivo_firmado_path,
-            "archivo_firma": firma_path,
-            "hash": hash_hex,
-            "timestamp": timestamp,
-            "metadatos": metadatos
-        }
     
     def verificar_archivo_firmado(self, archivo_path: str, firma_path: str) -> Dict[str, Any]:
         """
@@ -309,16 +674,37 @@ class FirmaDigitalService:
         Returns:
             Diccionario con resultado de la verificación
         """
-        # Leer archivo
-        with open(archivo_path, "rb") as f:
-            contenido = f.read()
+        with open(archivo_path, "rb", buffering=0) as archivo, open(firma_path, "rb") as firma:
+            return self.verificar_flujo(archivo, firma)
+
+    def verificar_flujo(self, archivo, firma) -> Dict[str, Any]:
+        """
+        Verifica la firma de un archivo a partir de flujos binarios (archivos
+        abiertos, FileStorage.stream...), sin pasar por disco.
         
+        Args:
+            archivo: Flujo con el contenido (se hashea por bloques)
+            firma: Flujo con el .sig (como mucho MAX_FIRMA_BYTES)
+            
+        Returns:
+            Diccionario con resultado de la verificación
+            
+        Raises:
+            ValueError: .sig demasiado grande o que no es JSON UTF-8 válido
+        """
         # Leer firma
-        with open(firma_path, "r", encoding="utf-8") as f:
-            metadatos = json.load(f)
-        
+        contenido = firma.read(MAX_FIRMA_BYTES + 1)
+        if len(contenido) > MAX_FIRMA_BYTES:
+            raise ValueError(f"Archivo de firma de más de {MAX_FIRMA_BYTES} bytes")
+        metadatos = json.loads(contenido.decode("utf-8"))
+        if not isinstance(metadatos, dict):
+            raise ValueError("El archivo de firma no contiene un objeto JSON")
+        
+        return self._verificar_metadatos(metadatos, self._hash_flujo(archivo)[0].hex())
+
+    def _verificar_metadatos(self, metadatos: Dict[str, Any], hash_actual: str) -> Dict[str, Any]:
+        """Compara el hash del archivo con el del .sig y verifica la firma del hash."""
         # Verificar hash
-        hash_actual = self._calcular_hash(contenido).hex()
         hash_guardado = metadatos.get("hash_sha256", "")
         
         if hash_actual != hash_guardado:
@@ -329,13 +715,34 @@ class FirmaDigitalService:
                 "hash_actual": hash_actual
             }
         
+        # Lo firmado es el hash del archivo o, en un manifiesto, la raíz del
+        # árbol de Merkle que se obtiene con ese hash y su prueba de inclusión
+        manifiesto = metadatos.get("manifiesto")
+        if manifiesto is not None:
+            from . import merkle
+            try:
+                raiz = merkle.raiz_desde_prueba(bytes.fromhex(hash_guardado), manifiesto.get("prueba", []))
+            except (ValueError, TypeError):
+                raiz = None
+            if raiz is None or raiz.hex() != manifiesto.get("raiz"):
+                return {
+                    "valido": False,
+                    "error": "La prueba de inclusión no lleva a la raíz del manifiesto",
+                    "metadatos": metadatos
+                }
+        
         # Verificar firma digital
         firma_base64 = metadatos.get("firma", {}).get("valor", "")
         if firma_base64:
             firma_bytes = base64.b64decode(firma_base64)
-            hash_bytes = bytes.fromhex(hash_guardado)
+            hash_bytes = raiz if manifiesto is not None else bytes.fromhex(hash_guardado)
             
-            firma_valida = self._verificar_firma(hash_bytes, firma_bytes)
+            firma_valida = self._verificar_firma(
+                hash_bytes,
+                firma_bytes,
+                metadatos.get("firma", {}).get("algoritmo", ALGORITMO_POR_DEFECTO),
+                metadatos.get("firma", {}).get("certificado_serial")
+            )
             
             if not firma_valida:
                 return {
@@ -352,6 +759,93 @@ class FirmaDigitalService:
             "metadatos": metadatos
         }
     
+    def version_info(self, carpeta: str) -> tuple:
+        """
+        Versión de 'pendientes' o 'firmados' para la caché de respuestas: el
+        mtime de la carpeta, que es el mismo para todos los procesos (workers
+        de gunicorn, pool de firma por lotes) y por tanto también el ETag.
+        """
+        stat = os.stat(os.path.join(self.upload_folder, carpeta))
+        return str(stat.st_mtime_ns), datetime.utcfromtimestamp(stat.st_mtime)
+
+    def _invalidar(self, *carpetas: str):
+        """
+        Cambia el mtime de las carpetas. Crear o borrar archivos ya lo hace,
+        pero no reescribir uno existente (o dos cambios en el mismo tic del
+        reloj del sistema de archivos): se fuerza un valor siempre mayor.
+        """
+        for carpeta in carpetas:
+            ruta = os.path.join(self.upload_folder, carpeta)
+            try:
+                ahora = max(time.time_ns(), os.stat(ruta).st_mtime_ns + 1)
+                os.utime(ruta, ns=(ahora, ahora))
+            except OSError as e:
+                print(f"[!] No se pudo invalidar {carpeta}: {e}")
+
+    def nueva_subida(self, limite_bytes: Optional[int] = None) -> SubidaConHash:
+        """Temporal en pendientes/ para recibir una subida (ver SubidaConHash)."""
+        return SubidaConHash(os.path.join(self.upload_folder, "pendientes"), limite_bytes)
+
+    def confirmar_subida(self, subida: SubidaConHash, nombre: str) -> Dict[str, Any]:
+        """
+        Da nombre definitivo a una subida completa y guarda junto a ella
+        (<nombre>.meta.json) el hash y el tamaño calculados al escribirla.
+        """
+        ruta = os.path.join(self.upload_folder, "pendientes", nombre)
+        subida.flush()
+        subida.close()
+        # mkstemp crea el temporal con 0600; permisos de un archivo normal
+        os.chmod(subida.ruta, 0o644)
+        os.replace(subida.ruta, ruta)
+        stat = os.stat(ruta)
+        metadatos = {
+            "hash_sha256": subida.hexdigest(),
+            "tamaño_bytes": subida.tamaño,
+            "mtime_ns": stat.st_mtime_ns,
+            "subido": datetime.utcnow().isoformat() + "Z"
+        }
+        temporal = f"{ruta}{SUFIJO_METADATOS}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(metadatos, f)
+        os.replace(temporal, ruta + SUFIJO_METADATOS)
+        self._invalidar("pendientes")
+        return {"ruta": ruta, **metadatos}
+
+    def guardar_pendiente(self, archivo, nombre: str) -> str:
+        """Guarda un archivo subido (FileStorage) en pendientes. Devuelve la ruta."""
+        subida = self.nueva_subida()
+        try:
+            shutil.copyfileobj(archivo.stream, subida, BLOQUE_LECTURA)
+        except BaseException:
+            subida.descartar()
+            raise
+        return self.confirmar_subida(subida, nombre)["ruta"]
+
+    def _metadatos_vigentes(self, archivo_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos de subida de un pendiente si siguen describiendo el archivo
+        (mismo tamaño y mtime); None si no hay o el archivo cambió después.
+        """
+        try:
+            with open(archivo_path + SUFIJO_METADATOS, encoding="utf-8") as f:
+                metadatos = json.load(f)
+            stat = os.stat(archivo_path)
+            if (stat.st_size == metadatos["tamaño_bytes"] and stat.st_mtime_ns == metadatos["mtime_ns"]
+                    and len(bytes.fromhex(metadatos["hash_sha256"])) == hashlib.sha256().digest_size):
+                return metadatos
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def eliminar_pendiente(self, archivo_path: str):
+        """Quita un archivo de pendientes (tras firmarlo) y sus metadatos de subida."""
+        os.remove(archivo_path)
+        try:
+            os.remove(archivo_path + SUFIJO_METADATOS)
+        except FileNotFoundError:
+            pass
+        self._invalidar("pendientes")
+
     def listar_archivos_pendientes(self) -> list:
         """Lista archivos pendientes de firma."""
         pendientes_dir = os.path.join(self.upload_folder, "pendientes")
@@ -398,3 +892,17 @@ class FirmaDigitalService:
 from datetime import timedelta
 
 
+# Singleton perezoso: se crea (carpetas, clave y certificado) en el primer uso
+_firma_service = None
+_firma_service_lock = threading.Lock()
+
+def get_firma_service() -> FirmaDigitalService:
+    """Obtiene la instancia singleton del servicio de firma (thread-safe)."""
+    global _firma_service
+    if _firma_service is None:
+        with _firma_service_lock:
+            if _firma_service is None:
+                _firma_service = FirmaDigitalService(upload_folder=os.environ.get('UPLOAD_FOLDER', 'uploads'))
+    return _firma_service
+
+
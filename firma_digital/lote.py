@@ -0,0 +1,213 @@
+# firma_digital/lote.py
+"""
+Firma por lotes
+===============
+Firma varios archivos de pendientes/ repartiendo el hash y la firma RSA
+entre un pool de procesos (cada proceso carga la clave una vez). Los
+resultados se entregan según terminan, uno por archivo; un archivo que
+falla no detiene al resto.
+
+Lo usan POST /firma/firmar-lote (respuesta NDJSON) y la línea de comandos:
+
+    python -m firma_digital.lote --todos --nombre "Ana" --email ana@ejemplo.com
+    python -m firma_digital.lote 20250101_120000_a.pdf 20250101_120001_b.pdf
+    python -m firma_digital.lote --todos --manifiesto
+
+FIRMA_LOTE_PROCESOS fija el tamaño del pool (por defecto, un proceso por
+núcleo). Arrancar un proceso (spawn + carga de la clave) cuesta lo que
+firmar cientos de archivos, así que se usa como mucho un proceso por cada
+FIRMA_LOTE_MIN_POR_PROCESO archivos; con uno solo se firma sin pool.
+
+Con --manifiesto (modo "manifiesto" en la API) el lote entero lleva una
+sola firma sobre la raíz de un árbol de Merkle (firma_digital/merkle.py):
+el coste ya no crece con una firma por archivo, solo con los hashes (que
+/firma/subir dejó calculados). Los resultados llegan juntos al final.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
+
+from .firma_service import FirmaDigitalService, get_firma_service
+
+FIRMA_LOTE_PROCESOS = int(os.environ.get("FIRMA_LOTE_PROCESOS", 0)) or (os.cpu_count() or 1)
+FIRMA_LOTE_MIN_POR_PROCESO = int(os.environ.get("FIRMA_LOTE_MIN_POR_PROCESO", 64))
+
+
+# Servicio de cada proceso del pool (clave y certificado cargados una vez)
+_servicio = None
+
+
+def _inicializar(cert_path: str, key_path: str, upload_folder: str):
+    global _servicio
+    # Sin los avisos de carga de credenciales en la salida del padre (NDJSON en la CLI)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _servicio = FirmaDigitalService(cert_path=cert_path, key_path=key_path, upload_folder=upload_folder)
+
+
+def _ruta_pendiente(servicio: FirmaDigitalService, archivo_id: str) -> Optional[str]:
+    """Ruta de un ID de pendientes/, o None si no es un nombre simple o no existe."""
+    archivo_path = os.path.join(servicio.upload_folder, "pendientes", archivo_id)
+    if os.path.basename(archivo_id) != archivo_id or not os.path.isfile(archivo_path):
+        return None
+    return archivo_path
+
+
+def _firmar_uno(servicio: FirmaDigitalService, archivo_id: str, firmante: Dict[str, str], razon: str) -> Dict[str, Any]:
+    """Firma un pendiente y lo quita de pendientes; los errores quedan en el resultado."""
+    try:
+        archivo_path = _ruta_pendiente(servicio, archivo_id)
+        if archivo_path is None:
+            return {"archivo_id": archivo_id, "exito": False, "error": "Archivo no encontrado"}
+        resultado = servicio.firmar_archivo(
+            archivo_path=archivo_path,
+            firmante_id=firmante.get("id"),
+            firmante_nombre=firmante.get("nombre"),
+            firmante_email=firmante.get("email"),
+            razon=razon
+        )
+        servicio.eliminar_pendiente(archivo_path)
+        return {"archivo_id": archivo_id, **resultado}
+    except Exception as e:
+        return {"archivo_id": archivo_id, "exito": False, "error": str(e)}
+
+
+def _firmar_manifiesto(servicio: FirmaDigitalService, archivo_ids: List[str], firmante: Dict[str, str],
+                       razon: str) -> Iterator[Dict[str, Any]]:
+    """Una sola firma para todo el lote; cada archivo recibe su prueba de inclusión."""
+    rutas = {}
+    for archivo_id in archivo_ids:
+        archivo_path = _ruta_pendiente(servicio, archivo_id)
+        if archivo_path is None:
+            yield {"archivo_id": archivo_id, "exito": False, "error": "Archivo no encontrado"}
+        else:
+            rutas[archivo_id] = archivo_path
+    if not rutas:
+        return
+
+    try:
+        resultados = servicio.firmar_manifiesto(
+            list(rutas.values()),
+            firmante_id=firmante.get("id"),
+            firmante_nombre=firmante.get("nombre"),
+            firmante_email=firmante.get("email"),
+            razon=razon
+        )
+    except Exception as e:
+        for archivo_id in rutas:
+            yield {"archivo_id": archivo_id, "exito": False, "error": str(e)}
+        return
+
+    for (archivo_id, archivo_path), resultado in zip(rutas.items(), resultados):
+        if resultado.get("exito"):
+            servicio.eliminar_pendiente(archivo_path)
+        yield {"archivo_id": archivo_id, **resultado}
+
+
+# Se ejecuta en los procesos del pool
+def _firmar_en_proceso(archivo_id: str, firmante: Dict[str, str], razon: str) -> Dict[str, Any]:
+    return _firmar_uno(_servicio, archivo_id, firmante, razon)
+
+
+def firmar_lote(
+    archivo_ids: Optional[List[str]],
+    firmante: Dict[str, str],
+    razon: str = "Firma digital de documento",
+    procesos: int = FIRMA_LOTE_PROCESOS,
+    servicio: FirmaDigitalService = None,
+    min_por_proceso: int = FIRMA_LOTE_MIN_POR_PROCESO,
+    manifiesto: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Firma los pendientes indicados (None = todos) y devuelve un resultado
+    por archivo, en el orden en que terminan.
+
+    Args:
+        archivo_ids: IDs (nombres) en pendientes/, o None para todos
+        firmante: {"id", "nombre", "email"}
+        razon: Razón de la firma
+        procesos: Tamaño máximo del pool
+        servicio: Servicio de firma (por defecto, el global)
+        min_por_proceso: Archivos mínimos por proceso del pool
+        manifiesto: Una sola firma (raíz de Merkle) para todo el lote
+    """
+    servicio = servicio or get_firma_service()
+    if archivo_ids is None:
+        archivo_ids = sorted(a["nombre"] for a in servicio.listar_archivos_pendientes())
+    archivo_ids = list(dict.fromkeys(archivo_ids))
+    procesos = max(1, min(procesos, len(archivo_ids) // max(1, min_por_proceso)))
+
+    try:
+        if manifiesto:
+            yield from _firmar_manifiesto(servicio, archivo_ids, firmante, razon)
+            return
+
+        if procesos == 1:
+            for archivo_id in archivo_ids:
+                yield _firmar_uno(servicio, archivo_id, firmante, razon)
+            return
+
+        # spawn: no se hace fork de un proceso con hilos (Flask, gunicorn gthread)
+        with ProcessPoolExecutor(
+            procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar,
+            initargs=(servicio.cert_path, servicio.key_path, servicio.upload_folder)
+        ) as pool:
+            futuros = {pool.submit(_firmar_en_proceso, archivo_id, firmante, razon): archivo_id
+                       for archivo_id in archivo_ids}
+            for futuro in as_completed(futuros):
+                try:
+                    yield futuro.result()
+                except Exception as e:
+                    # Proceso del pool caído (BrokenProcessPool): afecta solo a sus archivos
+                    yield {"archivo_id": futuros[futuro], "exito": False, "error": str(e) or type(e).__name__}
+    finally:
+        # Las firmas hechas en otros procesos no pasan por los contadores de este
+        servicio._invalidar("pendientes", "firmados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firma por lotes de archivos pendientes (salida NDJSON)")
+    parser.add_argument("archivo_ids", nargs="*", help="IDs de archivos en pendientes/")
+    parser.add_argument("--todos", action="store_true", help="Firmar todos los pendientes")
+    parser.add_argument("--manifiesto", action="store_true",
+                        help="Una sola firma para todo el lote (árbol de Merkle)")
+    parser.add_argument("--procesos", type=int, default=FIRMA_LOTE_PROCESOS, help="Procesos del pool")
+    parser.add_argument("--firmante-id", default="cli", help="ID del firmante")
+    parser.add_argument("--nombre", default="Firma por lotes", help="Nombre del firmante")
+    parser.add_argument("--email", default="", help="Email del firmante")
+    parser.add_argument("--razon", default="Firma digital de documento", help="Razón de la firma")
+    args = parser.parse_args()
+
+    if not args.todos and not args.archivo_ids:
+        parser.error("indica archivo_ids o --todos")
+
+    firmante = {"id": args.firmante_id, "nombre": args.nombre, "email": args.email}
+    with contextlib.redirect_stdout(sys.stderr):
+        servicio = get_firma_service()
+
+    inicio = time.perf_counter()
+    firmados = fallidos = 0
+    for resultado in firmar_lote(None if args.todos else args.archivo_ids, firmante, args.razon,
+                                 args.procesos, servicio, manifiesto=args.manifiesto):
+        if resultado.get("exito"):
+            firmados += 1
+        else:
+            fallidos += 1
+        print(json.dumps(resultado, ensure_ascii=False), flush=True)
+
+    segundos = time.perf_counter() - inicio
+    print(f"[+] {firmados} firmados, {fallidos} con error en {segundos:.2f} s", file=sys.stderr)
+    sys.exit(1 if fallidos else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# firma_digital/merkle.py
+"""
+Árbol de Merkle para firmas por manifiesto
+==========================================
+Una sola firma cubre la raíz de un árbol de Merkle construido sobre los
+SHA-256 de un lote de documentos; cada documento guarda en su .sig la
+prueba de inclusión (los hashes hermanos de su hoja a la raíz) y se
+verifica por separado, sin los demás documentos.
+
+- Hoja:  SHA-256(0x00 || sha256_documento)
+- Nodo:  SHA-256(0x01 || izquierdo || derecho)
+  (prefijos distintos: una hoja no puede hacerse pasar por un nodo)
+- Un nodo sin pareja en su nivel sube tal cual al siguiente (no se
+  duplica), así dos listas distintas no dan la misma raíz
+
+Prueba: lista de [lado, hash hex] desde la hoja; lado "i" si el hermano
+va a la izquierda, "d" si va a la derecha. Ocupa log2(n) entradas.
+"""
+
+import hashlib
+from typing import List, Tuple
+
+PREFIJO_HOJA = b"\x00"
+PREFIJO_NODO = b"\x01"
+
+
+def hoja(digest: bytes) -> bytes:
+    return hashlib.sha256(PREFIJO_HOJA + digest).digest()
+
+
+def nodo(izquierdo: bytes, derecho: bytes) -> bytes:
+    return hashlib.sha256(PREFIJO_NODO + izquierdo + derecho).digest()
+
+
+def construir(digests: List[bytes]) -> Tuple[bytes, List[List[List[str]]]]:
+    """
+    Raíz del árbol sobre `digests` (SHA-256 de cada documento, en orden) y
+    la prueba de inclusión de cada uno.
+    """
+    if not digests:
+        raise ValueError("Se necesita al menos un documento")
+
+    nivel = [hoja(d) for d in digests]
+    # Posición de cada documento en el nivel actual
+    posiciones = list(range(len(digests)))
+    pruebas = [[] for _ in digests]
+
+    while len(nivel) > 1:
+        for documento, posicion in enumerate(posiciones):
+            hermano = posicion ^ 1
+            if hermano < len(nivel):
+                lado = "i" if hermano < posicion else "d"
+                pruebas[documento].append([lado, nivel[hermano].hex()])
+            posiciones[documento] = posicion // 2
+
+        siguiente = [nodo(nivel[i], nivel[i + 1]) for i in range(0, len(nivel) - 1, 2)]
+        if len(nivel) % 2:
+            siguiente.append(nivel[-1])
+        nivel = siguiente
+
+    return nivel[0], pruebas
+
+
+def raiz_desde_prueba(digest: bytes, prueba: List[List[str]]) -> bytes:
+    """Raíz que resulta de subir desde la hoja de `digest` con su prueba."""
+    actual = hoja(digest)
+    for lado, hermano_hex in prueba:
+        hermano = bytes.fromhex(hermano_hex)
+        if lado == "i":
+            actual = nodo(hermano, actual)
+        elif lado == "d":
+            actual = nodo(actual, hermano)
+        else:
+            raise ValueError(f"Lado de prueba no válido: {lado!r}")
+    return actual
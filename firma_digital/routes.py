@@ -5,14 +5,18 @@ Rutas API para Firma Digital
 Endpoints para gestión de firma digital de documentos.
 """
 
+import json
 import os
-from flask import Blueprint, request, jsonify, render_template, session, redirect, url_for, send_file
+import time
+from flask import Blueprint, Response, request, jsonify, render_template, session, redirect, url_for, send_file
+from werkzeug.formparser import parse_form_data
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
-from .firma_service import FirmaDigitalService
-from .drive_service import GoogleDriveService, get_drive_service
-from .email_service import EmailService, get_email_service
+from .firma_service import get_firma_service, ArchivoDemasiadoGrande, ResumenEnFlujo
+from .drive_service import get_drive_service
+from .email_service import get_email_service
+from cache_respuestas import respuesta_cacheable
 
 
 # Blueprint para rutas de firma
@@ -23,9 +27,6 @@ UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'txt', 'zip'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 
-# Servicios
-firma_service = FirmaDigitalService(upload_folder=UPLOAD_FOLDER)
-
 
 def archivo_permitido(filename: str) -> bool:
     """Verifica si la extensión del archivo está permitida."""
@@ -65,71 +66,95 @@ def subir_archivo():
         - archivo_id: ID del archivo subido
         - nombre: Nombre del archivo
         - tamaño: Tamaño en bytes
+        - hash: SHA-256 del contenido
     """
     usuario = obtener_usuario_actual()
     if not usuario:
         return jsonify({'error': 'No autenticado'}), 401
     
-    if 'file' not in request.files:
-        return jsonify({'error': 'No se envió ningún archivo'}), 400
+    # El cuerpo se escribe directamente en pendientes/ calculando SHA-256 y
+    # tamaño a la vez; se corta en cuanto pasa de MAX_FILE_SIZE
+    servicio = get_firma_service()
+    subidas = []
+    
+    def a_pendientes(total_content_length, content_type, filename, content_length=None):
+        subida = servicio.nueva_subida(limite_bytes=MAX_FILE_SIZE)
+        subidas.append(subida)
+        return subida
+    
+    try:
+        _, _, archivos = parse_form_data(
+            request.environ,
+            stream_factory=a_pendientes,
+            max_content_length=request.max_content_length
+        )
+    except ArchivoDemasiadoGrande:
+        for subida in subidas:
+            subida.descartar()
+        return jsonify({
+            'error': f'Archivo muy grande. Máximo: {MAX_FILE_SIZE // (1024*1024)} MB'
+        }), 400
+    except BaseException:
+        for subida in subidas:
+            subida.descartar()
+        raise
+    
+    archivo = archivos.get('file')
+    for subida in subidas:
+        if archivo is None or subida is not archivo.stream:
+            subida.descartar()
     
-    archivo = request.files['file']
+    if archivo is None:
+        return jsonify({'error': 'No se envió ningún archivo'}), 400
     
     if archivo.filename == '':
+        archivo.stream.descartar()
         return jsonify({'error': 'Nombre de archivo vacío'}), 400
     
     if not archivo_permitido(archivo.filename):
+        archivo.stream.descartar()
         return jsonify({
             'error': f'Tipo de archivo no permitido. Usa: {", ".join(ALLOWED_EXTENSIONS)}'
         }), 400
     
-    # Verificar tamaño
-    archivo.seek(0, 2)  # Ir al final
-    size = archivo.tell()
-    archivo.seek(0)  # Volver al inicio
-    
-    if size > MAX_FILE_SIZE:
-        return jsonify({
-            'error': f'Archivo muy grande. Máximo: {MAX_FILE_SIZE // (1024*1024)} MB'
-        }), 400
-    
-    # Guardar archivo
+    # Guardar archivo (el hash queda en <archivo_id>.meta.json para /firmar)
     filename = secure_filename(archivo.filename)
     timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
     nombre_unico = f"{timestamp}_{filename}"
     
-    ruta_destino = os.path.join(UPLOAD_FOLDER, 'pendientes', nombre_unico)
-    os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
-    archivo.save(ruta_destino)
+    guardado = servicio.confirmar_subida(archivo.stream, nombre_unico)
     
     return jsonify({
         'exito': True,
         'archivo_id': nombre_unico,
         'nombre': filename,
-        'tamaño': size,
-        'ruta': ruta_destino
+        'tamaño': guardado['tamaño_bytes'],
+        'hash': guardado['hash_sha256'],
+        'ruta': guardado['ruta']
     })
 
 
 @firma_bp.route('/pendientes', methods=['GET'])
+@respuesta_cacheable(lambda: [(get_firma_service(), 'pendientes')])
 def listar_pendientes():
     """Lista archivos pendientes de firma."""
     usuario = obtener_usuario_actual()
     if not usuario:
         return jsonify({'error': 'No autenticado'}), 401
     
-    archivos = firma_service.listar_archivos_pendientes()
+    archivos = get_firma_service().listar_archivos_pendientes()
     return jsonify(archivos)
 
 
 @firma_bp.route('/firmados', methods=['GET'])
+@respuesta_cacheable(lambda: [(get_firma_service(), 'firmados')])
 def listar_firmados():
     """Lista archivos ya firmados."""
     usuario = obtener_usuario_actual()
     if not usuario:
         return jsonify({'error': 'No autenticado'}), 401
     
-    archivos = firma_service.listar_archivos_firmados()
+    archivos = get_firma_service().listar_archivos_firmados()
     return jsonify(archivos)
 
 
@@ -167,7 +192,7 @@ def firmar_archivo():
         return jsonify({'error': 'Archivo no encontrado'}), 404
     
     try:
-        resultado = firma_service.firmar_archivo(
+        resultado = get_firma_service().firmar_archivo(
             archivo_path=archivo_path,
             firmante_id=usuario.get('_id'),
             firmante_nombre=usuario.get('name'),
@@ -176,7 +201,7 @@ def firmar_archivo():
         )
         
         # Eliminar de pendientes
-        os.remove(archivo_path)
+        get_firma_service().eliminar_pendiente(archivo_path)
         
         return jsonify(resultado)
         
@@ -184,6 +209,67 @@ def firmar_archivo():
         return jsonify({'error': str(e)}), 500
 
 
+@firma_bp.route('/firmar-lote', methods=['POST'])
+def firmar_lote():
+    """
+    Firma varios archivos en un pool de procesos (firma_digital/lote.py).
+    
+    Request JSON:
+        - archivo_ids: Lista de IDs a firmar, o "todos" para todos los pendientes
+        - razon: Razón de la firma (opcional)
+        - modo: "individual" (una firma por archivo, por defecto) o "manifiesto"
+          (una firma sobre la raíz de Merkle del lote y una prueba por archivo)
+        
+    Response (application/x-ndjson, una línea por archivo según terminan):
+        - {"archivo_id", "exito": true, ...información de la firma}
+        - {"archivo_id", "exito": false, "error"}
+        - Última línea: {"resumen": {"total", "firmados", "fallidos", "segundos"}}
+    """
+    usuario = obtener_usuario_actual()
+    if not usuario:
+        return jsonify({'error': 'No autenticado'}), 401
+    
+    data = request.json or {}
+    archivo_ids = data.get('archivo_ids')
+    razon = data.get('razon', 'Firma digital de documento')
+    modo = data.get('modo', 'individual')
+    
+    if modo not in ('individual', 'manifiesto'):
+        return jsonify({'error': 'modo debe ser "individual" o "manifiesto"'}), 400
+    
+    if archivo_ids == 'todos':
+        archivo_ids = None
+    elif not isinstance(archivo_ids, list) or not archivo_ids or \
+            not all(isinstance(a, str) and a for a in archivo_ids):
+        return jsonify({'error': 'Se requiere archivo_ids (lista de IDs o "todos")'}), 400
+    
+    from .lote import firmar_lote as firmar_en_lote
+    
+    firmante = {
+        'id': usuario.get('_id'),
+        'nombre': usuario.get('name'),
+        'email': usuario.get('email')
+    }
+    
+    def lineas():
+        inicio = time.perf_counter()
+        firmados = fallidos = 0
+        for resultado in firmar_en_lote(archivo_ids, firmante, razon, manifiesto=(modo == 'manifiesto')):
+            if resultado.get('exito'):
+                firmados += 1
+            else:
+                fallidos += 1
+            yield json.dumps(resultado, ensure_ascii=False) + '\n'
+        yield json.dumps({'resumen': {
+            'total': firmados + fallidos,
+            'firmados': firmados,
+            'fallidos': fallidos,
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }}) + '\n'
+    
+    return Response(lineas(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-store'})
+
+
 @firma_bp.route('/verificar', methods=['POST'])
 def verificar_firma():
     """
@@ -196,29 +282,24 @@ def verificar_firma():
     Response:
         - Resultado de la verificación
     """
-    if 'file' not in request.files or 'signature' not in request.files:
+    # Cada parte se hashea mientras llega, sin escribirla en disco; del
+    # .sig (pequeño) se retiene el contenido para leerlo después
+    _, _, archivos = parse_form_data(
+        request.environ,
+        stream_factory=lambda *args, **kwargs: ResumenEnFlujo(),
+        max_content_length=request.max_content_length
+    )
+    
+    if 'file' not in archivos or 'signature' not in archivos:
         return jsonify({'error': 'Se requieren archivo y firma'}), 400
     
-    archivo = request.files['file']
-    firma = request.files['signature']
-    
-    # Guardar temporalmente
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_archivo:
-        archivo.save(tmp_archivo.name)
-        archivo_path = tmp_archivo.name
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.sig') as tmp_firma:
-        firma.save(tmp_firma.name)
-        firma_path = tmp_firma.name
-    
     try:
-        resultado = firma_service.verificar_archivo_firmado(archivo_path, firma_path)
-        return jsonify(resultado)
-    finally:
-        # Limpiar archivos temporales
-        os.unlink(archivo_path)
-        os.unlink(firma_path)
+        resultado = get_firma_service().verificar_flujo(archivos['file'].stream, archivos['signature'].stream)
+    except ValueError as e:
+        # .sig demasiado grande, sin UTF-8 o sin JSON válido (UnicodeDecodeError
+        # y JSONDecodeError son ValueError)
+        return jsonify({'error': f'Archivo de firma no válido: {e}'}), 400
+    return jsonify(resultado)
 
 
 @firma_bp.route('/descargar/<archivo_id>')
@@ -507,7 +588,7 @@ def ejecutar_firma_autorizada():
     firmante_email = email_autorizado
     
     try:
-        resultado = firma_service.firmar_archivo(
+        resultado = get_firma_service().firmar_archivo(
             archivo_path=archivo_path,
             firmante_id=firmante_id,
             firmante_nombre=firmante_nombre,
@@ -524,7 +605,7 @@ def ejecutar_firma_autorizada():
         session.pop('firma_usuario_email', None)
         
         # Eliminar de pendientes
-        os.remove(archivo_path)
+        get_firma_service().eliminar_pendiente(archivo_path)
         
         # Enviar confirmación al firmante
         email_service.enviar_confirmacion_firma(
@@ -633,17 +714,20 @@ def generar_certificado():
     data = request.json or {}
     common_name = data.get('common_name', 'Firmador Digital')
     organization = data.get('organization', 'Chat Seguro')
+    algoritmo = data.get('algoritmo')  # rsa, ecdsa-p256 o ed25519 (por defecto FIRMA_ALGORITMO)
     
     try:
-        cert_path, key_path = firma_service.generar_certificado_firma(
+        cert_path, key_path = get_firma_service().generar_certificado_firma(
             common_name=common_name,
-            organization=organization
+            organization=organization,
+            algoritmo=algoritmo
         )
         
         return jsonify({
             'exito': True,
             'certificado': cert_path,
-            'clave': key_path
+            'clave': key_path,
+            'algoritmo': get_firma_service().algoritmo
         })
         
     except Exception as e:
@@ -653,9 +737,10 @@ def generar_certificado():
 @firma_bp.route('/certificado/info')
 def info_certificado():
     """Obtiene información del certificado de firma actual."""
-    if firma_service._certificate:
-        cert = firma_service._certificate
+    cert = get_firma_service()._certificate
+    if cert:
         return jsonify({
+            'algoritmo': get_firma_service().algoritmo,
             'emisor': cert.issuer.rfc4514_string(),
             'sujeto': cert.subject.rfc4514_string(),
             'serial': str(cert.serial_number),
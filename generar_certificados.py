@@ -3,7 +3,7 @@
 Script para generar certificados SSL autofirmados para desarrollo.
 
 USO:
-    python generar_certificados.py
+    python generar_certificados.py [--algoritmo rsa|ecdsa-p256|ed25519]
 
 Esto creará:
     - certs/cert.pem  (certificado público)
@@ -13,20 +13,29 @@ Esto creará:
    En producción, usa certificados de una CA real (ej: Let's Encrypt).
 """
 
+import argparse
 import os
 import datetime
 import ipaddress
 from cryptography import x509
 from cryptography.x509.oid import NameOID
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 
+from firma_digital.firma_service import ALGORITMOS_FIRMA, generar_clave_privada, hash_para_certificado
+
+# Descripción de cada tipo de clave para los mensajes
+DESCRIPCIONES = {
+    "rsa": "RSA (4096 bits)",
+    "ecdsa-p256": "ECDSA (P-256)",
+    "ed25519": "Ed25519",
+}
+
 
 def generar_certificados(
     directorio: str = "certs",
     dias_validez: int = 365,
-    common_name: str = "localhost"
+    common_name: str = "localhost",
+    algoritmo: str = "rsa"
 ):
     """
     Genera un par de certificados SSL autofirmados.
@@ -35,6 +44,7 @@ def generar_certificados(
         directorio: Carpeta donde guardar los certificados
         dias_validez: Días de validez del certificado
         common_name: Nombre común (CN) del certificado
+        algoritmo: Tipo de clave: rsa, ecdsa-p256 o ed25519
     """
     # Crear directorio si no existe
     os.makedirs(directorio, exist_ok=True)
@@ -46,12 +56,9 @@ def generar_certificados(
     print("🔐 Generando certificados SSL autofirmados")
     print("=" * 50)
     
-    # 1. Generar clave privada RSA
-    print("\n[1/3] Generando clave privada RSA (4096 bits)...")
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=4096,
-    )
+    # 1. Generar clave privada
+    print(f"\n[1/3] Generando clave privada {DESCRIPCIONES[algoritmo]}...")
+    private_key = generar_clave_privada(algoritmo)
     
     # 2. Crear certificado autofirmado
     print("[2/3] Creando certificado autofirmado...")
@@ -80,7 +87,7 @@ def generar_certificados(
             ]),
             critical=False,
         )
-        .sign(private_key, hashes.SHA256())
+        .sign(private_key, hash_para_certificado(private_key))
     )
     
     # 3. Guardar archivos
@@ -90,7 +97,7 @@ def generar_certificados(
     with open(key_path, "wb") as f:
         f.write(private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            format=serialization.PrivateFormat.PKCS8,
             encryption_algorithm=serialization.NoEncryption()
         ))
     
@@ -106,6 +113,7 @@ def generar_certificados(
     print(f"   Clave privada: {os.path.abspath(key_path)}")
     print(f"\n📅 Válido por: {dias_validez} días")
     print(f"🏷️  Common Name: {common_name}")
+    print(f"🔑 Clave: {DESCRIPCIONES[algoritmo]}")
     print("\n⚠️  IMPORTANTE:")
     print("   - Estos certificados son SOLO para desarrollo")
     print("   - El navegador mostrará una advertencia de seguridad")
@@ -118,5 +126,12 @@ def generar_certificados(
 
 
 if __name__ == "__main__":
-    generar_certificados()
+    parser = argparse.ArgumentParser(description="Genera certificados SSL autofirmados para desarrollo")
+    parser.add_argument("--algoritmo", choices=list(ALGORITMOS_FIRMA), default="rsa",
+                        help="Tipo de clave (ed25519 no lo aceptan la mayoría de navegadores para TLS)")
+    parser.add_argument("--directorio", default="certs", help="Carpeta de salida")
+    parser.add_argument("--dias", type=int, default=365, help="Días de validez")
+    parser.add_argument("--cn", default="localhost", help="Common Name")
+    args = parser.parse_args()
+    generar_certificados(args.directorio, args.dias, args.cn, args.algoritmo)
 
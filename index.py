@@ -1,6 +1,11 @@
 # index.py
+from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, jsonify, url_for, session, redirect
-from db_manager import db_manager
+from bson import ObjectId
+from db_manager import db_manager, parse_fecha, BusquedaNoDisponible
+from contrasenas import ServicioSaturado
+from cache_respuestas import respuesta_cacheable
+from tickets_ws import tickets_ws
 from config import oauth
 
 rutas = Blueprint("rutas", __name__)
@@ -8,6 +13,16 @@ rutas = Blueprint("rutas", __name__)
 def get_google():
     return oauth.create_client("google")
 
+def _servicio_saturado():
+    """503 cuando el pool de bcrypt no tiene hueco (ver contrasenas.py)."""
+    return jsonify({"error": "Servidor ocupado, inténtalo de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
+
+def _parametros_paginacion(por_defecto: int = 20, maximo: int = 100):
+    """Lee ?pagina=&por_pagina= de la query. Lanza ValueError si no son enteros."""
+    pagina = max(1, int(request.args.get("pagina", 1)))
+    por_pagina = min(maximo, max(1, int(request.args.get("por_pagina", por_defecto))))
+    return pagina, por_pagina
+
 @rutas.get("/login")
 def login_page():
     # Capturar URL de redirección y mensaje
@@ -37,11 +52,15 @@ def register():
     if not email or not password or not nombre or not apellido:
         return jsonify({"error": "Faltan campos"}), 400
 
-    user_id = db_manager.crear_usuario_classico(nombre, apellido, email, password, ip)
+    try:
+        user_id = db_manager.crear_usuario_classico(nombre, apellido, email, password, ip)
+    except ServicioSaturado:
+        return _servicio_saturado()
     if not user_id:
         return jsonify({"error": "Email ya registrado"}), 409
 
-    # Guardar sesion del usuario registrado
+    # Guardar sesion del usuario registrado (identificador nuevo: fijación de sesión)
+    session.rotar()
     session['user'] = {
         '_id': user_id,
         'google_id': None,
@@ -55,23 +74,21 @@ def register():
 @rutas.route('/auth')
 def auth():
     google = get_google()
+    # authlib verifica el id_token (JWKS cacheadas, iss, aud, exp, nonce) y
+    # deja sus claims en token["userinfo"]: no hace falta llamar a userinfo
     token = google.authorize_access_token()
-    # token es un diccionario con access_token, id_token, etc.
-    resp = google.get('userinfo', token=token)
+    user_info = token.get("userinfo") or google.userinfo(token=token)
     ip = request.remote_addr
-    user_info = resp.json()
     # Guardamos info esencial en sesión
-    user = db_manager.crear_o_actualizar_usuario_google(user_info["given_name"],user_info["family_name"], user_info["id"], user_info["email"], user_info["picture"], ip)
+    user = db_manager.crear_o_actualizar_usuario_google(user_info.get("given_name", ""), user_info.get("family_name", ""), user_info["sub"], user_info["email"], user_info.get("picture"), ip)
+    session.rotar()
     session['user'] = {
     '_id': user,
-    'google_id': user_info.get('id'),
+    'google_id': user_info["sub"],
     'email': user_info.get('email'),
     'name': user_info.get('name'),
     'picture': user_info.get('picture')
     }
-    # Guardar token si quieres mostrarlo (solo para pruebas locales)
-    session['token'] = token
-    
     # Redirigir a URL guardada o al chat
     next_url = session.pop('login_next', None)
     if next_url:
@@ -89,12 +106,16 @@ def login():
     if not email or not password:
         return jsonify({"error": "Faltan campos"}), 400
 
-    user_id = db_manager.login_usuario_classico(email, password, ip)
+    try:
+        user_id = db_manager.login_usuario_classico(email, password, ip)
+    except ServicioSaturado:
+        return _servicio_saturado()
     if not user_id:
         return jsonify({"error": "Email o contraseña incorrectos"}), 401
 
     # Obtener datos del usuario para la sesion
     usuario = db_manager.obtener_estadisticas_usuario(user_id)
+    session.rotar()
     if usuario:
         session['user'] = {
             '_id': user_id,
@@ -107,6 +128,7 @@ def login():
     return jsonify({"user_id": user_id})
 
 @rutas.get("/session_user")
+@respuesta_cacheable()
 def session_user():
     if "user" not in session:
         return jsonify({"logged": False})
@@ -122,6 +144,16 @@ def session_user():
         }
     })
 
+@rutas.post("/ws/ticket")
+def ws_ticket():
+    """Ticket firmado de un solo uso para identificarse en el servidor WebSocket."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+
+    user = session["user"]
+    ticket = tickets_ws.emitir(user["_id"], user["name"], user.get("google_id"))
+    return jsonify({"ticket": ticket, "expira_en": tickets_ws.ttl_s}), 200, {"Cache-Control": "no-store"}
+
 @rutas.get("/chat")
 def chat_page():
     return render_template("chat.html")
@@ -135,28 +167,176 @@ def access_denied_page():
     return  render_template("denied.html")
 
 @rutas.get("/perfil/<usuario_id>")
+@respuesta_cacheable(lambda usuario_id: [(db_manager, f"usuario:{usuario_id}")])
 def perfil(usuario_id):
-    usuario = db_manager.obtener_estadisticas_usuario(usuario_id)
+    usuario = db_manager.obtener_perfil(usuario_id)
     if not usuario:
         return jsonify({"error": "Usuario no encontrado"}), 404
     return jsonify(usuario)
 
+@rutas.get("/estadisticas")
+def estadisticas_generales():
+    """Totales precalculados (ver estadisticas.py); incluye `actualizado` y `antiguedad_s`."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    stats = db_manager.obtener_estadisticas_generales()
+    if not stats:
+        return jsonify({"error": "Estadísticas no disponibles"}), 503
+    return jsonify(stats)
+
 @rutas.get("/canales")
+@respuesta_cacheable(lambda: [(db_manager, "canales")])
 def obtener_canales():
-    lista = db_manager.obtener_canales_db()
-    return lista
+    """Canales paginados: ?q=<prefijo de nombre>&pagina=&por_pagina= (ETag / 304)."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    try:
+        pagina, por_pagina = _parametros_paginacion()
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación inválidos"}), 400
+    q = request.args.get("q", "").strip() or None
+    return jsonify(db_manager.listar_canales(q=q, pagina=pagina, por_pagina=por_pagina))
 
 @rutas.get("/canales/<usuario_id>")
+@respuesta_cacheable(lambda usuario_id: [(db_manager, "canales")])
 def obtener_canales_filtrados(usuario_id):
-    lista = db_manager.obtener_canales_donde_estoy(usuario_id)
-    return lista
+    """Canales del usuario, paginados: ?q=&pagina=&por_pagina= (ETag / 304)."""
+    if not ObjectId.is_valid(usuario_id):
+        return jsonify({"error": "Id inválido"}), 400
+    try:
+        pagina, por_pagina = _parametros_paginacion()
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación inválidos"}), 400
+    q = request.args.get("q", "").strip() or None
+    return jsonify(db_manager.listar_canales(usuario_id, q=q, pagina=pagina, por_pagina=por_pagina))
 
 @rutas.get("/canales/<canal_id>/mensajes")
 def obtener_mensajes_por_canal(canal_id):
-    lista = db_manager.obtener_historial(canal_id)
+    """Historial paginado hacia atrás: ?antes=<timestamp ISO>&limite=50 (lee del archivo si hace falta)."""
+    try:
+        antes = parse_fecha(request.args.get("antes"))
+        limite = min(200, max(1, int(request.args.get("limite", 50))))
+    except ValueError:
+        return jsonify({"error": "Parámetros antes/limite inválidos"}), 400
+    lista = db_manager.obtener_historial(canal_id, limite=limite, antes=antes)
     return lista
 
+@rutas.get("/canales/<canal_id>/actividad")
+def actividad_canal(canal_id):
+    """Mensajes por hora o por día del canal: ?granularidad=hora|dia&desde=&hasta= (ISO 8601)."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    granularidad = request.args.get("granularidad", "hora")
+    if granularidad not in ("hora", "dia") or not ObjectId.is_valid(canal_id):
+        return jsonify({"error": "Canal o granularidad inválidos"}), 400
+    try:
+        hasta = parse_fecha(request.args.get("hasta"))
+        desde = parse_fecha(request.args.get("desde")) or (
+            (hasta or datetime.utcnow()) - timedelta(days=1 if granularidad == "hora" else 30)
+        )
+    except ValueError:
+        return jsonify({"error": "Parámetros de fecha inválidos"}), 400
+    # Los canales privados solo los ven sus miembros (404: no revelar que existen)
+    if not db_manager.puede_ver_canal(canal_id, session["user"]["_id"]):
+        return jsonify({"error": "Canal no encontrado"}), 404
+    serie = db_manager.obtener_actividad_canal(canal_id, granularidad, desde, hasta)
+    return jsonify({"canal_id": canal_id, "granularidad": granularidad, "serie": serie})
+
+@rutas.get("/estadisticas/usuarios-activos")
+def usuarios_mas_activos():
+    """Top-N de usuarios por mensajes enviados: ?desde=&hasta=&limite=10 (por defecto, últimos 7 días)."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    try:
+        hasta = parse_fecha(request.args.get("hasta"))
+        desde = parse_fecha(request.args.get("desde")) or (hasta or datetime.utcnow()) - timedelta(days=7)
+        limite = min(100, max(1, int(request.args.get("limite", 10))))
+    except ValueError:
+        return jsonify({"error": "Parámetros desde/hasta/limite inválidos"}), 400
+    return jsonify(db_manager.obtener_top_usuarios(desde, hasta, limite))
+
 @rutas.get("/usuarios")
+@respuesta_cacheable(lambda: [(db_manager, "usuarios")])
 def obtener_usuarios():
-    lista = db_manager.obtener_usuarios()
-    return jsonify(lista)
\ No newline at end of file
+    """Directorio paginado: ?q=<prefijo de nombre o email>&pagina=&por_pagina= (ETag / 304)."""
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    try:
+        pagina, por_pagina = _parametros_paginacion()
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación inválidos"}), 400
+    q = request.args.get("q", "").strip() or None
+    return jsonify(db_manager.listar_usuarios(q=q, pagina=pagina, por_pagina=por_pagina))
+
+@rutas.get("/buscar")
+def buscar_mensajes():
+    """
+    Búsqueda de texto en los canales del usuario de la sesión.
+    Query: q, canal_id, autor_id, desde, hasta (ISO 8601), orden (relevancia|fecha),
+    pagina, por_pagina.
+    """
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Falta el parámetro q"}), 400
+
+    canal_id = request.args.get("canal_id")
+    autor_id = request.args.get("autor_id")
+    for valor in (canal_id, autor_id):
+        if valor and not ObjectId.is_valid(valor):
+            return jsonify({"error": f"Id inválido: {valor}"}), 400
+
+    try:
+        pagina, por_pagina = _parametros_paginacion()
+        desde = parse_fecha(request.args.get("desde"))
+        hasta = parse_fecha(request.args.get("hasta"))
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación o fecha inválidos"}), 400
+
+    try:
+        resultado = db_manager.buscar_mensajes(
+            session["user"]["_id"], q,
+            canal_id=canal_id, autor_id=autor_id,
+            desde=desde, hasta=hasta,
+            orden=request.args.get("orden", "relevancia"),
+            pagina=pagina, por_pagina=por_pagina
+        )
+    except BusquedaNoDisponible as e:
+        return jsonify({"error": str(e)}), 501
+    return jsonify(resultado)
+
+MAX_HASHES_VERIFICACION = 10000
+
+@rutas.post("/auditoria/verificar")
+def verificar_auditoria():
+    """
+    Verifica en bloque hashes SHA-256 del log de auditoría.
+    Body JSON: {"hashes": ["...", ...]} (máx. 10000)
+    Respuesta: resumen por estado y los hashes en "faltantes",
+    "discrepancias" y "errores" (consulta fallida).
+    """
+    if "user" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+
+    from verificador_auditoria import verificar_hashes, HASH_VALIDO
+
+    hashes = (request.json or {}).get("hashes") or []
+    if not isinstance(hashes, list) or len(hashes) > MAX_HASHES_VERIFICACION:
+        return jsonify({"error": f"Se requiere una lista de hasta {MAX_HASHES_VERIFICACION} hashes"}), 400
+
+    entradas = [{"hash": str(h).lower()} for h in hashes if HASH_VALIDO.match(str(h).lower())]
+    # Hashes que no coinciden, agrupados por estado
+    por_estado = {"faltante": [], "discrepancia": [], "error": []}
+    resumen = verificar_hashes(
+        db_manager, entradas,
+        reportar=lambda estado, entrada, detalle: por_estado[estado].append(entrada["hash"])
+    )
+    resumen["invalidos"] = len(hashes) - len(entradas)
+    return jsonify({
+        "resumen": resumen,
+        "faltantes": por_estado["faltante"],
+        "discrepancias": por_estado["discrepancia"],
+        "errores": por_estado["error"]
+    })
@@ -1,7 +1,10 @@
 import json
+import time
 from datetime import datetime
-from db_manager import db_manager
+from db_manager import db_manager, parse_fecha, BusquedaNoDisponible
+from metricas import metricas
 from bson import ObjectId
+from tickets_ws import tickets_ws, TicketInvalido
 from security import escribir_log_auditoria, calcular_hash_sha256, crear_hmac, descifrar_aes_cbc
 
 # -------------------------
@@ -26,7 +29,7 @@ async def broadcast(canal_id, mensaje):
 # ============================================================
 # PROCESADOR DE COMANDOS
 # ============================================================
-async def procesar_comando(websocket, usuario_id, mensaje):
+async def procesar_comando(websocket, usuario_id, usuario_nombre, mensaje):
     partes = mensaje.split(" ", 1)
     comando = partes[0].lower()
 
@@ -141,6 +144,61 @@ async def procesar_comando(websocket, usuario_id, mensaje):
         await websocket.send(json.dumps({"tipo": "comando","comando": "/salir","resultado": "Regresaste al canal general."}))
         return True
 
+    # -----------------------------
+    # Buscar en el historial
+    # -----------------------------
+    if comando == "/buscar":
+        uso = "Uso: /buscar texto [canal:nombre] [autor:correo] [desde:AAAA-MM-DD] [hasta:AAAA-MM-DD]"
+        if len(partes) < 2:
+            await websocket.send(json.dumps({"tipo": "error", "mensaje": uso}))
+            return True
+
+        filtros = {}
+        palabras = []
+        for token in partes[1].split():
+            clave, _, valor = token.partition(":")
+            if valor and clave in ("canal", "autor", "desde", "hasta"):
+                filtros[clave] = valor
+            else:
+                palabras.append(token)
+
+        try:
+            desde = parse_fecha(filtros.get("desde"))
+            hasta = parse_fecha(filtros.get("hasta"))
+        except ValueError:
+            await websocket.send(json.dumps({"tipo": "error", "mensaje": uso}))
+            return True
+
+        canal_id = autor_id = None
+        if "canal" in filtros:
+            canal_doc = db_manager.obtener_canal_doc_por_nombre(filtros["canal"])
+            if not canal_doc:
+                await websocket.send(json.dumps({"tipo": "error", "mensaje": "❌ No existe ese canal"}))
+                return True
+            canal_id = canal_doc["_id"]
+        if "autor" in filtros:
+            autor = db_manager.obtener_usuario_por_email(filtros["autor"])
+            if not autor:
+                await websocket.send(json.dumps({"tipo": "error", "mensaje": "❌ No existe ese usuario"}))
+                return True
+            autor_id = autor["_id"]
+
+        texto = " ".join(palabras)
+        try:
+            resultado = db_manager.buscar_mensajes(
+                usuario_id, texto, canal_id=canal_id, autor_id=autor_id, desde=desde, hasta=hasta
+            )
+        except BusquedaNoDisponible as e:
+            await websocket.send(json.dumps({"tipo": "error", "mensaje": f"❌ {e}"}))
+            return True
+        await websocket.send(json.dumps({
+            "tipo": "busqueda",
+            "comando": "/buscar",
+            "consulta": texto,
+            **resultado
+        }))
+        return True
+
     # -----------------------------
     # Agregar usuario a canal (solo admin)
     # -----------------------------
@@ -155,33 +213,28 @@ async def procesar_comando(websocket, usuario_id, mensaje):
             await websocket.send(json.dumps({"tipo": "error","mensaje": f"Uso: {comando} correo canal"}))
             return True
 
-        canal_doc = db_manager.obtener_canal_doc_por_nombre(nombre_canal)
-        if not canal_doc:
+        # Comprobación de admin y cambio en la misma operación (ver comando_admin_canal)
+        resultado = db_manager.comando_admin_canal(comando, nombre_canal, usuario_id, email)
+        if resultado == "sin_canal":
             await websocket.send(json.dumps({"tipo": "error", "mensaje": "❌ Canal no existe"}))
             return True
-
-        canal_id = str(canal_doc["_id"])
-        if usuario_id not in canal_doc["admins"]:
+        if resultado == "no_admin":
             await websocket.send(json.dumps({"tipo": "error", "mensaje": "❌ Solo admins pueden usar este comando"}))
             return True
 
-        # Ejecutar la acción según el comando
+        exito = resultado == "ok"
         if comando == "/agregar":
-            exito = db_manager.agregar_usuario_a_canal(canal_id, email)
             mensaje_resultado = "✅ Usuario agregado" if exito else "❌ No se pudo agregar"
         elif comando == "/remover":
-            exito = db_manager.remover_usuario_de_canal(canal_id, email)
             mensaje_resultado = "✅ Usuario removido" if exito else "❌ No se pudo remover"
         elif comando == "/dar_admin":
-            exito = db_manager.agregar_admin(canal_id, email)
             mensaje_resultado = "✅ Admin agregado" if exito else "❌ No se pudo agregar"
         elif comando == "/quitar_admin":
-            exito = db_manager.remover_admin(canal_id, email)
             mensaje_resultado = "✅ Admin removido" if exito else "❌ No se pudo remover"
 
         # Registrar en log cada acción administrativa
         accion = f"{comando} {email} en canal {nombre_canal}"
-        escribir_log_auditoria(usuario["nombre"], accion, calcular_hash_sha256(accion))
+        escribir_log_auditoria(usuario_nombre, accion, calcular_hash_sha256(accion))
 
         await websocket.send(json.dumps({"tipo": "comando","comando": comando,"resultado": mensaje_resultado}))
         return True
@@ -192,41 +245,38 @@ async def procesar_comando(websocket, usuario_id, mensaje):
 # MANEJADOR PRINCIPAL DEL CLIENTE
 # ============================================================
 async def manejar_cliente(websocket):
+    usuario_id = None
+    usuario = None
     try:
         # ================================
-        # 1. PRIMER MENSAJE → identificación
+        # 1. PRIMER MENSAJE → ticket firmado (POST /ws/ticket)
         # ================================
         raw = await websocket.recv()
         data = json.loads(raw)
-        
-        usuario_id = data.get("usuario_id")
-        google_id = data.get("google_id")  # puede ser None
-
-        if not usuario_id:
-            await websocket.send(json.dumps({
-                "tipo": "error",
-                "mensaje": "Falta usuario_id"
-            }))
-            return
 
         # ================================
-        # 2. VALIDACIÓN EN MONGO
+        # 2. VERIFICACIÓN DEL TICKET (solo CPU, sin consultar Mongo)
         # ================================
-        usuario = db_manager.validar_usuario_ws(usuario_id, google_id)
-        if not usuario:
+        try:
+            ticket = tickets_ws.verificar(data.get("ticket"))
+        except TicketInvalido as e:
             await websocket.send(json.dumps({
                 "tipo": "error",
-                "mensaje": "Usuario no existe o google_id incorrecto"
+                "mensaje": f"No autorizado: {e}"
             }))
             await websocket.close()
             return
 
+        usuario_id = ticket["uid"]
+        usuario = {"_id": usuario_id, "nombre": ticket["nom"]}
+
         # ================================
         # 3. REGISTRO WS
         # ================================
         clientes[websocket] = usuario_id
         usuario_canal[websocket] = canal_general_id
         db_manager.cambiar_estado_usuario(usuario_id, True)
+        db_manager.registrar_sesion(usuario_id, "inicio")
 
         # ENVIAR BIENVENIDA
         await websocket.send(json.dumps({
@@ -264,17 +314,18 @@ async def manejar_cliente(websocket):
 
             # COMANDOS
             if tipo == "comando":
-                if await procesar_comando(websocket, usuario_id, contenido):
+                if await procesar_comando(websocket, usuario_id, usuario["nombre"], contenido):
                     continue
 
             # MENSAJES NORMALES
+            inicio = time.perf_counter()
             canal_id = usuario_canal.get(websocket, canal_general_id)
             
             # 1. Calcular hash SHA-256 para auditoría
             hash_sha256 = calcular_hash_sha256(contenido)
 
             # 2. Guardar mensaje en DB
-            db_manager.guardar_mensaje(usuario_id, canal_id, contenido, hash_sha256)
+            db_manager.guardar_mensaje(usuario_id, canal_id, contenido, hash_sha256, usuario["nombre"])
 
             # 3. Escribir log de auditoría
             escribir_log_auditoria(usuario["nombre"], contenido, hash_sha256)
@@ -296,9 +347,11 @@ async def manejar_cliente(websocket):
                      "lista":canales
                 })
             )
+            metricas.incrementar("ws.mensajes")
+            metricas.observar("ws.mensaje", time.perf_counter() - inicio)
 
     except Exception as e:
-        print(f"Cliente desconectado ({usuario['nombre']}): {e}")
+        print(f"Cliente desconectado ({(usuario or {}).get('nombre')}): {e}")
 
     finally:
         # ================================
@@ -306,15 +359,18 @@ async def manejar_cliente(websocket):
         # ================================
         if websocket in clientes:
             del clientes[websocket]
+            db_manager.registrar_sesion(usuario_id, "fin")
         if websocket in usuario_canal:
             del usuario_canal[websocket]
 
-        db_manager.cambiar_estado_usuario(usuario_id, False)
+        # Sin ticket válido el cliente nunca llegó a registrarse
+        if usuario is not None:
+            db_manager.cambiar_estado_usuario(usuario_id, False)
 
-        await broadcast(
-            canal_general_id,
-            json.dumps({
-                "tipo": "usuario_desconectado",
-                "usuario": usuario["nombre"]
-            })
-        )
\ No newline at end of file
+            await broadcast(
+                canal_general_id,
+                json.dumps({
+                    "tipo": "usuario_desconectado",
+                    "usuario": usuario["nombre"]
+                })
+            )
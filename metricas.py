@@ -0,0 +1,54 @@
+# metricas.py
+import threading
+import time
+
+
+class Metricas:
+    """
+    Registro de métricas en memoria (thread-safe).
+
+    - Contadores: solo crecen (incrementar)
+    - Valores: último valor observado (fijar)
+    - Tiempos: número, suma y máximo de duraciones (observar)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._valores = {}
+        self._tiempos = {}
+        self._inicio = time.time()
+
+    def incrementar(self, nombre: str, cantidad: int = 1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def fijar(self, nombre: str, valor):
+        with self._lock:
+            self._valores[nombre] = valor
+
+    def observar(self, nombre: str, segundos: float):
+        with self._lock:
+            t = self._tiempos.setdefault(nombre, {"n": 0, "suma_ms": 0.0, "max_ms": 0.0})
+            ms = segundos * 1000
+            t["n"] += 1
+            t["suma_ms"] += ms
+            t["max_ms"] = max(t["max_ms"], ms)
+
+    def snapshot(self) -> dict:
+        """Copia consistente de todas las métricas (serializable a JSON)."""
+        with self._lock:
+            tiempos = {
+                nombre: {**t, "media_ms": t["suma_ms"] / t["n"] if t["n"] else 0.0}
+                for nombre, t in self._tiempos.items()
+            }
+            return {
+                "uptime_s": round(time.time() - self._inicio, 1),
+                "contadores": dict(self._contadores),
+                "valores": dict(self._valores),
+                "tiempos": tiempos
+            }
+
+
+# instancia global
+metricas = Metricas()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Migración de mensajes al esquema de buckets
+===========================================
+Copia `mensajes` (un documento por mensaje) a `mensajes_buckets`
+(un documento por canal y hora, hasta BUCKET_MAX_MENSAJES mensajes).
+
+- Recorre `mensajes` en orden de `_id` con checkpoint en `trabajos`
+- Agrupa cada lote por (canal, hora) y lo anexa con $push/$each en bulk_write
+- Con --borrar elimina de `mensajes` los documentos ya migrados
+- Suma los mensajes copiados al contador `mensajes_buckets` (total de /estadisticas)
+
+Reanudación: antes de escribir un lote se anota en el checkpoint hasta qué
+`_id` llega (`pendiente_hasta`). Si el proceso se corta a medias, al
+reanudar se descartan de ese rango los mensajes que ya estén en algún
+bucket, así que volver a lanzar la migración (las veces que sea) no
+duplica mensajes.
+
+Después de migrar, arrancar con MENSAJES_ALMACENAMIENTO=bucket.
+
+Uso:
+    python migrar_buckets.py [--lote 5000] [--borrar]
+"""
+
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+
+from config import BUCKET_MAX_MENSAJES
+from metricas import metricas
+
+NOMBRE_TRABAJO = "migracion_buckets"
+
+
+def _operaciones_lote(docs: list, max_por_bucket: int) -> list:
+    """Agrupa los mensajes por (canal, hora) en $push de como mucho max_por_bucket."""
+    grupos = {}
+    for d in docs:
+        hora = d["timestamp"].replace(minute=0, second=0, microsecond=0)
+        mensaje = {k: v for k, v in d.items() if k != "canal_id"}
+        grupos.setdefault((d["canal_id"], hora), []).append(mensaje)
+
+    operaciones = []
+    for (canal_id, hora), mensajes in grupos.items():
+        mensajes.sort(key=lambda m: m["timestamp"])
+        for i in range(0, len(mensajes), max_por_bucket):
+            trozo = mensajes[i:i + max_por_bucket]
+            operaciones.append(UpdateOne(
+                # Solo un bucket con hueco para todo el trozo; si no, se crea otro
+                {"canal_id": canal_id, "hora": hora, "n": {"$lte": max_por_bucket - len(trozo)}},
+                {
+                    "$push": {"mensajes": {"$each": trozo}},
+                    "$inc": {"n": len(trozo)},
+                    "$min": {"desde": trozo[0]["timestamp"]},
+                    "$max": {"hasta": trozo[-1]["timestamp"]}
+                },
+                upsert=True
+            ))
+    return operaciones
+
+
+def _ids_en_buckets(db, ids: list) -> set:
+    """Ids de `ids` que ya están dentro de algún bucket."""
+    buscados = set(ids)
+    presentes = set()
+    for bucket in db.mensajes_buckets.find({"mensajes._id": {"$in": ids}}, {"mensajes._id": 1}):
+        presentes.update(m["_id"] for m in bucket.get("mensajes", []) if m["_id"] in buscados)
+    return presentes
+
+
+def migrar(db_manager, tam_lote: int = 5000, borrar: bool = False,
+           max_por_bucket: int = BUCKET_MAX_MENSAJES) -> dict:
+    """Migra todos los mensajes pendientes. Devuelve el estado del trabajo."""
+    db = db_manager.db
+    estado = db.trabajos.find_one({"_id": NOMBRE_TRABAJO}) or {
+        "_id": NOMBRE_TRABAJO, "ultimo_id": None, "migrados": 0, "inicio": datetime.utcnow()
+    }
+    # Lote que una ejecución anterior pudo dejar escrito a medias
+    pendiente_hasta = estado.get("pendiente_hasta")
+
+    while True:
+        filtro = {"_id": {"$gt": estado["ultimo_id"]}} if estado["ultimo_id"] else {}
+        docs = list(db.mensajes.find(filtro).sort("_id", ASCENDING).limit(tam_lote))
+        if not docs:
+            break
+
+        nuevos = docs
+        if pendiente_hasta and docs[0]["_id"] <= pendiente_hasta:
+            ya_migrados = _ids_en_buckets(db, [d["_id"] for d in docs if d["_id"] <= pendiente_hasta])
+            nuevos = [d for d in docs if d["_id"] not in ya_migrados]
+
+        # Anotar el lote antes de escribirlo (ver "Reanudación")
+        estado["pendiente_hasta"] = docs[-1]["_id"]
+        db.trabajos.replace_one({"_id": NOMBRE_TRABAJO}, estado, upsert=True)
+        if nuevos:
+            db.mensajes_buckets.bulk_write(_operaciones_lote(nuevos, max_por_bucket), ordered=False)
+            db_manager._incrementar_contador("mensajes_buckets", len(nuevos))
+        if borrar:
+            db.mensajes.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+
+        estado["ultimo_id"] = docs[-1]["_id"]
+        estado["pendiente_hasta"] = None
+        estado["migrados"] += len(docs)
+        estado["actualizado"] = datetime.utcnow()
+        db.trabajos.replace_one({"_id": NOMBRE_TRABAJO}, estado, upsert=True)
+        metricas.fijar("migracion_buckets.migrados", estado["migrados"])
+        print(f"\r[MIGRACION] {estado['migrados']:,} mensajes migrados", end="", flush=True)
+
+    print(f"\n[MIGRACION] Completada: {estado['migrados']:,} mensajes en "
+          f"{db.mensajes_buckets.estimated_document_count():,} buckets")
+    return estado
+
+
+if __name__ == "__main__":
+    import argparse
+    from db_manager import db_manager
+
+    parser = argparse.ArgumentParser(description="Migra mensajes al esquema de buckets")
+    parser.add_argument("--lote", type=int, default=5000, help="Mensajes leídos por lote")
+    parser.add_argument("--borrar", action="store_true", help="Borrar de `mensajes` lo ya migrado")
+    args = parser.parse_args()
+
+    if db_manager.conectar():
+        try:
+            migrar(db_manager, tam_lote=args.lote, borrar=args.borrar)
+        finally:
+            db_manager.cerrar()
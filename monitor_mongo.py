@@ -0,0 +1,106 @@
+# monitor_mongo.py
+"""
+Monitorización del cliente MongoDB
+==================================
+Listeners de pymongo que DatabaseManager registra en su MongoClient:
+
+- MetricasPool: checkouts, espera por conexión, conexiones en uso/abiertas
+  y agotamiento del pool (timeouts de la cola de espera) en `metricas`
+- EstadoTopologia: circuito abierto mientras no haya ningún servidor
+  alcanzable. DatabaseManager.conectado devuelve False durante ese tiempo,
+  así las operaciones fallan al momento en vez de esperar
+  serverSelectionTimeoutMS cada una; el monitor de pymongo sigue
+  comprobando en segundo plano y el circuito se cierra solo
+"""
+
+import threading
+import time
+
+from pymongo import monitoring
+from pymongo.monitoring import ConnectionCheckOutFailedReason
+
+from metricas import metricas
+
+
+class MetricasPool(monitoring.ConnectionPoolListener):
+    """Métricas `mongo.pool.*` a partir de los eventos del pool de conexiones."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._en_uso = 0
+        self._abiertas = 0
+
+    def _ajustar(self, en_uso: int = 0, abiertas: int = 0):
+        with self._lock:
+            self._en_uso += en_uso
+            self._abiertas += abiertas
+            metricas.fijar("mongo.pool.en_uso", self._en_uso)
+            metricas.fijar("mongo.pool.abiertas", self._abiertas)
+
+    # El checkout es síncrono en el hilo que pide la conexión
+    def connection_check_out_started(self, event):
+        self._local.inicio = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        inicio = getattr(self._local, "inicio", None)
+        if inicio is not None:
+            metricas.observar("mongo.pool.espera", time.perf_counter() - inicio)
+        metricas.incrementar("mongo.pool.checkouts")
+        self._ajustar(en_uso=1)
+
+    def connection_check_out_failed(self, event):
+        if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+            metricas.incrementar("mongo.pool.agotado")
+        else:
+            metricas.incrementar("mongo.pool.checkout_fallidos")
+
+    def connection_checked_in(self, event):
+        self._ajustar(en_uso=-1)
+
+    def connection_created(self, event):
+        self._ajustar(abiertas=1)
+
+    def connection_closed(self, event):
+        self._ajustar(abiertas=-1)
+
+    def pool_cleared(self, event):
+        metricas.incrementar("mongo.pool.limpiezas")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+class EstadoTopologia(monitoring.TopologyListener):
+    """Circuito según la topología: abierto si no hay ningún servidor alcanzable."""
+
+    def __init__(self):
+        # Optimista hasta el primer latido: conectar() hace su propio ping
+        self.disponible = True
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        disponible = any(s.is_server_type_known
+                         for s in event.new_description.server_descriptions().values())
+        if disponible != self.disponible:
+            if disponible:
+                print("[DB] MongoDB disponible de nuevo: circuito cerrado")
+            else:
+                print("[DB ERROR] Ningún servidor MongoDB alcanzable: circuito abierto")
+                metricas.incrementar("mongo.circuito.aperturas")
+        self.disponible = disponible
+        metricas.fijar("mongo.disponible", disponible)
+
+    def closed(self, event):
+        pass
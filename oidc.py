@@ -0,0 +1,114 @@
+# oidc.py
+"""
+Login con Google (OpenID Connect) con metadatos cacheados
+=========================================================
+Cliente de authlib para `oauth.register(..., client_cls=AppOIDC)`:
+
+- El documento de descubrimiento (OIDC_GOOGLE_METADATA_URL) y las claves
+  JWKS se guardan en OIDC_CACHE_ARCHIVO: tras un reinicio no se vuelven a
+  pedir mientras no caduquen (OIDC_METADATA_TTL_S / OIDC_JWKS_TTL_S)
+- authlib verifica el id_token (firma con esas JWKS, iss, aud, exp y
+  nonce) y deja sus claims en token["userinfo"], así /auth no llama al
+  endpoint userinfo: cada login es un único intercambio del código
+- Un `kid` desconocido (Google rotó sus claves) fuerza una recarga de
+  las JWKS, como mucho una cada OIDC_JWKS_REFRESCO_MIN_S
+"""
+
+import json
+import os
+import threading
+import time
+
+from authlib.integrations.flask_client import FlaskOAuth2App
+
+from config import OIDC_CACHE_ARCHIVO, OIDC_METADATA_TTL_S, OIDC_JWKS_TTL_S, OIDC_JWKS_REFRESCO_MIN_S
+from metricas import metricas
+
+
+def _leer_cache() -> dict:
+    try:
+        with open(OIDC_CACHE_ARCHIVO, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_cache(url: str, datos: dict):
+    """Escritura atómica (varios workers pueden compartir el archivo)."""
+    cache = _leer_cache()
+    cache[url] = {"guardado": time.time(), "datos": datos}
+    temporal = f"{OIDC_CACHE_ARCHIVO}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(temporal, OIDC_CACHE_ARCHIVO)
+    except OSError as e:
+        print(f"[OIDC] No se pudo guardar la caché: {e}")
+
+
+def _desde_disco(url: str, ttl_s: float) -> tuple:
+    """(datos, guardado) si la entrada del archivo no ha caducado; si no (None, 0)."""
+    entrada = _leer_cache().get(url)
+    if entrada and time.time() - entrada["guardado"] < ttl_s:
+        return entrada["datos"], entrada["guardado"]
+    return None, 0.0
+
+
+class AppOIDC(FlaskOAuth2App):
+    """FlaskOAuth2App con descubrimiento y JWKS cacheados en memoria y en disco."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._metadatos_en = 0.0
+        self._jwks = None
+        self._jwks_en = 0.0
+
+    def load_server_metadata(self):
+        if not self._server_metadata_url:
+            return self.server_metadata
+        if time.time() - self._metadatos_en < OIDC_METADATA_TTL_S:
+            return self.server_metadata
+
+        with self._lock:
+            if time.time() - self._metadatos_en >= OIDC_METADATA_TTL_S:
+                metadatos, guardado = _desde_disco(self._server_metadata_url, OIDC_METADATA_TTL_S)
+                if metadatos is None:
+                    with self._get_session() as sesion:
+                        resp = sesion.request("GET", self._server_metadata_url, withhold_token=True)
+                        resp.raise_for_status()
+                        metadatos = resp.json()
+                    guardado = time.time()
+                    _guardar_cache(self._server_metadata_url, metadatos)
+                    metricas.incrementar("oidc.metadatos.red")
+                else:
+                    metricas.incrementar("oidc.metadatos.disco")
+                self.server_metadata.update(metadatos)
+                self.server_metadata["_loaded_at"] = guardado
+                self._metadatos_en = guardado
+        return self.server_metadata
+
+    def fetch_jwk_set(self, force=False):
+        uri = self.load_server_metadata().get("jwks_uri")
+        if not uri:
+            raise RuntimeError('Missing "jwks_uri" in metadata')
+
+        with self._lock:
+            edad = time.time() - self._jwks_en
+            if self._jwks is not None and (edad < OIDC_JWKS_REFRESCO_MIN_S or (not force and edad < OIDC_JWKS_TTL_S)):
+                return self._jwks
+
+            jwks, guardado = (None, 0.0) if force else _desde_disco(uri, OIDC_JWKS_TTL_S)
+            if jwks is None:
+                with self._get_session() as sesion:
+                    resp = sesion.request("GET", uri, withhold_token=True)
+                    resp.raise_for_status()
+                    jwks = resp.json()
+                guardado = time.time()
+                _guardar_cache(uri, jwks)
+                metricas.incrementar("oidc.jwks.red")
+            else:
+                metricas.incrementar("oidc.jwks.disco")
+            self._jwks = jwks
+            self._jwks_en = guardado
+            return jwks
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Re-cifrado de mensajes en segundo plano
+=======================================
+Recorre la colección `mensajes` en orden de `_id` y re-cifra con la clave
+AES activa los mensajes GCM que usan una clave anterior.
+
+- Checkpoints reanudables en la colección `trabajos`
+- Escrituras en lote con bulk_write
+- Límite de documentos por segundo para no afectar la latencia del chat
+- Progreso publicado en `metricas`
+
+Uso:
+    python recifrado.py [--lote 500] [--tasa 2000]
+"""
+
+import threading
+import time
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+
+from config import RECIFRADO_TAM_LOTE, RECIFRADO_DOCS_POR_SEGUNDO
+from metricas import metricas
+from security import motor_cifrado
+
+
+class TrabajoRecifrado:
+    """Job reanudable de rotación de clave sobre `mensajes`."""
+
+    NOMBRE = "recifrado_mensajes"
+
+    def __init__(self, db_manager, motor=motor_cifrado,
+                 tam_lote: int = RECIFRADO_TAM_LOTE,
+                 docs_por_segundo: int = RECIFRADO_DOCS_POR_SEGUNDO):
+        self.db_manager = db_manager
+        self.motor = motor
+        self.tam_lote = tam_lote
+        self.docs_por_segundo = docs_por_segundo
+        self._detener = threading.Event()
+        self._hilo = None
+
+    # -------------------------------
+    # CHECKPOINT
+    # -------------------------------
+    def _leer_checkpoint(self) -> dict:
+        estado = self.db_manager.db.trabajos.find_one({"_id": self.NOMBRE})
+        # Si cambió la clave activa, la pasada anterior ya no sirve
+        if not estado or estado.get("id_clave_destino") != self.motor.id_activa:
+            estado = {
+                "_id": self.NOMBRE,
+                "id_clave_destino": self.motor.id_activa,
+                "ultimo_id": None,
+                "procesados": 0,
+                "recifrados": 0,
+                "omitidos": 0,
+                "completado": False,
+                "inicio": datetime.utcnow()
+            }
+        return estado
+
+    def _guardar_checkpoint(self, estado: dict):
+        estado["actualizado"] = datetime.utcnow()
+        self.db_manager.db.trabajos.replace_one({"_id": self.NOMBRE}, estado, upsert=True)
+
+    def _publicar_metricas(self, estado: dict):
+        metricas.fijar("recifrado.id_clave_destino", estado["id_clave_destino"])
+        metricas.fijar("recifrado.procesados", estado["procesados"])
+        metricas.fijar("recifrado.recifrados", estado["recifrados"])
+        metricas.fijar("recifrado.omitidos", estado["omitidos"])
+        metricas.fijar("recifrado.completado", estado["completado"])
+
+    # -------------------------------
+    # EJECUCIÓN
+    # -------------------------------
+    def procesar_lote(self, estado: dict) -> int:
+        """Procesa el siguiente lote. Devuelve cuántos documentos leyó (0 = fin)."""
+        filtro = {"_id": {"$gt": estado["ultimo_id"]}} if estado["ultimo_id"] else {}
+        docs = list(
+            self.db_manager.db.mensajes
+            .find(filtro, {"mensaje": 1})
+            .sort("_id", ASCENDING)
+            .limit(self.tam_lote)
+        )
+        if not docs:
+            return 0
+
+        nuevos = self.motor.recifrar_lote([d.get("mensaje") or "" for d in docs])
+        operaciones = [
+            # El filtro por el valor anterior evita pisar una edición concurrente
+            UpdateOne({"_id": d["_id"], "mensaje": d["mensaje"]}, {"$set": {"mensaje": nuevo}})
+            for d, nuevo in zip(docs, nuevos) if nuevo is not None
+        ]
+        if operaciones:
+            self.db_manager.db.mensajes.bulk_write(operaciones, ordered=False)
+
+        estado["ultimo_id"] = docs[-1]["_id"]
+        estado["procesados"] += len(docs)
+        estado["recifrados"] += len(operaciones)
+        estado["omitidos"] += len(docs) - len(operaciones)
+        self._guardar_checkpoint(estado)
+        self._publicar_metricas(estado)
+        metricas.incrementar("recifrado.lotes")
+        return len(docs)
+
+    def ejecutar(self) -> dict:
+        """Ejecuta hasta terminar o hasta que se pida detener. Devuelve el estado."""
+        if not self.db_manager.conectado:
+            print("[RECIFRADO] MongoDB no conectado")
+            return {}
+
+        estado = self._leer_checkpoint()
+        if estado.get("completado"):
+            self._publicar_metricas(estado)
+            return estado
+
+        print(f"[RECIFRADO] Re-cifrando hacia clave {estado['id_clave_destino']} "
+              f"(desde {estado['ultimo_id'] or 'el inicio'})")
+
+        while not self._detener.is_set():
+            inicio = time.monotonic()
+            leidos = self.procesar_lote(estado)
+            if leidos == 0:
+                estado["completado"] = True
+                estado["fin"] = datetime.utcnow()
+                self._guardar_checkpoint(estado)
+                self._publicar_metricas(estado)
+                print(f"[RECIFRADO] Completado: {estado['recifrados']} re-cifrados, "
+                      f"{estado['omitidos']} sin cambios")
+                break
+
+            # Limitar la tasa: cada lote debe durar al menos leidos / tasa segundos
+            if self.docs_por_segundo > 0:
+                espera = leidos / self.docs_por_segundo - (time.monotonic() - inicio)
+                if espera > 0:
+                    self._detener.wait(espera)
+
+        return estado
+
+    def iniciar_en_segundo_plano(self) -> threading.Thread:
+        """Lanza el job en un hilo daemon."""
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self.ejecutar, name="recifrado", daemon=True)
+        self._hilo.start()
+        return self._hilo
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=10)
+
+
+if __name__ == "__main__":
+    import argparse
+    from db_manager import db_manager
+
+    parser = argparse.ArgumentParser(description="Re-cifra mensajes con la clave AES activa")
+    parser.add_argument("--lote", type=int, default=RECIFRADO_TAM_LOTE, help="Documentos por lote")
+    parser.add_argument("--tasa", type=int, default=RECIFRADO_DOCS_POR_SEGUNDO,
+                        help="Máximo de documentos por segundo (0 = sin límite)")
+    args = parser.parse_args()
+
+    if db_manager.conectar():
+        trabajo = TrabajoRecifrado(db_manager, tam_lote=args.lote, docs_por_segundo=args.tasa)
+        try:
+            trabajo.ejecutar()
+        except KeyboardInterrupt:
+            print("\n[RECIFRADO] Interrumpido; se reanudará desde el último checkpoint")
+        finally:
+            db_manager.cerrar()
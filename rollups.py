@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Rollups de actividad por canal y por usuario
+============================================
+Agrega los mensajes en la colección `rollups` con $merge:
+
+    canal_hora / usuario_hora   mensajes, bytes (y autores distintos por canal) por hora
+    canal_dia  / usuario_dia    suma de los rollups horarios del día
+
+- Solo procesa horas completas, desde la marca de agua guardada en
+  `trabajos` (una ventana de VENTANA_HORAS cada vez, con checkpoint)
+- Cada rollup tiene un _id determinista {t, k, p} y se reemplaza al
+  recalcular, así reprocesar una ventana es idempotente
+- Los días se recalculan desde los rollups horarios, no desde `mensajes`
+
+Requiere MongoDB 5.0+ ($dateTrunc, $merge). En modo bucket lee
+`mensajes_buckets` con $unwind.
+
+Uso:
+    python rollups.py [--desde-cero]
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import ROLLUPS_INTERVALO_MIN
+from metricas import metricas
+
+NOMBRE_TRABAJO = "rollups_actividad"
+VENTANA_HORAS = 24
+# Margen para que entren los mensajes escritos en el último instante de la hora
+MARGEN = timedelta(minutes=1)
+DIMENSIONES = {"canal": "$canal_id", "usuario": "$usuario_id"}
+
+
+def _inicio_hora(fecha: datetime) -> datetime:
+    return fecha.replace(minute=0, second=0, microsecond=0)
+
+
+def _inicio_dia(fecha: datetime) -> datetime:
+    return fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _fuente(db_manager, desde: datetime, hasta: datetime) -> tuple:
+    """Colección y etapas iniciales que producen mensajes planos de [desde, hasta)."""
+    if db_manager.modo_bucket:
+        return db_manager.db.mensajes_buckets, [
+            {"$match": {"hora": {"$gte": desde, "$lt": hasta}}},
+            {"$unwind": "$mensajes"},
+            {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$mensajes", {"canal_id": "$canal_id"}]}}}
+        ]
+    return db_manager.db.mensajes, [{"$match": {"timestamp": {"$gte": desde, "$lt": hasta}}}]
+
+
+def _merge() -> dict:
+    return {"$merge": {"into": "rollups", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+
+
+def agregar_horas(db_manager, desde: datetime, hasta: datetime):
+    """Recalcula los rollups horarios de [desde, hasta) (límites en horas exactas)."""
+    coleccion, etapas = _fuente(db_manager, desde, hasta)
+    for dimension, campo in DIMENSIONES.items():
+        tipo = f"{dimension}_hora"
+        grupo = {
+            "_id": {"k": campo, "p": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}}},
+            "mensajes": {"$sum": 1},
+            "bytes": {"$sum": {"$ifNull": ["$longitud", 0]}}
+        }
+        if dimension == "canal":
+            grupo["autores"] = {"$addToSet": "$usuario_id"}
+        proyeccion = {
+            "_id": {"t": tipo, "k": "$_id.k", "p": "$_id.p"},
+            "tipo": tipo,
+            "clave": "$_id.k",
+            "periodo": "$_id.p",
+            "mensajes": 1,
+            "bytes": 1,
+            "actualizado": "$$NOW"
+        }
+        if dimension == "canal":
+            proyeccion["autores"] = {"$size": "$autores"}
+        list(coleccion.aggregate(etapas + [{"$group": grupo}, {"$project": proyeccion}, _merge()],
+                                 allowDiskUse=True))
+
+
+def agregar_dias(db_manager, desde: datetime, hasta: datetime):
+    """Recalcula los rollups diarios de los días que tocan [desde, hasta)."""
+    for dimension in DIMENSIONES:
+        tipo = f"{dimension}_dia"
+        list(db_manager.db.rollups.aggregate([
+            {"$match": {"tipo": f"{dimension}_hora", "periodo": {"$gte": _inicio_dia(desde), "$lt": hasta}}},
+            {"$group": {
+                "_id": {"k": "$clave", "p": {"$dateTrunc": {"date": "$periodo", "unit": "day"}}},
+                "mensajes": {"$sum": "$mensajes"},
+                "bytes": {"$sum": "$bytes"}
+            }},
+            {"$project": {
+                "_id": {"t": tipo, "k": "$_id.k", "p": "$_id.p"},
+                "tipo": tipo,
+                "clave": "$_id.k",
+                "periodo": "$_id.p",
+                "mensajes": 1,
+                "bytes": 1,
+                "actualizado": "$$NOW"
+            }},
+            _merge()
+        ], allowDiskUse=True))
+
+
+def _primer_mensaje(db_manager) -> datetime | None:
+    if db_manager.modo_bucket:
+        doc = db_manager.db.mensajes_buckets.find_one({}, {"hora": 1}, sort=[("hora", 1)])
+        return doc["hora"] if doc else None
+    doc = db_manager.db.mensajes.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+    return doc["timestamp"] if doc else None
+
+
+def ejecutar(db_manager, desde_cero: bool = False) -> dict:
+    """Procesa las horas completas pendientes. Devuelve el estado del trabajo."""
+    if not db_manager.conectado:
+        print("[ROLLUPS] MongoDB no conectado")
+        return {}
+
+    trabajos = db_manager.db.trabajos
+    estado = None if desde_cero else trabajos.find_one({"_id": NOMBRE_TRABAJO})
+    if not estado:
+        primero = _primer_mensaje(db_manager)
+        if not primero:
+            return {}
+        estado = {"_id": NOMBRE_TRABAJO, "marca_agua": _inicio_hora(primero), "ventanas": 0}
+
+    fin = _inicio_hora(datetime.utcnow() - MARGEN)
+    inicio = time.monotonic()
+    while estado["marca_agua"] < fin:
+        desde = estado["marca_agua"]
+        hasta = min(fin, desde + timedelta(hours=VENTANA_HORAS))
+        agregar_horas(db_manager, desde, hasta)
+        agregar_dias(db_manager, desde, hasta)
+
+        estado["marca_agua"] = hasta
+        estado["ventanas"] += 1
+        estado["actualizado"] = datetime.utcnow()
+        trabajos.replace_one({"_id": NOMBRE_TRABAJO}, estado, upsert=True)
+        metricas.fijar("rollups.marca_agua", hasta.isoformat())
+
+    metricas.observar("rollups.pasada", time.monotonic() - inicio)
+    return estado
+
+
+def iniciar_rollups_periodicos(db_manager, intervalo_min: float = ROLLUPS_INTERVALO_MIN) -> threading.Thread:
+    """Ejecuta ejecutar() cada `intervalo_min` minutos en un hilo daemon."""
+    def _bucle():
+        while True:
+            try:
+                ejecutar(db_manager)
+            except Exception as e:
+                print(f"[ROLLUPS] Error: {e}")
+            time.sleep(intervalo_min * 60)
+
+    hilo = threading.Thread(target=_bucle, name="rollups", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    import argparse
+    from db_manager import db_manager
+
+    parser = argparse.ArgumentParser(description="Agrega la actividad de mensajes en `rollups`")
+    parser.add_argument("--desde-cero", action="store_true",
+                        help="Ignorar la marca de agua y recalcular desde el primer mensaje")
+    args = parser.parse_args()
+
+    if db_manager.conectar():
+        try:
+            estado = ejecutar(db_manager, desde_cero=args.desde_cero)
+            print(f"[ROLLUPS] Marca de agua: {estado.get('marca_agua')}")
+        finally:
+            db_manager.cerrar()
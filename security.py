@@ -1,12 +1,238 @@
 import hmac
 import hashlib
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives import padding as sym_padding
 from cryptography.hazmat.backends import default_backend
-from config import AES_KEY, CLAVE_SECRETA, AUDIT_LOG_FILE, ENABLE_AUDIT
+from cryptography.exceptions import InvalidTag
+from config import (
+    AES_KEY_ID, AES_KEYRING, AES_KEY_ID_ACTIVA,
+    CLAVE_SECRETA, AUDIT_LOG_FILE, ENABLE_AUDIT, CRYPTO_HILOS
+)
 import base64
 
+# Los datos AES-GCM se guardan como PREFIJO_GCM + base64(...). El prefijo
+# lleva ':', que no existe en el alfabeto base64, así que un CBC heredado
+# (base64(IV + ciphertext), sin versión) nunca puede confundirse con GCM.
+# Tras el prefijo, un byte de versión:
+# v1: VERSION_GCM + nonce + ciphertext + tag (clave heredada)
+# v2: VERSION_GCM_KID + id_clave + nonce + ciphertext + tag (cabecera autenticada)
+PREFIJO_GCM = "gcm:"
+VERSION_GCM = 0x01
+VERSION_GCM_KID = 0x02
+TAM_NONCE_GCM = 12
+TAM_TAG_GCM = 16
+
+# Por debajo de este tamaño de lote no compensa repartir en hilos
+UMBRAL_LOTE_HILOS = 64
+
+
+class MotorCifrado:
+    """
+    Motor de cifrado reutilizable.
+
+    Cachea el material de clave y los objetos AES para no reconstruirlos
+    en cada llamada. Ofrece:
+    - AES-CBC + PKCS7 (formato heredado: IV + ciphertext)
+    - AES-GCM autenticado con id de clave embebido (rotación de claves)
+    - Operaciones por lote con un pool de hilos (el backend C libera el GIL)
+
+    llavero: {id_clave: clave}. id_activa cifra; id_heredada descifra los
+    formatos sin id (CBC y GCM v1).
+    """
+
+    def __init__(self, llavero: dict, id_activa: int, id_heredada: int = None, hilos: int = None):
+        for id_clave, clave in llavero.items():
+            if len(clave) != 32:
+                raise ValueError(f"La clave AES {id_clave} debe ser de 32 bytes, se recibieron {len(clave)}")
+        if id_activa not in llavero:
+            raise ValueError(f"La clave activa {id_activa} no está en el llavero")
+
+        self.id_activa = id_activa
+        self.id_heredada = id_heredada if id_heredada is not None else id_activa
+        self._aesgcm = {id_clave: AESGCM(clave) for id_clave, clave in llavero.items()}
+        self._algoritmo = algorithms.AES(llavero[self.id_heredada])
+        self._padding = sym_padding.PKCS7(128)
+        self._hilos = hilos or os.cpu_count() or 1
+        self._pool = None
+        self._lock_pool = threading.Lock()
+
+    # -------------------------------
+    # AES-CBC (heredado)
+    # -------------------------------
+    def cifrar_cbc(self, texto: str) -> str:
+        """Cifra con AES-CBC + PKCS7. Devuelve base64(IV + ciphertext)."""
+        padder = self._padding.padder()
+        datos = padder.update(texto.encode("utf-8")) + padder.finalize()
+
+        iv = os.urandom(16)
+        encryptor = Cipher(self._algoritmo, modes.CBC(iv), backend=default_backend()).encryptor()
+        ciphertext = encryptor.update(datos) + encryptor.finalize()
+        return base64.b64encode(iv + ciphertext).decode("utf-8")
+
+    def descifrar_cbc(self, cipher_bytes: bytes) -> str:
+        """Descifra IV + ciphertext (AES-CBC + PKCS7)."""
+        if len(cipher_bytes) < 32 or len(cipher_bytes) % 16:
+            raise ValueError(f"Datos cifrados con longitud inválida: {len(cipher_bytes)} bytes")
+
+        iv = cipher_bytes[:16]
+        decryptor = Cipher(self._algoritmo, modes.CBC(iv), backend=default_backend()).decryptor()
+        plaintext_padded = decryptor.update(cipher_bytes[16:]) + decryptor.finalize()
+
+        unpadder = self._padding.unpadder()
+        plaintext_bytes = unpadder.update(plaintext_padded) + unpadder.finalize()
+        return _limpiar_texto(plaintext_bytes)
+
+    # -------------------------------
+    # AES-GCM (autenticado)
+    # -------------------------------
+    def cifrar_gcm(self, texto: str) -> str:
+        """
+        Cifra con AES-GCM en una sola pasada (cifrado + autenticación)
+        usando la clave activa.
+        Devuelve PREFIJO_GCM + base64(VERSION_GCM_KID + id_clave + nonce + ciphertext + tag).
+        """
+        cabecera = bytes([VERSION_GCM_KID, self.id_activa])
+        nonce = os.urandom(TAM_NONCE_GCM)
+        ciphertext = self._aesgcm[self.id_activa].encrypt(nonce, texto.encode("utf-8"), cabecera)
+        return PREFIJO_GCM + base64.b64encode(cabecera + nonce + ciphertext).decode("utf-8")
+
+    @staticmethod
+    def es_gcm(datos) -> bool:
+        """True si `datos` (str) lleva el prefijo del formato GCM."""
+        return isinstance(datos, str) and datos.startswith(PREFIJO_GCM)
+
+    def descifrar_gcm(self, datos) -> str:
+        """
+        Descifra datos GCM (v1 o v2): el texto con PREFIJO_GCM o los bytes
+        que siguen al prefijo. Lanza InvalidTag si el tag no coincide.
+        """
+        if isinstance(datos, str):
+            if not self.es_gcm(datos):
+                raise ValueError("Los datos no tienen formato AES-GCM")
+            datos = base64.b64decode(datos[len(PREFIJO_GCM):], validate=True)
+        if len(datos) < 2 + TAM_NONCE_GCM + TAM_TAG_GCM:
+            raise ValueError("Los datos no tienen formato AES-GCM")
+
+        if datos[0] == VERSION_GCM_KID:
+            cabecera, resto = datos[:2], datos[2:]
+            aesgcm = self._aesgcm.get(datos[1])
+            if aesgcm is None:
+                raise ValueError(f"Clave AES desconocida: {datos[1]}")
+        elif datos[0] == VERSION_GCM:
+            cabecera, resto = None, datos[1:]
+            aesgcm = self._aesgcm[self.id_heredada]
+        else:
+            raise ValueError("Los datos no tienen formato AES-GCM")
+
+        nonce = resto[:TAM_NONCE_GCM]
+        plaintext = aesgcm.decrypt(nonce, resto[TAM_NONCE_GCM:], cabecera)
+        return plaintext.decode("utf-8")
+
+    def id_clave(self, datos) -> int | None:
+        """Id de la clave con la que se cifraron los datos (None si no es GCM v2)."""
+        if not self.es_gcm(datos):
+            return None
+        datos = base64.b64decode(datos[len(PREFIJO_GCM):])
+        if len(datos) >= 2 and datos[0] == VERSION_GCM_KID:
+            return datos[1]
+        return None
+
+    def recifrar(self, datos) -> str | None:
+        """
+        Re-cifra con la clave activa datos GCM autenticados (v1 o v2).
+        Devuelve None si ya usan la clave activa o si no son GCM válidos
+        (el CBC heredado no está autenticado y no se toca).
+        """
+        if not self.es_gcm(datos) or self.id_clave(datos) == self.id_activa:
+            return None
+        try:
+            texto = self.descifrar_gcm(datos)
+        except (InvalidTag, ValueError):
+            return None
+        return self.cifrar_gcm(texto)
+
+    # -------------------------------
+    # Detección de formato
+    # -------------------------------
+    def descifrar(self, datos) -> str:
+        """
+        Descifra datos en cualquiera de los formatos soportados: GCM si
+        llevan PREFIJO_GCM y si no, CBC heredado (string base64 o bytes
+        IV + ciphertext). Un GCM cuyo tag no coincide lanza InvalidTag:
+        nunca se reintenta como CBC.
+        """
+        if self.es_gcm(datos):
+            return self.descifrar_gcm(datos)
+        if isinstance(datos, str):
+            datos = base64.b64decode(datos)
+        return self.descifrar_cbc(datos)
+
+    # -------------------------------
+    # LOTES
+    # -------------------------------
+    def _obtener_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock_pool:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self._hilos,
+                        thread_name_prefix="cifrado"
+                    )
+        return self._pool
+
+    def _aplicar_lote(self, funcion, elementos: list, hilos: int = None) -> list:
+        hilos = hilos or self._hilos
+        if hilos <= 1 or len(elementos) < UMBRAL_LOTE_HILOS:
+            return [funcion(e) for e in elementos]
+
+        # Repartir en trozos contiguos para amortizar el coste de cada tarea
+        tam = -(-len(elementos) // hilos)
+        trozos = [elementos[i:i + tam] for i in range(0, len(elementos), tam)]
+        resultados = []
+        for parcial in self._obtener_pool().map(lambda t: [funcion(e) for e in t], trozos):
+            resultados.extend(parcial)
+        return resultados
+
+    def cifrar_lote(self, textos: list, modo: str = "gcm", hilos: int = None) -> list:
+        """Cifra una lista de textos. modo: 'gcm' (por defecto) o 'cbc'."""
+        funcion = self.cifrar_gcm if modo == "gcm" else self.cifrar_cbc
+        return self._aplicar_lote(funcion, list(textos), hilos)
+
+    def descifrar_lote(self, datos: list, hilos: int = None) -> list:
+        """
+        Descifra una lista (p. ej. un historial). Los elementos que no se
+        pueden descifrar devuelven None en lugar de abortar el lote.
+        """
+        def _uno(d):
+            try:
+                return self.descifrar(d)
+            except Exception:
+                return None
+        return self._aplicar_lote(_uno, list(datos), hilos)
+
+    def recifrar_lote(self, datos: list, hilos: int = None) -> list:
+        """recifrar() sobre una lista; None donde no hay nada que cambiar."""
+        return self._aplicar_lote(self.recifrar, list(datos), hilos)
+
+
+def _limpiar_texto(plaintext_bytes: bytes) -> str:
+    """Decodifica UTF-8 y elimina caracteres de control no imprimibles."""
+    texto = plaintext_bytes.decode('utf-8', errors='ignore')
+    # Camino rápido: la comprobación en C evita recorrer el texto en Python
+    if texto.isprintable():
+        return texto
+    return ''.join(c for c in texto if c.isprintable() or c.isspace())
+
+
+# instancia global
+motor_cifrado = MotorCifrado(AES_KEYRING, AES_KEY_ID_ACTIVA, id_heredada=AES_KEY_ID, hilos=CRYPTO_HILOS)
+
+
 def crear_hmac(mensaje_bytes):
     """Crea HMAC-SHA256 de los datos"""
     return hmac.new(CLAVE_SECRETA, mensaje_bytes, hashlib.sha256).hexdigest()
@@ -44,61 +270,39 @@ def escribir_log_auditoria(usuario, mensaje, hash_sha256):
 
 def descifrar_aes_cbc(cipher_bytes):
     """Descifra usando AES-CBC con padding PKCS7 y limpia caracteres extra"""
-    if len(cipher_bytes) < 16:
-        raise ValueError(f"Datos cifrados demasiado cortos: {len(cipher_bytes)} bytes")
-    
-    iv = cipher_bytes[:16]
-    ciphertext = cipher_bytes[16:]
-    
+    if isinstance(cipher_bytes, str):
+        cipher_bytes = base64.b64decode(cipher_bytes)
+
     try:
-        cipher = Cipher(
-            algorithms.AES(AES_KEY),
-            modes.CBC(iv),
-            backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
-        plaintext_padded = decryptor.update(ciphertext) + decryptor.finalize()
-        
-        if len(plaintext_padded) == 0:
-            raise ValueError("Plaintext vacío después de descifrar")
-        
-        padding_len = plaintext_padded[-1]
-        if padding_len < 1 or padding_len > 16:
-            raise ValueError(f"Padding inválido: {padding_len}")
-        
-        plaintext_bytes = plaintext_padded[:-padding_len]
-        
-        # Decodificar UTF-8 y eliminar caracteres de control no imprimibles
-        texto = plaintext_bytes.decode('utf-8', errors='ignore')
-        texto = ''.join(c for c in texto if c.isprintable() or c.isspace())
-        
-        return texto
-    
+        return motor_cifrado.descifrar_cbc(cipher_bytes)
     except Exception as e:
         raise ValueError(f"Error al descifrar: {str(e)}")
-    
-def cifrar_aes_cbc(texto: str) -> bytes:
+
+def cifrar_aes_cbc(texto: str) -> str:
     """
     Cifra un string con AES-CBC + PKCS7 padding.
-    Devuelve: IV + ciphertext (en bytes)
+    Devuelve: base64(IV + ciphertext)
+    """
+    return motor_cifrado.cifrar_cbc(texto)
+
+def cifrar_aes_gcm(texto: str) -> str:
     """
-    # Convertir a bytes
-    mensaje_bytes = texto.encode("utf-8")
-
-    # Padding PKCS7
-    padding_len = 16 - (len(mensaje_bytes) % 16)
-    mensaje_bytes += bytes([padding_len]) * padding_len
-
-    # IV aleatorio de 16 bytes
-    iv = os.urandom(16)
-
-    cipher = Cipher(
-        algorithms.AES(AES_KEY),
-        modes.CBC(iv),
-        backend=default_backend()
-    )
-    encryptor = cipher.encryptor()
-    ciphertext = encryptor.update(mensaje_bytes) + encryptor.finalize()
-
-    # Guardamos IV + ciphertext
-    return base64.b64encode(ciphertext).decode("utf-8")
\ No newline at end of file
+    Cifra un string con AES-GCM (autenticado, sin HMAC aparte) y la clave activa.
+    Devuelve: PREFIJO_GCM + base64(VERSION_GCM_KID + id_clave + nonce + ciphertext + tag)
+    """
+    return motor_cifrado.cifrar_gcm(texto)
+
+def descifrar_mensaje(datos) -> str:
+    """Descifra datos GCM (con PREFIJO_GCM) o CBC heredado (bytes o base64)."""
+    try:
+        return motor_cifrado.descifrar(datos)
+    except Exception as e:
+        raise ValueError(f"Error al descifrar: {str(e)}")
+
+def cifrar_lote(textos: list, modo: str = "gcm") -> list:
+    """Cifra varios textos de una vez (usa el pool de hilos en lotes grandes)."""
+    return motor_cifrado.cifrar_lote(textos, modo=modo)
+
+def descifrar_lote(datos: list) -> list:
+    """Descifra varios payloads; None en los que fallen."""
+    return motor_cifrado.descifrar_lote(datos)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Servidor de producción
+======================
+Sirve la app Flask con gunicorn (varios workers, cada uno con un pool de
+hilos) y, opcionalmente, lanza el servidor WebSocket en un proceso aparte
+vigilado por supervisor_ws.py (se relanza si cae y se detiene con el master).
+Así firmas, logins bcrypt y llamadas a Drive no comparten GIL con el chat.
+
+Configuración: HTTP_HOST, FLASK_PORT, HTTP_WORKERS, HTTP_THREADS,
+HTTP_TIMEOUT, HTTP_KEEPALIVE, HTTP_MAX_REQUESTS y SSL_* (ver config.py).
+
+Uso:
+    python servidor_produccion.py            # solo HTTP
+    python servidor_produccion.py --con-ws   # HTTP + proceso WebSocket
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from gunicorn.app.base import BaseApplication
+
+from config import (
+    HTTP_HOST, FLASK_PORT, HTTP_WORKERS, HTTP_THREADS, HTTP_TIMEOUT,
+    HTTP_KEEPALIVE, HTTP_MAX_REQUESTS, SSL_ENABLED, SSL_CERT_PATH, SSL_KEY_PATH
+)
+
+
+def _post_worker_init(worker):
+    """Cada worker abre su propia conexión a MongoDB (MongoClient no sobrevive a fork)."""
+    from db_manager import db_manager
+    db_manager.conectar()
+
+
+def _worker_exit(server, worker):
+    from db_manager import db_manager
+    if db_manager.conectado:
+        db_manager.cerrar()
+
+
+def opciones_gunicorn() -> dict:
+    opciones = {
+        "bind": f"{HTTP_HOST}:{FLASK_PORT}",
+        "workers": HTTP_WORKERS,
+        "threads": HTTP_THREADS,
+        "worker_class": "gthread" if HTTP_THREADS > 1 else "sync",
+        "timeout": HTTP_TIMEOUT,
+        "graceful_timeout": HTTP_TIMEOUT,
+        "keepalive": HTTP_KEEPALIVE,
+        # reciclar workers de vez en cuando (fugas de memoria), con jitter para no hacerlo a la vez
+        "max_requests": HTTP_MAX_REQUESTS,
+        "max_requests_jitter": HTTP_MAX_REQUESTS // 10,
+        "accesslog": "-",
+        "post_worker_init": _post_worker_init,
+        "worker_exit": _worker_exit,
+    }
+    if SSL_ENABLED:
+        opciones["certfile"] = SSL_CERT_PATH
+        opciones["keyfile"] = SSL_KEY_PATH
+    return opciones
+
+
+class ServidorHTTP(BaseApplication):
+    """Aplicación gunicorn embebida (sin archivo de configuración)."""
+
+    def __init__(self, opciones: dict):
+        self.opciones = opciones
+        super().__init__()
+
+    def load_config(self):
+        for clave, valor in self.opciones.items():
+            self.cfg.set(clave, valor)
+
+    def load(self):
+        from app import app
+        return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor HTTP de producción (gunicorn)")
+    parser.add_argument("--con-ws", action="store_true", help="Lanzar también el servidor WebSocket en otro proceso")
+    args = parser.parse_args()
+
+    opciones = opciones_gunicorn()
+    print(f"[HTTP] gunicorn en {opciones['bind']}: {opciones['workers']} workers x {opciones['threads']} hilos")
+
+    supervisor_ws = None
+    if args.con_ws:
+        from supervisor_ws import supervisor_ws
+        supervisor_ws.iniciar()
+
+    try:
+        ServidorHTTP(opciones).run()
+    finally:
+        if supervisor_ws:
+            supervisor_ws.detener()
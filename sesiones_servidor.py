@@ -0,0 +1,190 @@
+# sesiones_servidor.py
+"""
+Sesiones de Flask en el servidor
+================================
+La cookie solo lleva un identificador opaco (token aleatorio de 256 bits);
+los datos de la sesión viven en la colección `sesiones` (documentos con
+tipo "http", borrados por un índice TTL sobre `expira`), junto a los
+registros de conexión WebSocket de registrar_sesion (tipo "ws").
+
+- Delante de Mongo hay un LRU en memoria por proceso. Una entrada se
+  reutiliza durante SESIONES_CACHE_TTL_S; después se relee de Mongo
+  (otro worker pudo modificar la sesión)
+- Solo se escribe cuando la sesión cambia, o para renovar `expira` cuando
+  queda menos de la mitad de su duración
+- Sin MongoDB conectado las sesiones se guardan solo en memoria
+- session.rotar() cambia el identificador (al iniciar sesión, contra
+  fijación de sesión)
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from bson import ObjectId
+from flask.sessions import SessionInterface, SecureCookieSession
+
+from config import SESIONES_CACHE_MAX, SESIONES_CACHE_TTL_S
+from db_manager import db_manager
+from metricas import metricas
+
+
+class SesionServidor(SecureCookieSession):
+    """Sesión con identificador; modified/accessed como la sesión de cookie de Flask."""
+
+    def __init__(self, initial=None, sid: str = None, expira: datetime = None):
+        super().__init__(initial)
+        self.sid = sid or _nuevo_sid()
+        self.expira = expira
+        self.nueva = sid is None
+        self.sid_anterior = None
+
+    def rotar(self):
+        """Nuevo identificador conservando los datos; el anterior se borra al guardar."""
+        if not self.nueva and self.sid_anterior is None:
+            self.sid_anterior = self.sid
+        self.sid = _nuevo_sid()
+        self.modified = True
+
+
+def _nuevo_sid() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class AlmacenSesiones:
+    """LRU en memoria delante de los documentos "http" de `sesiones`."""
+
+    def __init__(self, db_manager, max_entradas: int = SESIONES_CACHE_MAX,
+                 ttl_cache_s: float = SESIONES_CACHE_TTL_S):
+        self.db_manager = db_manager
+        self.max_entradas = max_entradas
+        self.ttl_cache_s = ttl_cache_s
+        self._entradas = OrderedDict()   # sid -> (datos, expira, leido_en)
+        self._lock = threading.Lock()
+
+    def _en_memoria(self, sid: str, datos: dict, expira: datetime):
+        with self._lock:
+            self._entradas[sid] = (datos, expira, time.monotonic())
+            self._entradas.move_to_end(sid)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def obtener(self, sid: str) -> tuple:
+        """(datos, expira) de una sesión vigente, o (None, None)."""
+        ahora = datetime.utcnow()
+        with self._lock:
+            entrada = self._entradas.get(sid)
+            if entrada:
+                self._entradas.move_to_end(sid)
+        if entrada:
+            datos, expira, leido_en = entrada
+            solo_memoria = not self.db_manager.conectado
+            if expira > ahora and (solo_memoria or time.monotonic() - leido_en < self.ttl_cache_s):
+                metricas.incrementar("sesiones.memoria")
+                return dict(datos), expira
+
+        if not self.db_manager.conectado:
+            return None, None
+        try:
+            doc = self.db_manager.db.sesiones.find_one(
+                {"_id": sid, "tipo": "http", "expira": {"$gt": ahora}}, {"datos": 1, "expira": 1}
+            )
+        except Exception as e:
+            print(f"[DB ERROR] AlmacenSesiones.obtener: {e}")
+            return None, None
+        metricas.incrementar("sesiones.mongo")
+        if not doc:
+            with self._lock:
+                self._entradas.pop(sid, None)
+            return None, None
+        self._en_memoria(sid, doc["datos"], doc["expira"])
+        return dict(doc["datos"]), doc["expira"]
+
+    def guardar(self, sid: str, datos: dict, expira: datetime):
+        self._en_memoria(sid, dict(datos), expira)
+        if not self.db_manager.conectado:
+            return
+        usuario_id = (datos.get("user") or {}).get("_id")
+        if usuario_id and ObjectId.is_valid(usuario_id):
+            usuario_id = ObjectId(usuario_id)
+        try:
+            self.db_manager.db.sesiones.update_one(
+                {"_id": sid},
+                {"$set": {"datos": datos, "expira": expira, "usuario_id": usuario_id},
+                 "$setOnInsert": {"tipo": "http", "inicio": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"[DB ERROR] AlmacenSesiones.guardar: {e}")
+
+    def eliminar(self, sid: str):
+        with self._lock:
+            self._entradas.pop(sid, None)
+        if not self.db_manager.conectado:
+            return
+        try:
+            self.db_manager.db.sesiones.delete_one({"_id": sid, "tipo": "http"})
+        except Exception as e:
+            print(f"[DB ERROR] AlmacenSesiones.eliminar: {e}")
+
+
+class InterfazSesionesServidor(SessionInterface):
+    """SessionInterface de Flask sobre AlmacenSesiones (cookie = solo el identificador)."""
+
+    def __init__(self, almacen: AlmacenSesiones):
+        self.almacen = almacen
+
+    def open_session(self, app, request) -> SesionServidor:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            datos, expira = self.almacen.obtener(sid)
+            if datos is not None:
+                return SesionServidor(datos, sid=sid, expira=expira)
+        return SesionServidor()
+
+    def save_session(self, app, session: SesionServidor, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.sid_anterior:
+            self.almacen.eliminar(session.sid_anterior)
+            session.sid_anterior = None
+
+        if not session:
+            # Sesión vaciada (logout): se borra en el servidor y en el navegador
+            if session.modified and not session.nueva:
+                self.almacen.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+                response.vary.add("Cookie")
+            return
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        duracion = app.permanent_session_lifetime
+        ahora = datetime.utcnow()
+        renovar = session.expira is not None and session.expira - ahora < duracion / 2
+        if not (session.modified or session.nueva or renovar):
+            return
+
+        self.almacen.guardar(session.sid, dict(session), ahora + duracion)
+        response.set_cookie(
+            nombre, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=ruta,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
+
+
+# instancia global
+almacen_sesiones = AlmacenSesiones(db_manager)
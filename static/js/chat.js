@@ -36,13 +36,14 @@ function closeAndToggle() {
     document.body.classList.toggle("dark");
 }
 
-const comandos = ["/crear", "/crear_priv", "/unir", "/salir"];
+const comandos = ["/crear", "/crear_priv", "/unir", "/salir", "/buscar"];
 
 const comands = [
     { comando: "/crear nombre", descripcion: "Crear canal público" },
     { comando: "/crear_priv nombre", descripcion: "Crear canal privado" },
     { comando: "/unir nombre", descripcion: "Unirse a un canal" },
     { comando: "/salir", descripcion: "Volver al canal general" },
+    { comando: "/buscar texto [canal:nombre] [autor:correo]", descripcion: "Buscar en el historial de tus canales" },
     { comando: "/agregar correo canal", descripcion: "Agregar usuario a canal (solo admin)" },
     { comando: "/remover correo canal", descripcion: "Remover usuario de canal (solo admin)" },
     { comando: "/dar_admin correo canal", descripcion: "Dar permisos de admin (solo admin)" },
@@ -95,6 +96,24 @@ async function obtenerConfigWS() {
     }
 }
 
+/* ===========================================
+   TICKET DE CONEXIÓN WS
+=========================================== */
+async function obtenerTicketWS() {
+    try {
+        const res = await fetch("/ws/ticket", { method: "POST" });
+        if (res.status === 401) {
+            window.location.href = "/denied";
+            return null;
+        }
+        const data = await res.json();
+        return data.ticket;
+    } catch (err) {
+        console.error("[WS] No se pudo obtener el ticket:", err);
+        return null;
+    }
+}
+
 /* ===========================================
    CONEXIÓN WEBSOCKET
 =========================================== */
@@ -104,6 +123,13 @@ async function conectarWS() {
         await obtenerConfigWS();
     }
     
+    // Ticket firmado de un solo uso: el servidor WS no consulta la base de datos
+    const ticket = await obtenerTicketWS();
+    if (!ticket) {
+        setTimeout(conectarWS, 2000);
+        return;
+    }
+
     console.log("[WS] Conectando a", WS_URL);
 
     socket = new WebSocket(WS_URL);
@@ -114,10 +140,7 @@ async function conectarWS() {
     socket.onopen = () => {
         console.log("🟢 WebSocket conectado");
 
-        const payload = {
-            usuario_id: usuarioActual._id,
-            google_id: usuarioActual.google_id ?? null
-        };
+        const payload = { ticket };
 
         socket.send(JSON.stringify(payload));
     };
@@ -172,6 +195,17 @@ async function conectarWS() {
                 }
                 agregarMensajeSistema({ texto: data.resultado.mensaje ?? data.mensaje ?? data.resultado });
                 break;
+            case "busqueda":
+                if (data.resultados.length === 0) {
+                    agregarMensajeSistema({ texto: `Sin resultados para "${data.consulta}"` });
+                    break;
+                }
+                agregarMensajeSistema({ texto: `Resultados para "${data.consulta}":` });
+                data.resultados.forEach(r => {
+                    agregarMensajeSistema({ texto: `${r.usuario_nombre ?? "?"} (${formatearFecha(r.timestamp)}): ${r.mensaje}` });
+                });
+                break;
+
             case "bienvenida":
                 agregarMensajeSistema({ texto: data.resultado ?? data.mensaje });
                 break;
@@ -279,25 +313,46 @@ let showGroups = true
 
 const toggleShow = () => showGroups = !showGroups;
 
-async function renderUsuarios() {
-    const ul = document.getElementById("lista-usuarios");
-    ul.innerHTML = "";
-
-    let lista = [];
+const POR_PAGINA_LISTAS = 100;
 
+/* Pinta una página de un listado paginado ({resultados, hay_mas}) y, si hay
+   más, deja al final de la lista un botón "Cargar más" con la siguiente. */
+async function cargarPagina(ul, url, pagina, pintar, error) {
+    let data;
     try {
-        const res = await fetch("/usuarios", {
+        const res = await fetch(`${url}?por_pagina=${POR_PAGINA_LISTAS}&pagina=${pagina}`, {
             headers: { "Content-Type": "application/json" },
         });
-        const data = await res.json();
-        if (!res.ok) return alert(data.error);
-
-        lista = data;
+        data = await res.json();
+        if (!res.ok) {
+            alert(data.error);
+            return null;
+        }
     } catch (err) {
-        alert("Error al obtener usuarios: " + err);
+        alert(error + err);
+        return null;
     }
 
-    lista.forEach((u) => {
+    data.resultados.forEach(pintar);
+
+    if (data.hay_mas) {
+        const li = document.createElement("li");
+        li.className = "user-item cargar-mas";
+        li.textContent = "Cargar más";
+        li.addEventListener("click", () => {
+            li.remove();
+            cargarPagina(ul, url, pagina + 1, pintar, error);
+        });
+        ul.appendChild(li);
+    }
+    return data;
+}
+
+async function renderUsuarios() {
+    const ul = document.getElementById("lista-usuarios");
+    ul.innerHTML = "";
+
+    await cargarPagina(ul, "/usuarios", 1, (u) => {
         if (u._id === usuarioActual._id) return; // no mostrarte a ti mismo
 
         ul.insertAdjacentHTML(
@@ -319,35 +374,14 @@ async function renderUsuarios() {
             </li>
             `
         );
-    });
+    }, "Error al obtener usuarios: ");
 }
 
 async function renderCanales() {
     const ul = document.getElementById("lista-usuarios");
     ul.innerHTML = "";
 
-    let lista = [];
-
-    try {
-        const res = await fetch(`/canales/${usuarioActual._id}`, {
-            headers: { "Content-Type": "application/json" },
-        });
-        const data = await res.json();
-        if (!res.ok) return alert(data.error);
-
-        lista = data;
-    } catch (err) {
-        alert("Error al obtener canales: " + err);
-        return;
-    }
-
-    if (lista.length === 0) {
-        ul.innerHTML = emmbeddMessageChat;
-        changeLordIconColors();
-        return;
-    }
-
-    lista.forEach((u) => {
+    const data = await cargarPagina(ul, `/canales/${usuarioActual._id}`, 1, (u) => {
         const mostrarUsuario =
             u.ultimo?.usuario_nombre && u.ultimo.usuario_nombre !== my_name
                 ? `<strong>${u.ultimo.usuario_nombre}:</strong> `
@@ -372,7 +406,12 @@ async function renderCanales() {
         li.addEventListener("click", () => { joinCanal(u); closeMenu() });
 
         ul.appendChild(li);
-    });
+    }, "Error al obtener canales: ");
+
+    if (data && data.resultados.length === 0) {
+        ul.innerHTML = emmbeddMessageChat;
+        changeLordIconColors();
+    }
 }
 
 async function renderCanalesSocket(lista) {
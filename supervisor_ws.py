@@ -0,0 +1,229 @@
+# supervisor_ws.py
+"""
+Supervisor del servidor WebSocket
+=================================
+Ejecuta el servidor WebSocket en un proceso hijo, con su propio GIL, para
+que las firmas de archivos grandes o los logins bcrypt del lado HTTP no
+retrasen el bucle de eventos del chat.
+
+- Si el proceso hijo muere se relanza con backoff exponencial
+  (WS_BACKOFF_INICIAL_S .. WS_BACKOFF_MAX_S; se reinicia si aguantó ESTABLE_S)
+- detener() envía SIGTERM: el hijo cierra el servidor (código 1001 a los
+  clientes) y la conexión a MongoDB; si no termina a tiempo, SIGKILL
+- El hijo ignora SIGINT: con CTRL+C la señal llega a todo el grupo de
+  procesos y es el padre quien ordena el cierre
+- Cada WS_LATIDO_S el hijo envía un latido (pid, clientes, retraso del
+  bucle y metricas.snapshot()) por una multiprocessing.Queue. El padre lo
+  guarda en memoria y en WS_ESTADO_ARCHIVO para que cualquier proceso
+  (p. ej. los workers de gunicorn) pueda servir /ws/salud y /ws/metricas
+"""
+
+import asyncio
+import json
+import os
+import queue
+import signal
+import threading
+import time
+import multiprocessing
+
+from config import WS_LATIDO_S, WS_BACKOFF_INICIAL_S, WS_BACKOFF_MAX_S, WS_ESTADO_ARCHIVO
+from metricas import metricas
+
+# Segundos de vida a partir de los cuales una caída ya no alarga el backoff
+ESTABLE_S = 60
+# Latidos perdidos antes de considerar el proceso no sano
+LATIDOS_TOLERADOS = 3
+# spawn: no se hace fork de un proceso con hilos (Flask, el propio supervisor)
+_CONTEXTO = multiprocessing.get_context("spawn")
+
+
+# -------------------------------
+# Proceso hijo
+# -------------------------------
+async def _latidos(cola, intervalo: float):
+    from manejadores import clientes
+
+    while True:
+        esperado = time.monotonic() + intervalo
+        cola.put({
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "clientes": len(clientes),
+            "metricas": metricas.snapshot()
+        })
+        await asyncio.sleep(intervalo)
+        # Cuánto tardó el bucle en despertar: mide lo que espera cualquier mensaje del chat
+        retraso = max(0.0, time.monotonic() - esperado)
+        metricas.observar("ws.retraso_bucle", retraso)
+        metricas.fijar("ws.retraso_bucle_ms", round(retraso * 1000, 2))
+
+
+async def _principal(cola, intervalo: float):
+    from ws_server import iniciar_ws
+    from db_manager import db_manager
+
+    detener = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, detener.set)
+    except NotImplementedError:
+        pass  # Windows: terminate() mata el proceso directamente
+
+    latidos = asyncio.create_task(_latidos(cola, intervalo)) if cola is not None else None
+    try:
+        await iniciar_ws(detener)
+    finally:
+        if latidos:
+            latidos.cancel()
+        if db_manager.conectado:
+            db_manager.cerrar()
+
+
+def proceso_ws(cola=None, intervalo: float = WS_LATIDO_S):
+    """Punto de entrada del proceso hijo."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_principal(cola, intervalo))
+
+
+# -------------------------------
+# Proceso padre
+# -------------------------------
+class SupervisorWS:
+    """Lanza, vigila y relanza el proceso WebSocket."""
+
+    def __init__(self, objetivo=proceso_ws, intervalo_latido: float = WS_LATIDO_S,
+                 backoff_inicial: float = WS_BACKOFF_INICIAL_S, backoff_max: float = WS_BACKOFF_MAX_S,
+                 archivo_estado: str = WS_ESTADO_ARCHIVO):
+        self.objetivo = objetivo
+        self.intervalo_latido = intervalo_latido
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.archivo_estado = archivo_estado
+        self.reinicios = 0
+        self._proceso = None
+        self._cola = None
+        self._hilo = None
+        self._pid_padre = None
+        self._latido = None
+        self._detener = threading.Event()
+
+    def iniciar(self) -> threading.Thread:
+        """Lanza el proceso WS y el hilo que lo vigila."""
+        self._pid_padre = os.getpid()
+        self._cola = _CONTEXTO.Queue()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._vigilar, name="supervisor-ws", daemon=True)
+        self._hilo.start()
+        return self._hilo
+
+    def detener(self, timeout: float = 10):
+        """Cierre ordenado: SIGTERM al hijo y, si no termina en `timeout` s, SIGKILL."""
+        if self._pid_padre != os.getpid():
+            return  # worker forkeado desde el padre (gunicorn): el hijo no es suyo
+        self._detener.set()
+        proceso = self._proceso
+        if proceso and proceso.is_alive():
+            print(f"[WS] Deteniendo proceso WebSocket (pid {proceso.pid})...")
+            proceso.terminate()
+            proceso.join(timeout)
+            if proceso.is_alive():
+                print("[WS] El proceso no terminó a tiempo, forzando cierre")
+                proceso.kill()
+                proceso.join()
+        if self._hilo:
+            self._hilo.join(timeout)
+        self._guardar_estado()
+
+    def _arrancar(self):
+        self._latido = None
+        self._proceso = _CONTEXTO.Process(
+            target=self.objetivo, args=(self._cola, self.intervalo_latido), name="ws", daemon=True
+        )
+        self._proceso.start()
+        metricas.fijar("ws.pid", self._proceso.pid)
+        print(f"[WS] Proceso WebSocket (pid {self._proceso.pid})")
+
+    def _vigilar(self):
+        backoff = self.backoff_inicial
+        while not self._detener.is_set():
+            arranque = time.monotonic()
+            self._arrancar()
+            while self._proceso.is_alive() and not self._detener.is_set():
+                self._recibir_latidos()
+            if self._detener.is_set():
+                break
+
+            codigo = self._proceso.exitcode
+            metricas.incrementar("ws.caidas")
+            if time.monotonic() - arranque >= ESTABLE_S:
+                backoff = self.backoff_inicial
+            print(f"[WS] El proceso WebSocket terminó (código {codigo}); reinicio en {backoff:.0f}s")
+            self._guardar_estado()
+            if self._detener.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.backoff_max)
+            self.reinicios += 1
+            metricas.fijar("ws.reinicios", self.reinicios)
+
+    def _recibir_latidos(self):
+        try:
+            self._latido = self._cola.get(timeout=0.5)
+        except queue.Empty:
+            return
+        self._guardar_estado()
+
+    def _estado_local(self) -> dict:
+        proceso = self._proceso
+        latido = self._latido or {}
+        vivo = bool(proceso and proceso.is_alive())
+        return {
+            "vivo": vivo,
+            "pid": proceso.pid if vivo else None,
+            "reinicios": self.reinicios,
+            "clientes": latido.get("clientes"),
+            "ultimo_latido": latido.get("ts"),
+            "intervalo_latido_s": self.intervalo_latido,
+            "metricas": latido.get("metricas", {})
+        }
+
+    def _guardar_estado(self):
+        """Escritura atómica del estado para los demás procesos."""
+        if not self.archivo_estado:
+            return
+        temporal = f"{self.archivo_estado}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self._estado_local(), f)
+            os.replace(temporal, self.archivo_estado)
+        except OSError as e:
+            print(f"[WS] No se pudo guardar el estado: {e}")
+
+    def _leer_estado(self) -> dict:
+        # Solo el proceso que lanzó el hijo puede consultarlo (los workers forkeados no)
+        if self._pid_padre == os.getpid():
+            return self._estado_local()
+        try:
+            with open(self.archivo_estado, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"vivo": False, "pid": None, "reinicios": None, "clientes": None,
+                    "ultimo_latido": None, "intervalo_latido_s": self.intervalo_latido, "metricas": {}}
+
+    def estado(self) -> dict:
+        """Salud del proceso WS: vivo, pid, reinicios, clientes y antigüedad del último latido."""
+        estado = self._leer_estado()
+        metricas_ws = estado.pop("metricas", {})
+        hace = time.time() - estado["ultimo_latido"] if estado["ultimo_latido"] else None
+        estado["ultimo_latido_hace_s"] = round(hace, 1) if hace is not None else None
+        estado["retraso_bucle_ms"] = metricas_ws.get("valores", {}).get("ws.retraso_bucle_ms")
+        estado["sano"] = bool(estado["vivo"] and hace is not None
+                              and hace < LATIDOS_TOLERADOS * estado["intervalo_latido_s"])
+        return estado
+
+    def metricas(self) -> dict:
+        """Último metricas.snapshot() recibido del proceso WS."""
+        return self._leer_estado().get("metricas", {})
+
+
+# instancia global
+supervisor_ws = SupervisorWS()
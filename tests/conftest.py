@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+
+# Los módulos del proyecto están en la raíz (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# bcrypt barato: los tests crean usuarios y hacen login
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
@@ -0,0 +1,78 @@
+# tests/test_firma_algoritmos.py
+"""
+Firma y verificación con cada tipo de clave (FIRMA_ALGORITMO), y .sig
+firmados con un certificado que después se regeneró con otro algoritmo.
+"""
+
+import contextlib
+import os
+import shutil
+
+import pytest
+
+from firma_digital.firma_service import ALGORITMOS_FIRMA, FirmaDigitalService
+
+
+def _servicio(carpeta) -> FirmaDigitalService:
+    with contextlib.redirect_stdout(None):
+        return FirmaDigitalService(
+            cert_path=os.path.join(carpeta, "certs", "firma_cert.pem"),
+            key_path=os.path.join(carpeta, "certs", "firma_key.pem"),
+            upload_folder=os.path.join(carpeta, "uploads")
+        )
+
+
+def _firmar(servicio: FirmaDigitalService, carpeta, nombre: str) -> dict:
+    ruta = os.path.join(carpeta, nombre)
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(f"contenido de {nombre}")
+    with contextlib.redirect_stdout(None):
+        return servicio.firmar_archivo(ruta, "u1", "Ana Pérez", "ana@ejemplo.com")
+
+
+def _regenerar(servicio: FirmaDigitalService, algoritmo: str):
+    with contextlib.redirect_stdout(None):
+        servicio.generar_certificado_firma("Pruebas", "Pruebas", algoritmo=algoritmo)
+
+
+@pytest.mark.parametrize("algoritmo", list(ALGORITMOS_FIRMA))
+def test_firma_y_verifica(tmp_path, algoritmo):
+    carpeta = tmp_path
+    servicio = _servicio(carpeta)
+    _regenerar(servicio, algoritmo)
+    firmado = _firmar(servicio, carpeta, "doc.txt")
+
+    assert firmado["metadatos"]["firma"]["algoritmo"] == ALGORITMOS_FIRMA[algoritmo]
+    resultado = servicio.verificar_archivo_firmado(firmado["archivo_firmado"], firmado["archivo_firma"])
+    assert resultado["valido"], resultado
+
+
+def test_firma_rsa_verifica_tras_cambiar_a_ed25519(tmp_path):
+    carpeta = tmp_path
+    servicio = _servicio(carpeta)
+    _regenerar(servicio, "rsa")
+    rsa = _firmar(servicio, carpeta, "antes.txt")
+
+    _regenerar(servicio, "ed25519")
+    ed25519 = _firmar(servicio, carpeta, "despues.txt")
+    assert ed25519["metadatos"]["firma"]["algoritmo"] == ALGORITMOS_FIRMA["ed25519"]
+
+    # También un servicio recién arrancado (otro proceso) que solo ve el certificado Ed25519
+    for verificador in (servicio, _servicio(carpeta)):
+        for firmado in (rsa, ed25519):
+            resultado = verificador.verificar_archivo_firmado(firmado["archivo_firmado"], firmado["archivo_firma"])
+            assert resultado["valido"], resultado
+
+
+def test_sin_certificado_anterior_no_verifica(tmp_path):
+    carpeta = tmp_path
+    servicio = _servicio(carpeta)
+    _regenerar(servicio, "ecdsa-p256")
+    firmado = _firmar(servicio, carpeta, "doc.txt")
+    _regenerar(servicio, "ecdsa-p256")
+
+    # Es el certificado conservado el que valida la firma, no la clave nueva
+    shutil.rmtree(servicio.carpeta_certificados_anteriores)
+    verificador = _servicio(carpeta)
+    resultado = verificador.verificar_archivo_firmado(firmado["archivo_firmado"], firmado["archivo_firma"])
+    assert not resultado["valido"]
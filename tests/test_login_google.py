@@ -0,0 +1,74 @@
+# tests/test_login_google.py
+"""
+Login con Google contra el proveedor OIDC local de benchmarks/bench_login_google.py.
+
+Comprueba que /auth no llama a userinfo (los claims salen del id_token) y
+que el descubrimiento y las JWKS se piden una sola vez aunque el proceso
+se reinicie, gracias a la caché en disco de oidc.py.
+"""
+
+import pytest
+
+from benchmarks.bench_login_google import ProveedorOIDC, CLIENT_ID, hacer_login
+
+LOGINS = 3
+DESCUBRIMIENTO = "/.well-known/openid-configuration"
+
+
+@pytest.fixture
+def proveedor():
+    proveedor = ProveedorOIDC()
+    proveedor.iniciar()
+    yield proveedor
+    proveedor.detener()
+
+
+@pytest.fixture
+def app_oidc(proveedor, tmp_path, monkeypatch):
+    """App de Flask con el cliente 'google' apuntando al proveedor local."""
+    monkeypatch.setenv("AUTHLIB_INSECURE_TRANSPORT", "1")
+    from app import app
+    from config import oauth
+    from db_manager import db_manager
+    import oidc
+
+    monkeypatch.setattr(oidc, "OIDC_CACHE_ARCHIVO", str(tmp_path / "oidc_cache.json"))
+    # Sin MongoDB: solo interesa el tráfico con el proveedor
+    monkeypatch.setattr(db_manager, "crear_o_actualizar_usuario_google", lambda *args, **kwargs: None)
+    monkeypatch.setitem(app.config, "PROPAGATE_EXCEPTIONS", True)
+
+    def arrancar():
+        """Cliente nuevo = lo que ve un proceso recién arrancado (solo queda el disco)."""
+        oauth._clients.clear()
+        oauth.register("google", overwrite=True, client_id=CLIENT_ID, client_secret="secreto",
+                       client_kwargs={"scope": "openid email profile"},
+                       server_metadata_url=f"{proveedor.url}{DESCUBRIMIENTO}", client_cls=oidc.AppOIDC)
+        return app.test_client()
+
+    yield arrancar
+    oauth._clients.clear()
+
+
+def test_login_sin_userinfo_y_metadatos_una_vez_entre_reinicios(proveedor, app_oidc):
+    for _ in ("en frío", "reinicio"):
+        cliente = app_oidc()
+        for _ in range(LOGINS):
+            hacer_login(cliente, proveedor, "/login_google", "/auth")
+
+    peticiones = proveedor.peticiones
+    assert peticiones.get("/userinfo", 0) == 0
+    assert peticiones[DESCUBRIMIENTO] == 1
+    assert peticiones["/jwks"] == 1
+    assert peticiones["/token"] == 2 * LOGINS
+
+
+def test_un_viaje_por_login_con_cache_caliente(proveedor, app_oidc):
+    cliente = app_oidc()
+    hacer_login(cliente, proveedor, "/login_google", "/auth")
+
+    # Reinicio con la caché en disco: cada login es solo el intercambio del código
+    cliente = app_oidc()
+    proveedor.reiniciar_contadores()
+    for _ in range(LOGINS):
+        hacer_login(cliente, proveedor, "/login_google", "/auth")
+    assert proveedor.peticiones == {"/token": LOGINS}
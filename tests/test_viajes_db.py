@@ -0,0 +1,161 @@
+# tests/test_viajes_db.py
+"""
+Viajes a MongoDB de los caminos de escritura de DatabaseManager.
+
+Con un MongoDB real (MONGO_TEST_URI) cuenta los comandos que ve un
+CommandListener de pymongo; sin él usa mongomock y cuenta las operaciones
+con el proxy de benchmarks/bench_viajes_db.py. Cada cifra es
+(viajes que esperan respuesta, escrituras w=0).
+"""
+
+import os
+from contextlib import contextmanager
+
+import pytest
+from pymongo import MongoClient, monitoring
+
+from benchmarks.bench_viajes_db import Contador, BaseContada
+
+NOMBRE_DB = "chat_tests_viajes"
+
+
+class EscuchaComandos(monitoring.CommandListener):
+    """Cuenta los comandos enviados, separando los que no esperan confirmación."""
+
+    def __init__(self):
+        self.contador = None
+
+    def started(self, event):
+        if self.contador is None:
+            return
+        if event.command.get("writeConcern", {}).get("w") == 0:
+            self.contador.sin_espera += 1
+        else:
+            self.contador.viajes += 1
+        self.contador.operaciones.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _cliente_mongodb():
+    uri = os.environ.get("MONGO_TEST_URI")
+    if not uri:
+        pytest.skip("MONGO_TEST_URI no configurada")
+    escucha = EscuchaComandos()
+    cliente = MongoClient(uri, serverSelectionTimeoutMS=2000, event_listeners=[escucha])
+    try:
+        cliente.admin.command("ping")
+    except Exception as e:
+        cliente.close()
+        pytest.skip(f"MongoDB no disponible en MONGO_TEST_URI: {e}")
+    return cliente, escucha
+
+
+@pytest.fixture(params=["mongomock", "mongodb"])
+def gestor(request):
+    """DatabaseManager sobre una base desechable y una función contar() -> Contador."""
+    from db_manager import DatabaseManager
+    from contrasenas import pool_contrasenas
+
+    if request.param == "mongomock":
+        mongomock = pytest.importorskip("mongomock")
+        cliente, escucha = mongomock.MongoClient(), None
+    else:
+        cliente, escucha = _cliente_mongodb()
+
+    gestor = DatabaseManager("", NOMBRE_DB)
+    cliente.drop_database(NOMBRE_DB)
+    gestor.client = cliente
+    gestor.db = cliente[NOMBRE_DB]
+    gestor.conectado = True
+    gestor._inicializar_colecciones()
+    base = gestor.db
+
+    @contextmanager
+    def contar():
+        contador = Contador()
+        if escucha:
+            escucha.contador = contador
+        else:
+            gestor.db = BaseContada(base, contador)
+        try:
+            yield contador
+        finally:
+            if escucha:
+                escucha.contador = None
+            gestor.db = base
+
+    gestor.contar = contar
+    yield gestor
+
+    cliente.drop_database(NOMBRE_DB)
+    cliente.close()
+    pool_contrasenas.cerrar()
+
+
+@pytest.fixture
+def datos(gestor):
+    admin_id = gestor.crear_usuario_classico("Admin", "Uno", "admin@ejemplo.com", "secreta")
+    otro_id = gestor.crear_usuario_classico("Otro", "Dos", "otro@ejemplo.com", "secreta")
+    gestor.crear_canal("general", admin_id)
+    return {"admin_id": admin_id, "otro_id": otro_id}
+
+
+def _viajes(contador) -> tuple:
+    return contador.viajes, contador.sin_espera
+
+
+def test_login_clasico(gestor, datos):
+    with gestor.contar() as contador:
+        assert gestor.login_usuario_classico("admin@ejemplo.com", "secreta") == datos["admin_id"]
+    # usuario, escritura confirmada de la conexión e invalidación de la caché
+    assert _viajes(contador) == (3, 0)
+
+
+def test_login_clasico_contrasena_incorrecta(gestor, datos):
+    with gestor.contar() as contador:
+        assert gestor.login_usuario_classico("admin@ejemplo.com", "otra") is None
+    assert _viajes(contador) == (1, 0)
+
+
+@pytest.mark.parametrize("existente", [False, True])
+def test_upsert_usuario_google(gestor, existente):
+    if existente:
+        gestor.crear_o_actualizar_usuario_google("Gina", "Tres", "g-123", "gina@ejemplo.com", None)
+    with gestor.contar() as contador:
+        assert gestor.crear_o_actualizar_usuario_google("Gina", "Tres", "g-123", "gina@ejemplo.com", None)
+    assert _viajes(contador) == (2, 0)
+
+
+@pytest.mark.parametrize("crear", ["crear_canal", "crear_canal_privado"])
+def test_crear_canal(gestor, datos, crear):
+    with gestor.contar() as contador:
+        assert getattr(gestor, crear)("nuevo", datos["admin_id"])
+    assert _viajes(contador) == (2, 0)
+
+    # Duplicado: lo rechaza el índice único, sin lectura previa
+    with gestor.contar() as contador:
+        assert getattr(gestor, crear)("nuevo", datos["admin_id"]) is None
+    assert _viajes(contador) == (1, 0)
+
+
+@pytest.mark.parametrize("comando, email, esperado, viajes", [
+    ("/agregar", "otro@ejemplo.com", "ok", (3, 0)),
+    ("/dar_admin", "otro@ejemplo.com", "ok", (3, 0)),
+    ("/agregar", "nadie@ejemplo.com", "sin_usuario", (1, 0)),
+])
+def test_comando_admin_canal(gestor, datos, comando, email, esperado, viajes):
+    with gestor.contar() as contador:
+        assert gestor.comando_admin_canal(comando, "general", datos["admin_id"], email) == esperado
+    assert _viajes(contador) == viajes
+
+
+def test_comando_admin_canal_sin_permiso(gestor, datos):
+    # Solo cuando el update no coincide se relee el canal para distinguir el error
+    with gestor.contar() as contador:
+        assert gestor.comando_admin_canal("/agregar", "general", datos["otro_id"], "otro@ejemplo.com") == "no_admin"
+    assert _viajes(contador) == (3, 0)
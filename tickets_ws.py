@@ -0,0 +1,116 @@
+# tickets_ws.py
+"""
+Tickets de conexión WebSocket
+=============================
+El proceso HTTP (POST /ws/ticket) firma con HMAC-SHA256 un ticket de vida
+corta con el id y el nombre del usuario de la sesión; el servidor WS lo
+verifica en el primer mensaje solo con CPU, sin consultar `usuarios`.
+
+Formato: "<kid>.<payload base64url>.<firma base64url>"
+- kid: clave del llavero TICKET_WS_CLAVES con la que se firmó. Para rotar
+  se añade la clave nueva, se activa con TICKET_WS_KID_ACTIVO y la
+  anterior se retira cuando pasen TICKET_WS_TTL_S
+- payload: {"uid", "nom", "gid", "exp", "n"}; `n` es un nonce aleatorio
+  que el verificador recuerda hasta `exp` (un ticket sirve una sola vez)
+
+Los nonces viven en memoria del proceso WS (como mucho
+TICKET_WS_MAX_NONCES); tras reiniciarlo, un ticket aún vigente podría
+reutilizarse durante el resto de su TTL.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from config import TICKET_WS_TTL_S, TICKET_WS_MAX_NONCES
+from metricas import metricas
+
+
+class TicketInvalido(Exception):
+    """Ticket mal formado, con firma incorrecta, caducado o ya usado."""
+
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _unb64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firmar(clave: bytes, kid: str, payload: str) -> str:
+    return _b64(hmac.new(clave, f"{kid}.{payload}".encode("ascii"), hashlib.sha256).digest())
+
+
+class TicketsWS:
+    """Emisión (proceso HTTP) y verificación con nonces de un solo uso (proceso WS)."""
+
+    def __init__(self, ttl_s: int = TICKET_WS_TTL_S, max_nonces: int = TICKET_WS_MAX_NONCES):
+        self.ttl_s = ttl_s
+        self.max_nonces = max_nonces
+        self._nonces = OrderedDict()   # nonce -> exp (orden de llegada ~ orden de caducidad)
+        self._lock = threading.Lock()
+
+    def emitir(self, usuario_id: str, nombre: str, google_id: str = None) -> str:
+        kid = config.TICKET_WS_KID_ACTIVO
+        payload = _b64(json.dumps({
+            "uid": usuario_id,
+            "nom": nombre,
+            "gid": google_id,
+            "exp": int(time.time()) + self.ttl_s,
+            "n": secrets.token_urlsafe(12)
+        }, separators=(",", ":")).encode("utf-8"))
+        metricas.incrementar("ws.tickets.emitidos")
+        return f"{kid}.{payload}.{_firmar(config.TICKET_WS_LLAVERO[kid], kid, payload)}"
+
+    def verificar(self, ticket: str) -> dict:
+        """Payload del ticket, o TicketInvalido. Consume el nonce."""
+        try:
+            datos = self._comprobar(ticket)
+        except TicketInvalido:
+            metricas.incrementar("ws.tickets.rechazados")
+            raise
+        metricas.incrementar("ws.tickets.aceptados")
+        return datos
+
+    def _comprobar(self, ticket: str) -> dict:
+        if not isinstance(ticket, str) or not ticket.isascii() or ticket.count(".") != 2:
+            raise TicketInvalido("Ticket mal formado")
+        kid, payload, firma = ticket.split(".")
+        clave = config.TICKET_WS_LLAVERO.get(kid)
+        if clave is None:
+            raise TicketInvalido("Clave de ticket desconocida")
+        if not hmac.compare_digest(firma, _firmar(clave, kid, payload)):
+            raise TicketInvalido("Firma de ticket incorrecta")
+        try:
+            datos = json.loads(_unb64(payload))
+            exp = int(datos["exp"])
+            nonce = datos["n"]
+        except (ValueError, KeyError, TypeError):
+            raise TicketInvalido("Ticket mal formado")
+        if not datos.get("uid") or "nom" not in datos:
+            raise TicketInvalido("Ticket mal formado")
+
+        ahora = time.time()
+        if exp < ahora:
+            raise TicketInvalido("Ticket caducado")
+        with self._lock:
+            while self._nonces and next(iter(self._nonces.values())) < ahora:
+                self._nonces.popitem(last=False)
+            if nonce in self._nonces:
+                metricas.incrementar("ws.tickets.reutilizados")
+                raise TicketInvalido("Ticket ya usado")
+            self._nonces[nonce] = exp
+            if len(self._nonces) > self.max_nonces:
+                self._nonces.popitem(last=False)
+        return datos
+
+
+# instancia global
+tickets_ws = TicketsWS()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Verificación masiva de hashes de auditoría
+==========================================
+Concilia `audit_log.txt` (o una lista de hashes) con los mensajes guardados:
+`mensajes` (o `mensajes_buckets` en modo bucket) y los ya archivados.
+
+- Lee el log en streaming y agrupa los hashes en lotes
+- Cada lote es una sola consulta $in sobre el índice de hash_sha256
+- Varios lotes en paralelo con un número acotado en vuelo (memoria acotada)
+- Informa coincidencias, faltantes y discrepancias (usuario o longitud distintos)
+
+Uso:
+    python verificador_auditoria.py [audit_log.txt] [--lote 1000] [--hilos 4] [--salida reporte.jsonl]
+    python verificador_auditoria.py --hashes hashes.txt
+"""
+
+import json
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Callable
+
+from config import AUDIT_LOG_FILE
+
+HASH_VALIDO = re.compile(r"^[0-9a-f]{64}$")
+
+
+def leer_log_auditoria(ruta: str = AUDIT_LOG_FILE) -> Iterator[dict]:
+    """
+    Genera las entradas del log de auditoría línea a línea.
+    Formato: [timestamp] | usuario | hash | longitud chars
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            if not linea.startswith("["):
+                continue
+            try:
+                izquierda, hash_sha256, longitud = linea.rstrip("\n").rsplit(" | ", 2)
+                timestamp, usuario = izquierda.split(" | ", 1)
+                entrada = {
+                    "linea": numero,
+                    "timestamp": timestamp.strip("[]"),
+                    "usuario": usuario.strip(),
+                    "hash": hash_sha256.strip(),
+                    "longitud": int(longitud.replace("chars", "").strip())
+                }
+            except ValueError:
+                continue
+            if HASH_VALIDO.match(entrada["hash"]):
+                yield entrada
+
+
+def leer_hashes(ruta: str) -> Iterator[dict]:
+    """Genera entradas a partir de un archivo con un hash por línea."""
+    with open(ruta, "r", encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            hash_sha256 = linea.strip().lower()
+            if HASH_VALIDO.match(hash_sha256):
+                yield {"linea": numero, "hash": hash_sha256}
+
+
+def _lotes(entradas: Iterable[dict], tam_lote: int) -> Iterator[list]:
+    lote = []
+    for entrada in entradas:
+        lote.append(entrada)
+        if len(lote) >= tam_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _clasificar(entrada: dict, encontrados: list) -> tuple:
+    """Devuelve (estado, detalle) para una entrada del log."""
+    if not encontrados:
+        return "faltante", None
+
+    # Si el log no trae usuario/longitud (lista de hashes), basta con existir
+    for doc in encontrados:
+        usuario_ok = "usuario" not in entrada or doc.get("usuario_nombre") == entrada["usuario"]
+        longitud_ok = "longitud" not in entrada or doc.get("longitud") == entrada["longitud"]
+        if usuario_ok and longitud_ok:
+            return "coincide", doc
+    return "discrepancia", encontrados
+
+
+def verificar_hashes(
+    db_manager,
+    entradas: Iterable[dict],
+    tam_lote: int = 1000,
+    hilos: int = 4,
+    reportar: Callable[[str, dict, object], None] = None
+) -> dict:
+    """
+    Verifica entradas {"hash", ["usuario"], ["longitud"]} contra los mensajes
+    guardados (ver DatabaseManager.buscar_por_hashes).
+
+    reportar(estado, entrada, detalle) se llama por cada entrada que no
+    coincide (estado: 'faltante', 'discrepancia' o 'error'), así el detalle
+    no se acumula en memoria.
+
+    Returns:
+        Resumen con totales por estado
+    """
+    resumen = {"total": 0, "coincide": 0, "faltante": 0, "discrepancia": 0, "error": 0, "lotes": 0}
+
+    def _procesar(lote: list) -> list:
+        encontrados = db_manager.buscar_por_hashes({e["hash"] for e in lote})
+        if encontrados is None:
+            return [(e, ("error", "consulta fallida")) for e in lote]
+        return [(e, _clasificar(e, encontrados.get(e["hash"]))) for e in lote]
+
+    def _consumir(resultados: list):
+        resumen["lotes"] += 1
+        for entrada, (estado, detalle) in resultados:
+            resumen["total"] += 1
+            resumen[estado] += 1
+            if estado != "coincide" and reportar:
+                reportar(estado, entrada, detalle)
+
+    max_en_vuelo = max(1, hilos) * 2
+    with ThreadPoolExecutor(max_workers=max(1, hilos), thread_name_prefix="auditoria") as pool:
+        en_vuelo = deque()
+        for lote in _lotes(entradas, tam_lote):
+            en_vuelo.append(pool.submit(_procesar, lote))
+            # No leer más lotes del log hasta que baje la cola (memoria acotada)
+            if len(en_vuelo) >= max_en_vuelo:
+                _consumir(en_vuelo.popleft().result())
+        while en_vuelo:
+            _consumir(en_vuelo.popleft().result())
+
+    return resumen
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from db_manager import db_manager
+
+    parser = argparse.ArgumentParser(description="Concilia el log de auditoría con MongoDB")
+    parser.add_argument("log", nargs="?", default=AUDIT_LOG_FILE, help="Log de auditoría a verificar")
+    parser.add_argument("--hashes", help="Archivo con un hash SHA-256 por línea (en lugar del log)")
+    parser.add_argument("--lote", type=int, default=1000, help="Hashes por consulta $in")
+    parser.add_argument("--hilos", type=int, default=4, help="Lotes consultados en paralelo")
+    parser.add_argument("--salida", help="Archivo JSONL para el detalle de faltantes/discrepancias")
+    args = parser.parse_args()
+
+    if not db_manager.conectar():
+        sys.exit(1)
+
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else None
+
+    def _reportar(estado, entrada, detalle):
+        if salida:
+            salida.write(json.dumps({"estado": estado, "entrada": entrada, "detalle": detalle},
+                                    ensure_ascii=False, default=str) + "\n")
+
+    try:
+        entradas = leer_hashes(args.hashes) if args.hashes else leer_log_auditoria(args.log)
+        resumen = verificar_hashes(db_manager, entradas, tam_lote=args.lote, hilos=args.hilos, reportar=_reportar)
+    finally:
+        if salida:
+            salida.close()
+        db_manager.cerrar()
+
+    print(json.dumps(resumen, indent=2))
+    sys.exit(0 if resumen["faltante"] == resumen["discrepancia"] == resumen["error"] == 0 else 2)
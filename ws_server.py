@@ -5,7 +5,7 @@ import os
 import websockets
 from manejadores import manejar_cliente
 from db_manager import db_manager
-from config import IP_SERVIDOR, PUERTO, SSL_ENABLED, SSL_CERT_PATH, SSL_KEY_PATH
+from config import IP_SERVIDOR, PUERTO, SSL_ENABLED, SSL_CERT_PATH, SSL_KEY_PATH, RECIFRADO_AUTOMATICO, ARCHIVADO_AUTOMATICO
 
 
 def _crear_contexto_ssl():
@@ -35,10 +35,28 @@ def _crear_contexto_ssl():
     return ssl_context
 
 
-async def iniciar_ws():
+async def iniciar_ws(detener: asyncio.Event = None):
+    """
+    Arranca el servidor WebSocket. Sin `detener` corre hasta que se cierre;
+    con él (supervisor_ws.py) cierra las conexiones cuando se activa el evento.
+    """
     print("[WS] Conectando Mongo...")
     db_manager.conectar()
 
+    if RECIFRADO_AUTOMATICO and db_manager.conectado:
+        from recifrado import TrabajoRecifrado
+        TrabajoRecifrado(db_manager).iniciar_en_segundo_plano()
+
+    if ARCHIVADO_AUTOMATICO and db_manager.conectado:
+        from archivado import iniciar_archivado_periodico
+        iniciar_archivado_periodico(db_manager)
+
+    if db_manager.conectado:
+        from estadisticas import iniciar_refresco_periodico
+        iniciar_refresco_periodico(db_manager)
+        from rollups import iniciar_rollups_periodicos
+        iniciar_rollups_periodicos(db_manager)
+
     if SSL_ENABLED:
         ssl_context = _crear_contexto_ssl()
         protocolo = "wss"
@@ -63,4 +81,8 @@ async def iniciar_ws():
             PUERTO
         )
 
+    if detener is not None:
+        await detener.wait()
+        print("[WS] Cerrando servidor WebSocket...")
+        server.close()
     await server.wait_closed()